@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from taggit.managers import TaggableManager
@@ -50,6 +51,13 @@ class Post(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["-published_at"],
+                name="post_published_idx",
+                condition=Q(status=True),
+            ),
+        ]
 
     def __str__(self):
         """Returns the string representation of the post title."""
@@ -64,7 +72,10 @@ class Comment(models.Model):
     Represents a comment made by a user on a blog post.
     """
 
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    # indexed by comment_post_approved_idx, which leads with post
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="comments", db_index=False
+    )
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -73,6 +84,14 @@ class Comment(models.Model):
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "approved", "-created_at"],
+                name="comment_post_approved_idx",
+            ),
+        ]
+
     def __str__(self):
         """Returns a readable string representation of the comment."""
         return f"Comment by {self.name} on {self.post.title}"
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.cache import bump_cache_version
+from .models import Post
+
+POSTS_NAMESPACE = "blog:posts"
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    Bump the posts version so cached post fragments are re-rendered.
+    View counts are not shown in them, so saving only those keeps the cache.
+    """
+    if update_fields and set(update_fields) <= {"counted_views"}:
+        return
+    bump_cache_version(POSTS_NAMESPACE)
@@ -1,5 +1,7 @@
 from django import template
+from core.cache import cached_inclusion_tag
 from blog.models import Post
+from blog.signals import POSTS_NAMESPACE
 
 register = template.Library()
 
@@ -13,10 +15,10 @@ def blog_hero(count=5):
     return {"blog_hero": blog_hero}
 
 
-@register.inclusion_tag("blog/latest_posts.html")
+@cached_inclusion_tag(register, "blog/latest_posts.html", (POSTS_NAMESPACE,))
 def latest_posts(count=4):
     """
-    Returns the blog hero published posts.
+    Returns the latest published posts.
     """
     latest_posts = Post.objects.filter(status=True).order_by("-published_at")[:count]
     return {"latest_posts": latest_posts}
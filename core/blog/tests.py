@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model
 from blog.models import Category, Post, Comment
 from blog.forms import CommentForm
 from blog.views import PostListView, PostDetailView
+from core.cache import get_cache_version
+from core.testing import IndexUsageMixin
+from blog.signals import POSTS_NAMESPACE
 
 User = get_user_model()
 
@@ -87,6 +90,16 @@ class BlogTests(TestCase):
         self.post.refresh_from_db()
         self.assertEqual(self.post.counted_views, 1)
 
+    def test_viewing_a_post_keeps_cached_fragments(self):
+        self.client.login(email="test@example.com", password="1234")
+        version = get_cache_version(POSTS_NAMESPACE)
+        self.client.get(reverse("blog:post-detail", kwargs={"pk": self.post.pk}))
+        self.assertEqual(get_cache_version(POSTS_NAMESPACE), version)
+
+        self.post.title = "Renamed"
+        self.post.save()
+        self.assertNotEqual(get_cache_version(POSTS_NAMESPACE), version)
+
     def test_comment_submission(self):
         self.client.login(email="test@example.com", password="1234")
         url = reverse("blog:post-detail", kwargs={"pk": self.post.pk})
@@ -105,3 +118,19 @@ class BlogTests(TestCase):
         comment = Comment.objects.first()
         self.assertEqual(comment.post, self.post)
         self.assertEqual(comment.comment, "Nice!")
+
+
+class BlogIndexTest(IndexUsageMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="index@example.com", password="1234")
+        self.post = Post.objects.create(
+            title="Indexed", author=self.user, content="Test content", status=True
+        )
+
+    def test_published_posts_use_index(self):
+        queryset = Post.objects.filter(status=True).order_by("-published_at")[:3]
+        self.assertUsesIndex(queryset, "post_published_idx")
+
+    def test_approved_comments_use_index(self):
+        queryset = self.post.comments.filter(approved=True).order_by("-created_at")
+        self.assertUsesIndex(queryset, "comment_post_approved_idx")
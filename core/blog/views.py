@@ -2,6 +2,7 @@ from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 
+from django.db.models import F
 from django.shortcuts import redirect
 from django.contrib import messages
 
@@ -31,8 +32,9 @@ class PostDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         post = self.object
+        # a plain UPDATE: no lost increments and no post_save cache bump
+        Post.objects.filter(pk=post.pk).update(counted_views=F("counted_views") + 1)
         post.counted_views += 1
-        post.save(update_fields=["counted_views"])
 
         context["form"] = CommentForm()
 
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import F
 from .models import Cart, CartItem
 
 
@@ -22,24 +23,43 @@ class CartAdmin(admin.ModelAdmin):
         "updated_at",
         "total_items",
         "total_price",
+        "discounted_total",
     )
+    list_select_related = ("user",)
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        """
+        Annotate the totals in SQL so the changelist does not load items per cart.
+        """
+        return super().get_queryset(request).with_totals()
+
     def total_items(self, obj):
         """
         Return the total number of items in the cart.
         """
-        return obj.total_items()
+        return obj.total_quantity
 
     total_items.short_description = "Total Items"
+    total_items.admin_order_field = "total_quantity"
 
     def total_price(self, obj):
         """
-        Return the total price of all items in the cart.
+        Return the total price of all items in the cart before discounts.
         """
-        return obj.total_price()
+        return obj.total_amount + obj.total_discount
 
     total_price.short_description = "Total Price"
+    total_price.admin_order_field = F("total_amount") + F("total_discount")
+
+    def discounted_total(self, obj):
+        """
+        Return the total price of all items in the cart after discounts.
+        """
+        return obj.total_amount
+
+    discounted_total.short_description = "Discounted Total"
+    discounted_total.admin_order_field = "total_amount"
 
 
 class CartItemAdmin(admin.ModelAdmin):
@@ -52,16 +72,26 @@ class CartItemAdmin(admin.ModelAdmin):
         "product",
         "quantity",
         "subtotal",
+        "discounted_subtotal",
     )
+    list_select_related = ("cart__user", "product")
 
     def subtotal(self, obj):
         """
-        Return the subtotal price for the cart item.
+        Return the subtotal price for the cart item before discounts.
         """
         return obj.subtotal()
 
     subtotal.short_description = "Subtotal"
 
+    def discounted_subtotal(self, obj):
+        """
+        Return the subtotal price for the cart item after discounts.
+        """
+        return obj.get_total_price()
+
+    discounted_subtotal.short_description = "Discounted Subtotal"
+
 
 # Register models with custom admin configurations
 admin.site.register(Cart, CartAdmin)
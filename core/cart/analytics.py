@@ -0,0 +1,75 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Cart
+
+ABANDONED_CART_FIELDS = (
+    "id",
+    "user_id",
+    "user__email",
+    "item_count",
+    "total_quantity",
+    "total_weight",
+    "total_amount",
+    "total_discount",
+    "last_activity",
+)
+
+
+def abandoned_carts(idle_hours, now=None):
+    """
+    Return a values() queryset of non-empty carts with no activity for
+    `idle_hours`, ordered by id, with their totals computed in SQL.
+    Activity is the latest update of the cart or any of its items.
+    """
+    cutoff = (now or timezone.now()) - timedelta(hours=idle_hours)
+    return (
+        Cart.objects.with_totals()
+        .annotate(last_activity=Greatest("updated_at", Max("items__updated_at")))
+        .filter(item_count__gt=0, last_activity__lt=cutoff)
+        .values(*ABANDONED_CART_FIELDS)
+        .order_by("id")
+    )
+
+
+def _row(values):
+    return [
+        value.isoformat() if hasattr(value, "isoformat") else value for value in values
+    ]
+
+
+def write_csv(rows, stream):
+    """
+    Write rows (dicts keyed by ABANDONED_CART_FIELDS) as CSV; returns the count.
+    """
+    writer = csv.writer(stream)
+    writer.writerow(ABANDONED_CART_FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow(_row(row[field] for field in ABANDONED_CART_FIELDS))
+        count += 1
+    return count
+
+
+def write_jsonl(rows, stream):
+    """
+    Write rows as one JSON object per line; returns the count.
+    """
+    count = 0
+    for row in rows:
+        values = _row(row[field] for field in ABANDONED_CART_FIELDS)
+        record = {
+            field: str(value) if field in ("total_amount", "total_discount") else value
+            for field, value in zip(ABANDONED_CART_FIELDS, values)
+        }
+        stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
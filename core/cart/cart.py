@@ -1,30 +1,46 @@
+import time
 from decimal import Decimal
 from typing import Dict, List, Optional
 
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY
 from django.db import transaction
 from django.db.models import F
 from shop.models import Product
+from shop.catalog import get_catalog_version, get_product, get_products
 from cart.models import Cart, CartItem
+from cart.pricing import ZERO, UnitPrice, pricing_engine
+from order.reservations import get_available_stock
 
 
 class CartSession:
     """
     Refactored CartSession:
     - keeps session structure identical: {"items": [{"product_id": "...", "quantity": n}, ...]}
-    - reduces DB queries by batching Product queries
+    - reads products through the shared catalog cache (shop.catalog), batching misses
     - minimizes session writes (save() called only on real changes)
     - uses Decimal for monetary calculations (assumes Product.price/get_price return Decimal)
+    - keeps a totals snapshot next to the cart so badges and summaries skip product queries
+    - never writes to the session on read; the cart is attached on the first real change
+    - syncs to the DB write-behind: the session is authoritative and the DB cart is
+      reconciled at most every CART_DB_SYNC_INTERVAL seconds (see sync_to_db)
     """
 
     SESSION_KEY = "cart"
+    TOTALS_SESSION_KEY = "cart_totals"
+    QUANTITY_SESSION_KEY = "cart_quantity"
+    SYNC_SESSION_KEY = "cart_sync"
 
     def __init__(self, session):
         self.session = session
-        self._cart = self.session.setdefault(self.SESSION_KEY, {"items": []})
+        cart = self.session.get(self.SESSION_KEY)
+        # keep an empty cart detached until something is written to it
+        self._cart = cart if isinstance(cart, dict) else {"items": []}
         # internal caches (per-instance; reset each request/new CartSession instance)
         self._modified = False
         self._product_cache: Dict[str, Product] = {}
         self._products_loaded_for_items = False
+        self._totals: Optional[Dict] = None
 
     # ---------- Helpers ----------
     def _save_marked(self):
@@ -33,9 +49,54 @@ class CartSession:
             self._modified = False
 
     def save(self):
-        """Mark session modified so Django saves it."""
+        """Attach the cart to the session and mark it modified so Django saves it."""
+        self.session[self.SESSION_KEY] = self._cart
+        self.session[self.QUANTITY_SESSION_KEY] = self.get_total_quantity()
+        self._mark_dirty()
         self.session.modified = True
 
+    def _get_sync_state(self) -> Dict:
+        state = self.session.get(self.SYNC_SESSION_KEY)
+        return state if isinstance(state, dict) else {}
+
+    def _mark_dirty(self):
+        """Bump the cart version and flag it as not yet written to the DB."""
+        state = self._get_sync_state()
+        self.session[self.SYNC_SESSION_KEY] = {
+            **state,
+            "dirty": True,
+            "version": state.get("version", 0) + 1,
+        }
+
+    def _mark_synced(self):
+        state = self._get_sync_state()
+        version = state.get("version", 0)
+        self.session[self.SYNC_SESSION_KEY] = {
+            "dirty": False,
+            "version": version,
+            "synced_version": version,
+            "synced_at": time.time(),
+        }
+
+    def is_dirty(self) -> bool:
+        """Return True if the session cart has changes not yet written to the DB."""
+        return bool(self._get_sync_state().get("dirty"))
+
+    @classmethod
+    def peek_total_quantity(cls, session) -> int:
+        """
+        Read the cart item counter without building a CartSession or touching Product.
+        Sessions without a key (e.g. crawlers without a cookie) are never loaded.
+        """
+        if session is None or session.session_key is None:
+            return 0
+        quantity = session.get(cls.QUANTITY_SESSION_KEY)
+        if quantity is None:
+            # sessions written before the counter existed
+            items = session.get(cls.SESSION_KEY, {}).get("items", [])
+            quantity = sum(int(item.get("quantity", 0)) for item in items)
+        return quantity
+
     def _mark_modified(self):
         self._modified = True
 
@@ -52,33 +113,50 @@ class CartSession:
     def _load_products_for_items(self):
         """
         Batch load Product objects for the product_ids present in the session items.
-        Caches results in self._product_cache keyed by string id.
+        Caches results in self._product_cache keyed by string id; ids already cached are not re-queried.
         """
         if self._products_loaded_for_items:
             return
 
         items = self._ensure_cart_items_list()
-        if not items:
-            self._products_loaded_for_items = True
-            return
-
-        product_ids = [int(item["product_id"]) for item in items]
-        products = Product.objects.filter(id__in=product_ids, available=True)
-        self._product_cache = {str(p.id): p for p in products}
+        product_ids = [
+            int(item["product_id"])
+            for item in items
+            if item["product_id"] not in self._product_cache
+        ]
+        if product_ids:
+            products = get_products(product_ids)
+            self._product_cache.update({str(pid): p for pid, p in products.items()})
         self._products_loaded_for_items = True
 
+    def prefetch_products(self, product_ids):
+        """
+        Load the given products into the per-instance cache with one query,
+        so a series of mutations does not fetch them one by one.
+        """
+        missing = set()
+        for product_id in product_ids:
+            try:
+                pid = int(product_id)
+            except (TypeError, ValueError):
+                continue
+            if self._normalize_pid(pid) not in self._product_cache:
+                missing.add(pid)
+        if missing:
+            products = get_products(missing)
+            self._product_cache.update({str(pid): p for pid, p in products.items()})
+
     def _get_product(self, product_id) -> Optional[Product]:
         """
         Return Product instance or None if not available.
-        Uses cache if available; single-get fallback if not present in cache.
+        Uses the per-instance cache first, then the catalog cache.
         """
         pid = self._normalize_pid(product_id)
         if pid in self._product_cache:
             return self._product_cache[pid]
 
-        try:
-            p = Product.objects.get(id=pid, available=True)
-        except Product.DoesNotExist:
+        p = get_product(pid)
+        if p is None:
             return None
         self._product_cache[pid] = p
         return p
@@ -91,54 +169,213 @@ class CartSession:
         items = self._ensure_cart_items_list()
         return {item["product_id"]: item for item in items}
 
+    # ---------- Totals snapshot ----------
+    def _unit_values(self, product) -> List:
+        """
+        Return [price_with_discount, discount_per_unit, weight] for one unit of product.
+        Decimals are kept as strings so the snapshot stays JSON serializable.
+        """
+        return UnitPrice.from_product(product).to_snapshot()
+
+    def _empty_snapshot(self) -> Dict:
+        return {
+            "version": get_catalog_version(),
+            "built_at": time.time(),
+            "quantity": 0,
+            "subtotal": "0",
+            "discount": "0",
+            "weight": 0,
+            "units": {},
+        }
+
+    def _get_totals_snapshot(self) -> Optional[Dict]:
+        """
+        Return the stored snapshot if it was built against the current catalog
+        version less than CART_TOTALS_MAX_AGE seconds ago. The age limit bounds
+        staleness even if a version bump is lost or the cache is not shared.
+        """
+        snapshot = self.session.get(self.TOTALS_SESSION_KEY)
+        if not isinstance(snapshot, dict):
+            return None
+        if snapshot.get("version") != get_catalog_version():
+            return None
+        if time.time() - snapshot.get("built_at", 0) > settings.CART_TOTALS_MAX_AGE:
+            return None
+        return snapshot
+
+    def _store_totals_snapshot(self, snapshot: Optional[Dict]):
+        self._totals = None
+        if snapshot is None:
+            if self.TOTALS_SESSION_KEY in self.session:
+                del self.session[self.TOTALS_SESSION_KEY]
+            return
+        self.session[self.TOTALS_SESSION_KEY] = snapshot
+
+    def _invalidate_totals(self):
+        self._store_totals_snapshot(None)
+
+    def _rebuild_totals(self) -> Dict:
+        """
+        Recompute the snapshot from the session items in a single pass
+        over one batch-loaded set of products.
+        """
+        snapshot = self._empty_snapshot()
+        items = self._ensure_cart_items_list()
+        if not items:
+            return snapshot
+
+        self._load_products_for_items()
+        totals = pricing_engine.price_products(
+            (item["product_id"], product, item.get("quantity", 0))
+            for item in items
+            if (product := self._product_cache.get(item["product_id"]))
+        )
+        snapshot["units"] = {line.key: line.unit.to_snapshot() for line in totals.lines}
+        snapshot["quantity"] = totals.quantity
+        snapshot["subtotal"] = str(totals.subtotal)
+        snapshot["discount"] = str(totals.discount)
+        snapshot["weight"] = totals.weight
+        self._store_totals_snapshot(snapshot)
+        return snapshot
+
+    def _apply_totals_delta(self, pid: str, delta: int, product=None):
+        """
+        Incrementally update the snapshot after a quantity change of `delta` for pid.
+        Rebuilds when there is no current snapshot, and falls back to invalidation
+        (lazy rebuild) when the unit values are unknown.
+        """
+        if not delta:
+            return
+        snapshot = self._get_totals_snapshot()
+        if snapshot is None:
+            self._rebuild_totals()
+            return
+
+        units = snapshot["units"]
+        if product is not None:
+            unit = units[pid] = units.get(pid) or self._unit_values(product)
+        else:
+            unit = units.get(pid)
+        if unit is None:
+            self._invalidate_totals()
+            return
+
+        line = pricing_engine.line(pid, UnitPrice.from_snapshot(unit), delta)
+        snapshot["quantity"] += delta
+        snapshot["subtotal"] = str(Decimal(snapshot["subtotal"]) + line.total_price)
+        snapshot["discount"] = str(Decimal(snapshot["discount"]) + line.total_discount)
+        snapshot["weight"] += line.total_weight
+        if not any(i["product_id"] == pid for i in self._ensure_cart_items_list()):
+            units.pop(pid, None)
+        self._store_totals_snapshot(snapshot)
+
+    def get_totals(self, province=None) -> Dict:
+        """
+        Return cart totals as Decimals/ints:
+          quantity, subtotal, discount, weight, shipping, total
+        Reads the session snapshot; products are only queried when it is stale.
+        Shipping is quoted for `province` (the default rate table when None).
+        """
+        if self._totals is not None and province is None:
+            return self._totals
+
+        snapshot = self._get_totals_snapshot() or self._rebuild_totals()
+        subtotal = Decimal(snapshot["subtotal"])
+        shipping = (
+            pricing_engine.shipping_cost(snapshot["weight"], subtotal, province)
+            if snapshot["quantity"]
+            else ZERO
+        )
+        totals = {
+            "quantity": snapshot["quantity"],
+            "subtotal": subtotal,
+            "discount": Decimal(snapshot["discount"]),
+            "weight": snapshot["weight"],
+            "shipping": shipping,
+            "total": subtotal + shipping,
+        }
+        if province is None:
+            self._totals = totals
+        return totals
+
     # ---------- Mutating operations ----------
-    def add_product(self, product_id) -> bool:
+    def add_product(self, product_id, quantity=1) -> bool:
         """
-        Add product by id (increment if exists).
+        Add `quantity` units of product by id (increment if exists).
         Returns True if added/incremented, False on stock unavailable or product not available.
         """
         pid = self._normalize_pid(product_id)
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return False
+        if quantity < 1:
+            return False
         product = self._get_product(pid)
         if product is None:
             return False
 
         items = self._ensure_cart_items_list()
         index = self._build_item_index()
-
         existing = index.get(pid)
+        in_cart = existing["quantity"] if existing else 0
+
+        # units held by other users' checkouts cannot be added; the user's
+        # own hold covers units already in this cart
+        available = get_available_stock(
+            product, exclude_user=self.session.get(AUTH_SESSION_KEY)
+        )
+        if in_cart + quantity > available:
+            return False
+
         if existing:
-            if existing["quantity"] + 1 > product.stock:
-                return False
-            existing["quantity"] += 1
-            self._mark_modified()
+            existing["quantity"] += quantity
         else:
-            if product.stock < 1:
-                return False
-            items.append({"product_id": pid, "quantity": 1})
-            self._mark_modified()
+            items.append({"product_id": pid, "quantity": quantity})
+        self._mark_modified()
 
+        self._apply_totals_delta(pid, quantity, product)
         self._save_marked()
         return True
 
-    def update_product_quantity(self, product_id, quantity):
+    def update_product_quantity(self, product_id, quantity) -> bool:
         """
         Set quantity (int). If quantity is same as before, no session write.
-        If product doesn't exist in cart, no-op.
+        If product doesn't exist in cart, no-op. A quantity of 0 removes the
+        item; negative quantities and increases beyond the stock left after
+        other users' holds are rejected.
+        Returns True if the product is in the cart with that quantity,
+        False otherwise.
         """
         pid = self._normalize_pid(product_id)
         try:
             new_q = int(quantity)
         except (TypeError, ValueError):
-            return
+            return False
+        if new_q < 0:
+            return False
+        if new_q == 0:
+            return self.remove_product(pid)
 
+        found = False
         items = self._ensure_cart_items_list()
         for item in items:
             if item["product_id"] == pid:
+                if new_q > item["quantity"]:
+                    product = self._get_product(pid)
+                    if product is None or new_q > get_available_stock(
+                        product, exclude_user=self.session.get(AUTH_SESSION_KEY)
+                    ):
+                        break
+                found = True
                 if item["quantity"] != new_q:
+                    delta = new_q - item["quantity"]
                     item["quantity"] = new_q
                     self._mark_modified()
+                    self._apply_totals_delta(pid, delta)
                 break
         self._save_marked()
+        return found
 
     def decrease_product_quantity(self, product_id) -> bool:
         """
@@ -151,23 +388,29 @@ class CartSession:
                 if item["quantity"] > 1:
                     item["quantity"] -= 1
                     self._mark_modified()
+                    self._apply_totals_delta(pid, -1)
                     self._save_marked()
                     return True
                 return False
         return False
 
-    def remove_product(self, product_id):
+    def remove_product(self, product_id) -> bool:
         """
         Remove item from session cart if present.
+        Returns True if an item was removed.
         """
         pid = self._normalize_pid(product_id)
+        removed = False
         items = self._ensure_cart_items_list()
         for item in list(items):  # iterate over copy to safely remove
             if item["product_id"] == pid:
                 items.remove(item)
+                removed = True
                 self._mark_modified()
+                self._apply_totals_delta(pid, -int(item.get("quantity", 0)))
                 break
         self._save_marked()
+        return removed
 
     def clear(self):
         """
@@ -176,6 +419,7 @@ class CartSession:
         self._cart = self.session[self.SESSION_KEY] = {"items": []}
         self._product_cache = {}
         self._products_loaded_for_items = True
+        self._store_totals_snapshot(self._empty_snapshot())
         self._mark_modified()
         self._save_marked()
 
@@ -192,11 +436,11 @@ class CartSession:
           - "product_obj": Product instance
           - "total_price": quantity * product.get_price()
           - "total_discount": quantity * (price_without_discount - price_with_discount)
-        NOTE: This mutates the session items in-memory (adds keys) but preserves product_id/quantity shape
-        as stored in session (so existing frontend JSON remains compatible).
+        NOTE: Returns copies of the session items so model instances never end up in
+        the serialized session; product_id/quantity keep the shape stored in session.
         """
-        items = self._ensure_cart_items_list()
         self._load_products_for_items()
+        items = [dict(item) for item in self._ensure_cart_items_list()]
 
         # iterate and update; items that have missing product (not available) will be skipped
         for item in items:
@@ -207,30 +451,16 @@ class CartSession:
                 product_obj = self._get_product(pid)
                 if not product_obj:
                     # product not available -> skip populating fields (frontend should handle missing product_obj)
-                    item.pop("product_obj", None)
-                    item.pop("total_price", None)
-                    item.pop("total_discount", None)
                     continue
 
-            # use Decimal arithmetic; assume product.price and product.get_price() are Decimal
-            price_without_discount = getattr(product_obj, "price", Decimal("0"))
-            price_with_discount = getattr(
-                product_obj, "get_price", lambda: price_without_discount
-            )()
-            # ensure Decimal
-            if not isinstance(price_without_discount, Decimal):
-                price_without_discount = Decimal(price_without_discount)
-            if not isinstance(price_with_discount, Decimal):
-                price_with_discount = Decimal(price_with_discount)
-
-            discount_amount_per_unit = price_without_discount - price_with_discount
-            quantity = int(item.get("quantity", 0))
-
+            line = pricing_engine.line(
+                pid, UnitPrice.from_product(product_obj), item.get("quantity", 0)
+            )
             item.update(
                 {
                     "product_obj": product_obj,
-                    "total_price": price_with_discount * quantity,
-                    "total_discount": discount_amount_per_unit * quantity,
+                    "total_price": line.total_price,
+                    "total_discount": line.total_discount,
                 }
             )
 
@@ -240,45 +470,21 @@ class CartSession:
         """
         Sum of product.weight * quantity. If weight is non-int or missing, treat as 0.
         """
-        total_weight = 0
-        items = self._ensure_cart_items_list()
-        self._load_products_for_items()
-
-        for item in items:
-            pid = item["product_id"]
-            product = self._product_cache.get(pid) or self._get_product(pid)
-            if not product:
-                continue
-            try:
-                weight = int(product.weight)
-            except Exception:
-                weight = 0
-            total_weight += weight * int(item.get("quantity", 0))
-
-        return total_weight
+        return self.get_totals()["weight"]
 
     def get_shipping_cost(self) -> Decimal:
         """
-        Example shipping calculation: weight * 100
-        Returns Decimal for consistency.
+        Shipping cost quoted from the default rate table (see order.shipping),
+        since the session cart has no address yet. Checkout re-quotes it for
+        the province of the selected address.
         """
-        total_weight = self.get_total_weight()
-        return Decimal(total_weight) * Decimal(100)
+        return self.get_totals()["shipping"]
 
     def get_total_price(self) -> Decimal:
         """
-        Sum total_price from cart items. If get_cart_items() hasn't been called before,
-        total_price values may be missing — call get_cart_items() to ensure totals are present.
+        Sum of quantity * product.get_price() over available items.
         """
-        # Make sure item totals exist
-        items = self.get_cart_items()
-        total = Decimal("0")
-        for item in items:
-            tp = item.get("total_price", Decimal("0"))
-            if not isinstance(tp, Decimal):
-                tp = Decimal(tp)
-            total += tp
-        return total
+        return self.get_totals()["subtotal"]
 
     def get_total_quantity(self) -> int:
         items = self._ensure_cart_items_list()
@@ -286,21 +492,12 @@ class CartSession:
 
     def get_total_discount_amount(self) -> Decimal:
         """
-        Ensure cart items are annotated so discount fields exist.
+        Sum of quantity * per-unit discount over available items.
         """
-        items = self.get_cart_items()
-        total = Decimal("0")
-        for item in items:
-            td = item.get("total_discount", Decimal("0"))
-            if not isinstance(td, Decimal):
-                td = Decimal(td)
-            total += td
-        return total
+        return self.get_totals()["discount"]
 
     def get_total_payment_amount(self) -> Decimal:
-        items_total = self.get_total_price()
-        shipping = self.get_shipping_cost()
-        return items_total + shipping
+        return self.get_totals()["total"]
 
     # ---------- Sync / Merge with DB (optimized) ----------
     def sync_cart_items_from_db(self, user):
@@ -318,10 +515,10 @@ class CartSession:
         session_index = self._build_item_index()
 
         cart, _ = Cart.objects.get_or_create(user=user)
-        cart_items = CartItem.objects.filter(cart=cart).select_related("product")
+        cart_items = CartItem.objects.filter(cart=cart)
 
         for c_item in cart_items:
-            pid = self._normalize_pid(c_item.product.id)
+            pid = self._normalize_pid(c_item.product_id)
             if pid in session_index:
                 # update DB -> session (behavior preserved)
                 session_index[pid]["quantity"] = c_item.quantity
@@ -329,16 +526,43 @@ class CartSession:
             else:
                 items.append({"product_id": pid, "quantity": c_item.quantity})
                 self._mark_modified()
+        self._products_loaded_for_items = False
+        self._invalidate_totals()
 
         # After syncing, ensure DB and session consistent (call merge to remove stale DB items)
         self.merge_session_cart_in_db(user)
         self._save_marked()
+        self._mark_synced()
+
+    def sync_to_db(self, user, force=False) -> bool:
+        """
+        Write-behind reconciliation of the session cart into the DB cart.
+        Does nothing when the cart is clean; otherwise merges only if `force` is set
+        or CART_DB_SYNC_INTERVAL seconds have passed since the last merge
+        (an interval of 0 merges on every change).
+        Returns True if a merge was performed.
+        """
+        if not user or user.is_anonymous:
+            return False
+
+        state = self._get_sync_state()
+        if not state.get("dirty"):
+            return False
+
+        interval = getattr(settings, "CART_DB_SYNC_INTERVAL", 0)
+        if not force and interval:
+            if time.time() - state.get("synced_at", 0) < interval:
+                return False
+
+        self.merge_session_cart_in_db(user)
+        self._mark_synced()
+        return True
 
     def merge_session_cart_in_db(self, user):
         """
         Merge session cart items into DB cart for the given user.
         Optimized:
-          - fetch all products for items (batch)
+          - fetch all products for items (batch, through the catalog cache)
           - fetch existing CartItem objects for cart (one query)
           - bulk_create new CartItem objects
           - bulk_update changed quantities
@@ -359,8 +583,7 @@ class CartSession:
         session_product_ids = [
             int(self._normalize_pid(item["product_id"])) for item in items
         ]
-        products = Product.objects.filter(id__in=session_product_ids, available=True)
-        product_map = {p.id: p for p in products}
+        product_map = get_products(session_product_ids)
         # Build session map keyed by product_id int
         session_map = {}
         for item in items:
@@ -371,8 +594,7 @@ class CartSession:
             session_map[pid_int] = int(item.get("quantity", 0))
 
         cart, _ = Cart.objects.get_or_create(user=user)
-        existing_qs = CartItem.objects.filter(cart=cart).select_related("product")
-        existing_map = {ci.product.id: ci for ci in existing_qs}
+        existing_map = {ci.product_id: ci for ci in CartItem.objects.filter(cart=cart)}
 
         to_create = []
         to_update = []
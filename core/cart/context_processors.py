@@ -1,7 +1,37 @@
 from .cart import CartSession
 
 
+class LazyCart:
+    """
+    Template-facing stand-in for CartSession.
+    The session and cart are only materialized when a template reads an
+    attribute that needs them; the item counter has its own cheap path.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._cart = None
+
+    def _get_cart(self):
+        if self._cart is None:
+            self._cart = CartSession(self._request.session)
+        return self._cart
+
+    def __getattr__(self, name):
+        return getattr(self._get_cart(), name)
+
+    @property
+    def total_quantity(self):
+        """Return the cart item count without loading products."""
+        if self._cart is not None:
+            return self._cart.get_total_quantity()
+        session = getattr(self._request, "session", None)
+        return CartSession.peek_total_quantity(session)
+
+    def get_total_quantity(self):
+        return self.total_quantity
+
+
 def cart_processor(request):
-    """Add the cart object to the template context."""
-    cart = CartSession(request.session)
-    return {"cart": cart}
+    """Add a lazily built cart object to the template context."""
+    return {"cart": LazyCart(request)}
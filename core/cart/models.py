@@ -1,10 +1,78 @@
-from decimal import Decimal
 from django.db import models
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Floor, Mod
+from django.db.models.lookups import Exact, GreaterThan
 from shop.models import Product
+from .pricing import ZERO, UnitPrice, pricing_engine
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+TOTAL_ANNOTATIONS = (
+    "item_count",
+    "total_quantity",
+    "total_weight",
+    "total_amount",
+    "total_discount",
+)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate each cart with its totals computed in SQL:
+        item_count, total_quantity, total_weight, total_amount (after
+        discount) and total_discount.
+
+        The discounted unit price is rounded to whole Toman with integer
+        arithmetic the way Product.get_price() quantizes it: half to even.
+        """
+        money = DecimalField(max_digits=14, decimal_places=0)
+        # price * (100 - discount) is the discounted price in 1/100 Toman
+        hundredths = F("items__product__price") * (100 - F("items__product__discount"))
+        whole = Floor(hundredths / 100, output_field=money)
+        rest = ExpressionWrapper(hundredths - whole * 100, output_field=money)
+        unit_price = ExpressionWrapper(
+            whole
+            + Case(
+                When(GreaterThan(rest, 50), then=Value(1)),
+                # exactly half: round up only from an odd whole part
+                When(Exact(rest, 50), then=Mod(whole, 2)),
+                default=Value(0),
+                output_field=money,
+            ),
+            output_field=money,
+        )
+        return self.annotate(
+            item_count=Count("items"),
+            total_quantity=Coalesce(Sum("items__quantity"), 0),
+            total_weight=Coalesce(
+                Sum(F("items__quantity") * F("items__product__weight")), 0
+            ),
+            total_amount=Coalesce(
+                Sum(F("items__quantity") * unit_price, output_field=money),
+                Value(0),
+                output_field=money,
+            ),
+            total_discount=Coalesce(
+                Sum(
+                    F("items__quantity") * (F("items__product__price") - unit_price),
+                    output_field=money,
+                ),
+                Value(0),
+                output_field=money,
+            ),
+        )
+
 
 class Cart(models.Model):
     """
@@ -15,40 +83,73 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    def has_totals(self):
+        """
+        True when the cart was loaded with CartQuerySet.with_totals().
+        """
+        return all(hasattr(self, name) for name in TOTAL_ANNOTATIONS)
+
     def total_items(self):
         """Return total quantity of items in the cart."""
-        return sum(item.quantity for item in self.items.all())
+        if self.has_totals():
+            return self.total_quantity
+        return self.get_totals().quantity
 
     def total_price(self):
-        """Return total cost of all items in the cart."""
-        return sum(item.subtotal() for item in self.items.all())
+        """Return total cost of all items in the cart before discounts."""
+        if self.has_totals():
+            return self.total_amount + self.total_discount
+        return sum(line.list_total for line in self.get_totals().lines)
 
     def __str__(self):
         return f"Cart({self.user.email})"
 
+    def get_totals(self, items=None, province=None):
+        """
+        Price the cart in one pass with the shared PricingEngine.
+        `items` may be a preloaded list of CartItems with their products;
+        otherwise they are loaded in one query.
+        Line keys are the CartItem instances; shipping is quoted for
+        `province` (the default rate table when None).
+        """
+        if items is None:
+            items = self.items.select_related("product")
+        return pricing_engine.price_products(
+            ((item, item.product, item.quantity) for item in items),
+            province=province,
+        )
+
     def get_total_price(self):
         """Calculate total price of all items in cart"""
-        return sum(item.get_total_price() for item in self.items.all())
+        if self.has_totals():
+            return self.total_amount
+        return self.get_totals().subtotal
 
     def get_total_items(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.total_items()
 
     def get_total_weight(self):
         """
         Calculate total weight of cart based on product weight * quantity
         """
-        return sum(
-            item.product.weight * item.quantity
-            for item in self.items.select_related("product")
-        )
+        if self.has_totals():
+            return self.total_weight
+        return self.get_totals().weight
 
-    def get_shipping_cost(self):
+    def get_shipping_cost(self, province=None):
         """
-        Shipping cost = total_weight * 100
+        Shipping cost from the configured rate tables (see order.shipping)
         """
-        total_weight = self.get_total_weight()
-        return Decimal(total_weight) * Decimal("100")
+        if self.has_totals():
+            if not self.item_count:
+                return ZERO
+            return pricing_engine.shipping_cost(
+                self.total_weight, self.total_amount, province
+            )
+        return self.get_totals(province=province).shipping
 
 
 class CartItem(models.Model):
@@ -70,11 +171,16 @@ class CartItem(models.Model):
 
     def subtotal(self):
         """Return price * quantity for this item."""
-        return self.product.price * self.quantity
+        return self._line().list_total
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
+    def _line(self):
+        return pricing_engine.line(
+            self.pk, UnitPrice.from_product(self.product), self.quantity
+        )
+
     def get_total_price(self):
         """Calculate total price for this cart item"""
-        return self.product.get_price() * self.quantity
+        return self._line().total_price
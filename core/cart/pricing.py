@@ -0,0 +1,160 @@
+from decimal import ROUND_HALF_UP, Context, Decimal
+from typing import Iterable, List, NamedTuple, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# one shared context for all cart arithmetic; prices are whole Toman
+PRICE_CONTEXT = Context(prec=28, rounding=ROUND_HALF_UP)
+PRICE_EXPONENT = Decimal("1")
+ZERO = Decimal("0")
+
+
+class UnitPrice(NamedTuple):
+    """
+    Snapshot of the values needed to price one unit of a product.
+    `price` is the discounted unit price, `discount` the amount taken off.
+    """
+
+    price: Decimal
+    discount: Decimal
+    weight: int
+
+    @classmethod
+    def from_product(cls, product) -> "UnitPrice":
+        list_price = to_price(product.price)
+        price = to_price(product.get_price())
+        try:
+            weight = int(product.weight)
+        except (TypeError, ValueError):
+            weight = 0
+        return cls(price, list_price - price, weight)
+
+    @classmethod
+    def from_snapshot(cls, values) -> "UnitPrice":
+        """Build from the JSON-friendly list produced by to_snapshot()."""
+        price, discount, weight = values
+        return cls(Decimal(price), Decimal(discount), int(weight))
+
+    def to_snapshot(self) -> List:
+        return [str(self.price), str(self.discount), self.weight]
+
+
+class LineTotals(NamedTuple):
+    key: object
+    quantity: int
+    unit: UnitPrice
+    total_price: Decimal
+    total_discount: Decimal
+    total_weight: int
+
+    @property
+    def list_total(self) -> Decimal:
+        """Line total before discount."""
+        return self.total_price + self.total_discount
+
+
+class CartTotals(NamedTuple):
+    lines: List[LineTotals]
+    quantity: int
+    subtotal: Decimal
+    discount: Decimal
+    weight: int
+    shipping: Decimal
+    total: Decimal
+
+    def as_dict(self):
+        return {
+            "quantity": self.quantity,
+            "subtotal": self.subtotal,
+            "discount": self.discount,
+            "weight": self.weight,
+            "shipping": self.shipping,
+            "total": self.total,
+        }
+
+
+def to_price(value) -> Decimal:
+    """
+    Return value as a Decimal rounded to whole currency units.
+    Decimals that are already whole are returned as they are.
+    """
+    if not isinstance(value, Decimal):
+        value = Decimal(value)
+    if value == value.to_integral_value():
+        return value
+    return value.quantize(PRICE_EXPONENT, context=PRICE_CONTEXT)
+
+
+class PricingEngine:
+    """
+    Computes line and cart totals in one pass over (key, unit, quantity) rows.
+    The session cart, DB cart, checkout and admin all price through here, so
+    they always agree.
+    """
+
+    def __init__(self, shipping_calculator=None):
+        self._shipping_calculator = shipping_calculator
+
+    @property
+    def shipping_calculator(self):
+        """
+        Callable(weight, subtotal=..., province=...) returning the shipping
+        cost; defaults to settings.SHIPPING_CALCULATOR, imported on first use.
+        """
+        if self._shipping_calculator is None:
+            self._shipping_calculator = import_string(settings.SHIPPING_CALCULATOR)
+        return self._shipping_calculator
+
+    def line(self, key, unit: UnitPrice, quantity) -> LineTotals:
+        quantity = int(quantity)
+        return LineTotals(
+            key,
+            quantity,
+            unit,
+            unit.price * quantity,
+            unit.discount * quantity,
+            unit.weight * quantity,
+        )
+
+    def shipping_cost(self, weight, subtotal=ZERO, province=None) -> Decimal:
+        return to_price(
+            self.shipping_calculator(weight, subtotal=subtotal, province=province)
+        )
+
+    def price(
+        self, rows: Iterable[Tuple[object, UnitPrice, int]], province=None
+    ) -> CartTotals:
+        """
+        Price rows of (key, UnitPrice, quantity); `key` is passed through to
+        the matching LineTotals so callers can find their lines.
+        Shipping is quoted for `province` (the default table when None).
+        """
+        lines = []
+        quantity = weight = 0
+        subtotal = discount = ZERO
+        for key, unit, qty in rows:
+            line = self.line(key, unit, qty)
+            lines.append(line)
+            quantity += line.quantity
+            subtotal += line.total_price
+            discount += line.total_discount
+            weight += line.total_weight
+
+        # an empty cart ships nothing
+        shipping = self.shipping_cost(weight, subtotal, province) if lines else ZERO
+        return CartTotals(
+            lines, quantity, subtotal, discount, weight, shipping, subtotal + shipping
+        )
+
+    def price_products(self, rows, province=None) -> CartTotals:
+        """
+        Price rows of (key, product, quantity).
+        """
+        return self.price(
+            ((key, UnitPrice.from_product(product), qty) for key, product, qty in rows),
+            province=province,
+        )
+
+
+pricing_engine = PricingEngine()
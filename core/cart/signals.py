@@ -15,7 +15,7 @@ def post_login(sender, user, request, **kwargs):
 @receiver(user_logged_out)
 def pre_logout(sender, user, request, **kwargs):
     """
-    Merge session cart items into the database before user logout.
+    Flush pending session cart changes into the database before user logout.
     """
     cart = CartSession(request.session)
-    cart.merge_session_cart_in_db(user)
+    cart.sync_to_db(user, force=True)
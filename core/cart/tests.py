@@ -1,8 +1,22 @@
+import csv
+import json
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
 from shop.models import Product, Category
 from cart.models import Cart, CartItem
+from cart.cart import CartSession
+from cart.context_processors import cart_processor
+from cart.pricing import UnitPrice, pricing_engine
+from order.reservations import reserve_items
 
 User = get_user_model()
 
@@ -45,3 +59,450 @@ class CartModelTest(TestCase):
         self.assertEqual(str(item), "Product1 x 3")
         self.assertEqual(item.subtotal(), 3000)
         self.assertEqual(item.get_total_price(), 3000)
+
+
+class CartSessionTotalsTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="TestCategory")
+        self.product1 = Product.objects.create(
+            name="Product1",
+            category=self.category,
+            price=1000,
+            discount=10,
+            stock=10,
+            weight=2,
+        )
+        self.product2 = Product.objects.create(
+            name="Product2", category=self.category, price=2000, stock=5, weight=3
+        )
+        self.session = SessionStore()
+
+    def test_totals_follow_mutations(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product1.id)
+        cart.add_product(self.product1.id)
+        cart.add_product(self.product2.id)
+
+        self.assertEqual(cart.get_total_price(), Decimal("3800"))
+        self.assertEqual(cart.get_total_discount_amount(), Decimal("200"))
+        self.assertEqual(cart.get_total_weight(), 7)
+        self.assertEqual(cart.get_shipping_cost(), Decimal("700"))
+        self.assertEqual(cart.get_total_payment_amount(), Decimal("4500"))
+
+        cart.decrease_product_quantity(self.product1.id)
+        cart.remove_product(self.product2.id)
+        cart = CartSession(self.session)
+        self.assertEqual(cart.get_total_price(), Decimal("900"))
+        self.assertEqual(cart.get_total_weight(), 2)
+
+    def test_totals_read_without_product_queries(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product1.id)
+        cart.update_product_quantity(self.product1.id, 3)
+
+        cart = CartSession(self.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_price(), Decimal("2700"))
+            self.assertEqual(cart.get_total_payment_amount(), Decimal("3300"))
+
+    def test_product_change_invalidates_totals(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product2.id)
+        self.assertEqual(cart.get_total_price(), Decimal("2000"))
+
+        self.product2.price = 2500
+        self.product2.save()
+
+        cart = CartSession(self.session)
+        self.assertEqual(cart.get_total_price(), Decimal("2500"))
+
+    @override_settings(CART_TOTALS_MAX_AGE=300)
+    def test_old_totals_snapshot_is_rebuilt(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product2.id)
+        snapshot = self.session[CartSession.TOTALS_SESSION_KEY]
+        snapshot["subtotal"] = "1"
+
+        cart = CartSession(self.session)
+        self.assertEqual(cart.get_total_price(), Decimal("1"))
+
+        snapshot["built_at"] -= 301
+        cart = CartSession(self.session)
+        self.assertEqual(cart.get_total_price(), Decimal("2000"))
+
+
+class LazyCartProcessorTest(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.session = SessionStore()
+
+    def test_anonymous_request_never_loads_session(self):
+        cart = cart_processor(self.request)["cart"]
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_quantity, 0)
+        self.assertFalse(self.request.session.accessed)
+        self.assertFalse(self.request.session.modified)
+
+    def test_reading_cart_does_not_dirty_session(self):
+        cart = cart_processor(self.request)["cart"]
+        self.assertEqual(cart.get_cart_dict(), {"items": []})
+        self.assertFalse(self.request.session.modified)
+
+    def test_total_quantity_reads_counter(self):
+        category = Category.objects.create(name="TestCategory")
+        product = Product.objects.create(
+            name="Product1", category=category, price=1000, stock=10
+        )
+        session = self.request.session
+        CartSession(session).add_product(product.id)
+        CartSession(session).add_product(product.id)
+        session.save()
+
+        cart = cart_processor(self.request)["cart"]
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_quantity, 2)
+
+
+@override_settings(CART_DB_SYNC_INTERVAL=0)
+class SessionBatchUpdateViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="batchuser@example.com", password="pass123"
+        )
+        self.category = Category.objects.create(name="TestCategory")
+        self.product1 = Product.objects.create(
+            name="Product1", category=self.category, price=1000, stock=10
+        )
+        self.product2 = Product.objects.create(
+            name="Product2", category=self.category, price=2000, stock=5
+        )
+        self.url = reverse("cart:session-batch")
+
+    def post_operations(self, operations):
+        return self.client.post(
+            self.url,
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+
+    def test_batch_applies_operations_and_merges_once(self):
+        self.client.login(email="batchuser@example.com", password="pass123")
+        response = self.post_operations(
+            [
+                {"action": "add", "product_id": self.product1.id, "quantity": 3},
+                {"action": "add", "product_id": self.product2.id},
+                {"action": "decrease", "product_id": self.product1.id},
+                {"action": "add", "product_id": self.product2.id, "quantity": 9},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [result["ok"] for result in data["results"]], [True, True, True, False]
+        )
+        self.assertEqual(data["total_quantity"], 3)
+
+        items = {
+            item.product_id: item.quantity
+            for item in CartItem.objects.filter(cart__user=self.user)
+        }
+        self.assertEqual(items, {self.product1.id: 2, self.product2.id: 1})
+
+    def test_batch_update_validates_quantities(self):
+        other = User.objects.create_user(email="holder@example.com", password="x")
+        reserve_items(other, {self.product2.id: 3})
+        self.client.login(email="batchuser@example.com", password="pass123")
+        response = self.post_operations(
+            [
+                {"action": "add", "product_id": self.product1.id, "quantity": 2},
+                {"action": "add", "product_id": self.product2.id},
+                {"action": "update", "product_id": self.product1.id, "quantity": -3},
+                {"action": "update", "product_id": self.product1.id, "quantity": 11},
+                # 5 in stock, 3 held by another checkout
+                {"action": "update", "product_id": self.product2.id, "quantity": 3},
+                {"action": "update", "product_id": self.product2.id, "quantity": 2},
+                {"action": "update", "product_id": self.product1.id, "quantity": 0},
+            ]
+        )
+        data = response.json()
+        self.assertEqual(
+            [result["ok"] for result in data["results"]],
+            [True, True, False, False, False, True, True],
+        )
+        items = {
+            item.product_id: item.quantity
+            for item in CartItem.objects.filter(cart__user=self.user)
+        }
+        self.assertEqual(items, {self.product2.id: 2})
+
+    def test_batch_accepts_form_encoded_operations(self):
+        response = self.client.post(
+            self.url,
+            {
+                "operations": json.dumps(
+                    [{"action": "add", "product_id": self.product1.id}]
+                )
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_quantity"], 1)
+
+    def test_batch_rejects_invalid_payload(self):
+        self.assertEqual(self.post_operations([]).status_code, 400)
+        self.assertEqual(
+            self.post_operations([{"action": "explode", "product_id": 1}]).status_code,
+            400,
+        )
+        too_many = [{"action": "add", "product_id": self.product1.id}] * 51
+        self.assertEqual(self.post_operations(too_many).status_code, 400)
+
+
+@override_settings(CART_DB_SYNC_INTERVAL=60)
+class CartWriteBehindSyncTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="syncuser@example.com", password="pass123"
+        )
+        self.category = Category.objects.create(name="TestCategory")
+        self.product = Product.objects.create(
+            name="Product1", category=self.category, price=1000, stock=10
+        )
+        self.session = SessionStore()
+
+    def db_quantity(self):
+        return CartItem.objects.get(cart__user=self.user).quantity
+
+    def test_changes_within_interval_are_deferred(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product.id)
+        self.assertTrue(cart.sync_to_db(self.user))
+        self.assertFalse(cart.is_dirty())
+
+        cart.add_product(self.product.id)
+        self.assertFalse(cart.sync_to_db(self.user))
+        self.assertTrue(cart.is_dirty())
+        self.assertEqual(self.db_quantity(), 1)
+
+        self.assertTrue(cart.sync_to_db(self.user, force=True))
+        self.assertEqual(self.db_quantity(), 2)
+
+    def test_clean_cart_skips_db(self):
+        cart = CartSession(self.session)
+        cart.add_product(self.product.id)
+        cart.sync_to_db(self.user, force=True)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                CartSession(self.session).sync_to_db(self.user, force=True)
+            )
+
+
+class PricingEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="pricing@example.com", password="pass123"
+        )
+        self.category = Category.objects.create(name="Pricing")
+        self.product1 = Product.objects.create(
+            name="Discounted",
+            category=self.category,
+            price=1005,
+            discount=15,
+            stock=10,
+            weight=2,
+            slug="discounted",
+        )
+        self.product2 = Product.objects.create(
+            name="Plain",
+            category=self.category,
+            price=2000,
+            stock=5,
+            weight=3,
+            slug="plain",
+        )
+
+    def test_price_rows_in_one_pass(self):
+        totals = pricing_engine.price(
+            [
+                ("a", UnitPrice(Decimal("900"), Decimal("100"), 2), 3),
+                ("b", UnitPrice(Decimal("50"), Decimal("0"), 1), 2),
+            ]
+        )
+        self.assertEqual(totals.quantity, 5)
+        self.assertEqual(totals.subtotal, Decimal("2800"))
+        self.assertEqual(totals.discount, Decimal("300"))
+        self.assertEqual(totals.weight, 8)
+        self.assertEqual(totals.shipping, Decimal("800"))
+        self.assertEqual(totals.total, Decimal("3600"))
+        self.assertEqual([line.key for line in totals.lines], ["a", "b"])
+
+    def test_unit_price_rounds_half_up(self):
+        unit = UnitPrice.from_product(self.product1)
+        self.assertEqual(unit.price, Decimal("854"))
+        self.assertEqual(unit.discount, Decimal("151"))
+        self.assertEqual(UnitPrice.from_snapshot(unit.to_snapshot()), unit)
+
+    def test_session_and_db_carts_agree(self):
+        session = SessionStore()
+        cart_session = CartSession(session)
+        cart_session.add_product(self.product1.id, 3)
+        cart_session.add_product(self.product2.id, 1)
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product1, quantity=3)
+        CartItem.objects.create(cart=cart, product=self.product2, quantity=1)
+
+        with self.assertNumQueries(1):
+            db_totals = cart.get_totals()
+        self.assertEqual(CartSession(session).get_totals(), db_totals.as_dict())
+
+
+class CartWithTotalsTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Totals")
+        # 1010 * 0.85 = 858.5, which rounds half to even: 858
+        self.product1 = Product.objects.create(
+            name="Half",
+            category=category,
+            price=1010,
+            discount=15,
+            stock=10,
+            weight=2,
+            slug="half",
+        )
+        self.product2 = Product.objects.create(
+            name="Whole",
+            category=category,
+            price=2000,
+            stock=10,
+            weight=3,
+            slug="whole",
+        )
+        for n in range(3):
+            user = User.objects.create_user(email=f"t{n}@example.com", password="x")
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product1, quantity=n + 1)
+            CartItem.objects.create(cart=cart, product=self.product2, quantity=1)
+        self.empty = Cart.objects.create(
+            user=User.objects.create_user(email="empty@example.com", password="x")
+        )
+
+    def test_sql_totals_match_pricing_engine(self):
+        self.assertEqual(self.product1.get_price(), Decimal("858"))
+        for cart in Cart.objects.with_totals():
+            totals = Cart.objects.get(pk=cart.pk).get_totals()
+            self.assertEqual(cart.item_count, len(totals.lines))
+            self.assertEqual(cart.total_quantity, totals.quantity)
+            self.assertEqual(cart.total_weight, totals.weight)
+            self.assertEqual(cart.total_amount, totals.subtotal)
+            self.assertEqual(cart.total_discount, totals.discount)
+            self.assertEqual(cart.get_shipping_cost(), totals.shipping)
+
+    def test_sql_rounds_like_get_price(self):
+        category = Category.objects.get(name="Totals")
+        user = User.objects.create_user(email="round@example.com", password="x")
+        cart = Cart.objects.create(user=user)
+        # 858.5 → 858, 875.5 → 876, 850.85 → 851, 849.15 → 849
+        for price, discount in ((1010, 15), (1030, 15), (1001, 15), (999, 15)):
+            product = Product.objects.create(
+                name=f"Round {price}",
+                category=category,
+                price=price,
+                discount=discount,
+                stock=1,
+                slug=f"round-{price}",
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            with self.subTest(price=price):
+                totals = Cart.objects.with_totals().get(pk=cart.pk)
+                CartItem.objects.filter(cart=cart).delete()
+                self.assertEqual(totals.total_amount, product.get_price())
+
+    def test_empty_cart_totals(self):
+        cart = Cart.objects.with_totals().get(pk=self.empty.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_items(), 0)
+            self.assertEqual(cart.get_total_price(), Decimal("0"))
+            self.assertEqual(cart.get_shipping_cost(), Decimal("0"))
+
+    def test_admin_changelist_queries_do_not_grow(self):
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_login(admin)
+        url = reverse("admin:cart_cart_changelist")
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(url)
+        # one Half (1010, 858 after discount) and one Whole (2000)
+        self.assertContains(response, "3010")
+        self.assertContains(response, "2858")
+        # both price columns sort in SQL
+        for column in ("-5", "6"):
+            self.assertEqual(self.client.get(url, {"o": column}).status_code, 200)
+
+        for n in range(5):
+            user = User.objects.create_user(email=f"more{n}@example.com", password="x")
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product1, quantity=1)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+
+class ExportAbandonedCartsTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Abandoned")
+        self.product = Product.objects.create(
+            name="Left",
+            category=category,
+            price=1000,
+            discount=10,
+            stock=10,
+            weight=2,
+            slug="left",
+        )
+        self.abandoned = self.make_cart("old@example.com", quantity=3)
+        self.make_cart("fresh@example.com", quantity=1, stale=False)
+        self.make_cart("empty@example.com", quantity=0)
+
+    def make_cart(self, email, quantity, stale=True):
+        cart = Cart.objects.create(
+            user=User.objects.create_user(email=email, password="x")
+        )
+        if quantity:
+            CartItem.objects.create(cart=cart, product=self.product, quantity=quantity)
+        if stale:
+            past = timezone.now() - timedelta(days=2)
+            Cart.objects.filter(pk=cart.pk).update(updated_at=past)
+            CartItem.objects.filter(cart=cart).update(updated_at=past)
+        return cart
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("export_abandoned_carts", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_export(self):
+        out, err = self.export("--format", "jsonl", "--idle-hours", "24")
+        rows = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], self.abandoned.id)
+        self.assertEqual(rows[0]["user__email"], "old@example.com")
+        self.assertEqual(rows[0]["total_quantity"], 3)
+        self.assertEqual(rows[0]["total_weight"], 6)
+        self.assertEqual(rows[0]["total_amount"], "2700")
+        self.assertIn("Exported 1 abandoned carts.", err)
+
+    def test_recent_item_activity_keeps_cart_active(self):
+        CartItem.objects.filter(cart=self.abandoned).update(updated_at=timezone.now())
+        out, _ = self.export("--format", "jsonl")
+        self.assertEqual(out, "")
+
+    def test_csv_export_in_chunks(self):
+        self.make_cart("old2@example.com", quantity=1)
+        out, _ = self.export("--chunk-size", "1")
+        rows = list(csv.reader(StringIO(out)))
+        self.assertEqual(rows[0][:3], ["id", "user_id", "user__email"])
+        self.assertEqual(
+            [row[2] for row in rows[1:]], ["old@example.com", "old2@example.com"]
+        )
@@ -1,7 +1,8 @@
+import json
 from typing import Any
 from django.views.generic import View, TemplateView
 from django.http import JsonResponse
-from shop.models import Product
+from shop.catalog import get_product
 from .cart import CartSession
 
 
@@ -18,9 +19,9 @@ class BaseCartActionView(View):
 
         action_result = self.perform_action(request) or {}
 
-        # Merge session cart with database cart for authenticated users
+        # Reconcile session cart with database cart (write-behind) for authenticated users
         if request.user.is_authenticated:
-            self.cart.merge_session_cart_in_db(request.user)
+            self.cart.sync_to_db(request.user)
 
         response_data = {
             "cart": self.cart.get_cart_dict(),
@@ -46,10 +47,7 @@ class SessionAddProductView(BaseCartActionView):
         """
         product_id = request.POST.get("product_id")
         added = False
-        if (
-            product_id
-            and Product.objects.filter(id=product_id, available=True).exists()
-        ):
+        if product_id and get_product(product_id) is not None:
             added = self.cart.add_product(product_id)
 
         return {"added": added}
@@ -108,6 +106,88 @@ class SessionClearCartView(BaseCartActionView):
         return {}
 
 
+class SessionBatchUpdateView(BaseCartActionView):
+    """
+    Apply several cart operations in one request and merge to the database once.
+
+    Expects a JSON list of operations, either as the request body
+    ({"operations": [...]}) or as an "operations" form field, e.g.:
+        [{"action": "add", "product_id": 3, "quantity": 2},
+         {"action": "remove", "product_id": 5}]
+    """
+
+    MAX_OPERATIONS = 50
+    ACTIONS = ("add", "decrease", "update", "remove", "clear")
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validate the operation list before running the common cart flow.
+        """
+        try:
+            self.operations = self.parse_operations(request)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        return super().post(request, *args, **kwargs)
+
+    def parse_operations(self, request):
+        """
+        Return the list of operations from the request or raise ValueError.
+        """
+        try:
+            if request.content_type == "application/json":
+                payload = json.loads(request.body or b"{}").get("operations")
+            else:
+                payload = json.loads(request.POST.get("operations", "[]"))
+        except (AttributeError, json.JSONDecodeError):
+            raise ValueError("فرمت درخواست نامعتبر است")
+
+        if not isinstance(payload, list) or not payload:
+            raise ValueError("هیچ عملیاتی ارسال نشده است")
+        if len(payload) > self.MAX_OPERATIONS:
+            raise ValueError(
+                f"حداکثر {self.MAX_OPERATIONS} عملیات در هر درخواست مجاز است"
+            )
+        for operation in payload:
+            if not isinstance(operation, dict):
+                raise ValueError("فرمت درخواست نامعتبر است")
+            if operation.get("action") not in self.ACTIONS:
+                raise ValueError("عملیات نامعتبر است")
+        return payload
+
+    def perform_action(self, request):
+        """
+        Apply every operation to the session cart in order.
+        """
+        self.cart.prefetch_products(
+            op.get("product_id")
+            for op in self.operations
+            if op["action"] in ("add", "update")
+        )
+
+        results = []
+        for operation in self.operations:
+            action = operation["action"]
+            product_id = operation.get("product_id")
+            if action == "clear":
+                self.cart.clear()
+                ok = True
+            elif not product_id:
+                ok = False
+            elif action == "add":
+                ok = self.cart.add_product(product_id, operation.get("quantity", 1))
+            elif action == "decrease":
+                ok = self.cart.decrease_product_quantity(product_id)
+            elif action == "update":
+                ok = self.cart.update_product_quantity(
+                    product_id, operation.get("quantity")
+                )
+            else:
+                ok = self.cart.remove_product(product_id)
+            results.append({"action": action, "product_id": product_id, "ok": ok})
+
+        return {"results": results}
+
+
 class CartSummaryView(TemplateView):
     """
     Display cart summary page with all cart items and pricing information.
@@ -0,0 +1,86 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+VERSION_KEY_PREFIX = "version"
+FRAGMENT_KEY_PREFIX = "fragment"
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(namespace):
+    return f"{VERSION_KEY_PREFIX}:{namespace}"
+
+
+def _initial_version():
+    # a counter that was evicted restarts above every number it handed out,
+    # so entries stored under old versions can never be read again
+    return time.time_ns() // 1000
+
+
+def get_cache_version(namespace):
+    """
+    Return the current version number for a cache namespace.
+    The counter lives in the shared cache so every process sees bumps.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # add() keeps a concurrent bump from being overwritten
+        version = _initial_version()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(namespace):
+    """
+    Increment the version of a cache namespace, invalidating
+    every entry that was stored under the previous version.
+    """
+    key = _version_key(namespace)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # key missing or evicted; start a fresh counter
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+    else:
+        # file and database caches store incr() results with the default timeout
+        cache.touch(key, None)
+    return version
+
+
+def cached_inclusion_tag(register, template_name, namespaces, timeout=None):
+    """
+    Register `func` as a template tag that renders `template_name` with the
+    context dict returned by func, caching the rendered HTML.
+
+    The cache key combines the tag name, its arguments and the current version
+    of every namespace in `namespaces`, so bumping any of them (e.g. from a
+    post_save signal) makes the next render rebuild the fragment.
+    """
+    if timeout is None:
+        timeout = FRAGMENT_CACHE_TIMEOUT
+
+    def decorator(func):
+        @wraps(func)
+        def tag(*args, **kwargs):
+            versions = [get_cache_version(namespace) for namespace in namespaces]
+            signature = repr((args, sorted(kwargs.items()), versions))
+            digest = hashlib.md5(signature.encode()).hexdigest()
+            key = f"{FRAGMENT_KEY_PREFIX}:{func.__name__}:{digest}"
+
+            html = cache.get(key)
+            if html is None:
+                html = render_to_string(template_name, func(*args, **kwargs))
+                cache.set(key, html, timeout)
+            return mark_safe(html)
+
+        register.simple_tag(tag, name=func.__name__)
+        return func
+
+    return decorator
@@ -0,0 +1,103 @@
+from django.core.exceptions import BadRequest
+
+# rough relative costs used by ListingGuardMixin.estimate_query_cost
+ROW_COST = 5
+OFFSET_ROW_COST = 0.05
+MAX_QUERY_COST = 400
+
+
+class ListingGuardMixin:
+    """
+    ListView mixin that keeps listing requests within a known cost.
+
+    - `page_size` is clamped to `max_page_size`.
+    - `order_by` must be a key of `orderings`; each value is an ORM ordering
+      ending in a unique column and should be backed by an index.
+    - Query parameters listed in `filter_costs` add their cost to the estimate;
+      too expensive requests first fall back to the default page size and are
+      rejected with 400 if that is still not enough.
+    - Deep pages are not rejected: the paginator's count is capped at the rows
+      the budget can OFFSET past, so a BoundedPaginator clamps larger page
+      numbers and continues by cursor from the last affordable page.
+    """
+
+    orderings = {}
+    default_ordering = None
+    max_page_size = 48
+    filter_costs = {}
+    max_query_cost = MAX_QUERY_COST
+
+    def get_ordering_key(self):
+        """
+        Return the requested ordering key if whitelisted, else the default one.
+        """
+        key = self.request.GET.get("order_by")
+        return key if key in self.orderings else self.default_ordering
+
+    def get_ordering(self):
+        key = self.get_ordering_key()
+        return self.orderings.get(key) if key else None
+
+    def _requested_page_size(self):
+        try:
+            page_size = int(self.request.GET.get("page_size", self.paginate_by))
+        except (TypeError, ValueError):
+            return self.paginate_by
+        return max(1, min(page_size, self.max_page_size))
+
+    def _requested_page(self):
+        try:
+            return max(1, int(self.request.GET.get(self.page_kwarg, 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def _base_cost(self, page_size):
+        """
+        Return the cost of a first page: rows rendered and non-indexed filters.
+        """
+        return page_size * ROW_COST + sum(
+            weight
+            for param, weight in self.filter_costs.items()
+            if self.request.GET.get(param)
+        )
+
+    def estimate_query_cost(self, page_size):
+        """
+        Return an estimate of the work a request does: rows rendered, rows
+        skipped by OFFSET and the cost of non-indexed filters in use.
+        """
+        cost = self._base_cost(page_size)
+        if self.page_kwarg in self.request.GET:
+            cost += (self._requested_page() - 1) * page_size * OFFSET_ROW_COST
+        return cost
+
+    def get_max_page(self, page_size):
+        """
+        Return the deepest page number whose OFFSET still fits the budget.
+        """
+        spare = self.max_query_cost - self._base_cost(page_size)
+        return 1 + max(0, int(spare // (page_size * OFFSET_ROW_COST)))
+
+    def get_paginate_by(self, queryset):
+        """
+        Return a bounded page size, degraded to the default if the request
+        is too expensive. Raises BadRequest when even its first page is.
+        """
+        page_size = self._requested_page_size()
+        if self.estimate_query_cost(page_size) <= self.max_query_cost:
+            return page_size
+        page_size = min(page_size, self.paginate_by)
+        if self._base_cost(page_size) <= self.max_query_cost:
+            return page_size
+        raise BadRequest("Listing request is too expensive")
+
+    def get_paginator(self, queryset, per_page, *args, **kwargs):
+        """
+        Cap a bounded count at the rows the budget can page through.
+        """
+        paginator = super().get_paginator(queryset, per_page, *args, **kwargs)
+        if hasattr(paginator, "max_count"):
+            paginator.max_count = min(
+                paginator.max_count, self.get_max_page(per_page) * per_page
+            )
+        return paginator
@@ -0,0 +1,339 @@
+import datetime
+import hashlib
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+CURSOR_SALT = "core.pagination.cursor"
+# offset pagination never counts past this many rows
+MAX_COUNT = 10_000
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+
+def _serialize_value(value):
+    # full precision: DjangoJSONEncoder would truncate datetimes to milliseconds
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    """
+    Return an opaque, signed cursor for a row's ordering values.
+    """
+    return signing.dumps(
+        {"v": [_serialize_value(value) for value in values], "d": direction},
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(cursor):
+    """
+    Return (values, direction) for a cursor made by encode_cursor.
+    Raises ValueError when the cursor was tampered with or is malformed.
+    """
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        values, direction = data["v"], data["d"]
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if direction not in ("next", "previous") or not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values, direction
+
+
+def _field_name(ordering):
+    return ordering.lstrip("-")
+
+
+def _reverse(ordering):
+    return ordering[1:] if ordering.startswith("-") else f"-{ordering}"
+
+
+class CursorPage:
+    """
+    A page of a CursorPaginator.
+    Exposes has_next/has_previous like a Django Page, with cursors instead
+    of page numbers; next_url and previous_url are filled in by the view.
+    """
+
+    is_cursor = True
+
+    def __init__(
+        self, object_list, has_next, has_previous, next_cursor, previous_cursor
+    ):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_url = None
+        self.previous_url = None
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    Keyset paginator: pages are fetched with a WHERE on the ordering
+    columns of the last row seen instead of OFFSET, and no COUNT is run,
+    so page 1000 costs the same as page 1.
+
+    `ordering` must be unique and made of concrete model fields,
+    e.g. ("-created_at", "-id").
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def _to_python(self, values):
+        opts = self.queryset.model._meta
+        if len(values) != len(self.ordering):
+            raise ValueError("Invalid cursor")
+        try:
+            return [
+                opts.get_field(_field_name(field)).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception as exc:
+            raise ValueError("Invalid cursor") from exc
+
+    def _row_values(self, obj):
+        opts = self.queryset.model._meta
+        return [
+            getattr(obj, opts.get_field(_field_name(field)).attname)
+            for field in self.ordering
+        ]
+
+    @staticmethod
+    def _after(ordering, values):
+        """
+        Build the keyset condition for rows that follow `values` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        for position, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            clause = Q(**{f"{_field_name(field)}__{lookup}": values[position]})
+            for previous, value in zip(ordering[:position], values):
+                clause &= Q(**{_field_name(previous): value})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the CursorPage that follows (or precedes) the given cursor.
+        Raises ValueError for an invalid cursor.
+        """
+        values, direction = None, "next"
+        if cursor:
+            raw, direction = decode_cursor(cursor)
+            values = self._to_python(raw)
+
+        ordering = self.ordering
+        if direction == "previous":
+            ordering = tuple(_reverse(field) for field in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if direction == "previous":
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._row_values(rows[-1]), "next")
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._row_values(rows[0]), "previous")
+        return CursorPage(rows, has_next, has_previous, next_cursor, previous_cursor)
+
+
+def bounded_count(queryset, limit=MAX_COUNT, cache_version=None):
+    """
+    Return queryset.count(), but never count past `limit` rows.
+    When cache_version is given the result is cached under the query's SQL
+    and that version, so callers should pass a version that changes with
+    the underlying rows.
+    """
+    queryset = queryset.order_by()
+    if queryset.query.is_empty():
+        # .none() querysets have no SQL to key the cache on
+        return 0
+    key = None
+    if cache_version is not None:
+        sql, params = queryset.values("pk").query.sql_with_params()
+        digest = hashlib.md5(f"{sql}|{params}|{limit}".encode()).hexdigest()
+        key = f"count:{cache_version}:{digest}"
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+    count = queryset[:limit].count()
+    if key is not None:
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class BoundedPaginator(Paginator):
+    """
+    Offset paginator whose COUNT stops at max_count rows and is optionally cached.
+
+    When more rows exist (is_capped), num_pages only covers the counted rows:
+    larger page numbers are clamped to the last counted page, and views
+    continue from there in cursor mode (see CursorPaginationMixin).
+    """
+
+    _capped = False
+
+    def __init__(self, *args, max_count=MAX_COUNT, cache_version=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_count = max_count
+        self.cache_version = cache_version
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, "query"):
+            return len(self.object_list)
+        # counting one row past the cap tells whether more rows exist
+        count = bounded_count(
+            self.object_list, self.max_count + 1, cache_version=self.cache_version
+        )
+        self._capped = count > self.max_count
+        return min(count, self.max_count)
+
+    @property
+    def is_capped(self):
+        """
+        True when there are more rows than max_count, so num_pages is a lower bound.
+        """
+        return self.count is not None and self._capped
+
+    def validate_number(self, number):
+        if self.is_capped:
+            try:
+                if int(number) > self.num_pages:
+                    return self.num_pages
+            except (TypeError, ValueError):
+                pass
+        return super().validate_number(number)
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin adding an opt-in keyset pagination mode.
+
+    Requests carrying a `cursor` parameter (an empty one starts at the first
+    page) are paginated with CursorPaginator on `cursor_ordering`; all other
+    requests keep page numbers, with a bounded count.
+    """
+
+    paginator_class = BoundedPaginator
+    cursor_ordering = ("-id",)
+    cursor_param = "cursor"
+
+    def get_cursor_ordering(self, queryset):
+        """
+        Return the keyset ordering for queryset, or None when the current
+        ordering cannot be paginated by cursor.
+        """
+        return self.cursor_ordering
+
+    def get_count_cache_version(self):
+        """
+        Return a version to cache the page count under, or None for no caching.
+        """
+        return None
+
+    def use_cursor_pagination(self):
+        return self.cursor_param in self.request.GET
+
+    def get_paginator(
+        self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs
+    ):
+        return self.paginator_class(
+            queryset,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            cache_version=self.get_count_cache_version(),
+            **kwargs,
+        )
+
+    def _continue_in_cursor_mode(self, paginator, page, ordering):
+        """
+        Link the last counted page of a capped count to a cursor page that
+        picks up after its last row, as next_url.
+        """
+        if not getattr(paginator, "is_capped", False):
+            return
+        if page.has_next() or not len(page):
+            return
+        cursor_paginator = CursorPaginator(
+            paginator.object_list, paginator.per_page, ordering
+        )
+        values = cursor_paginator._row_values(page[len(page) - 1])
+        page.next_url = self._cursor_url(encode_cursor(values, "next"))
+
+    def _cursor_url(self, cursor):
+        query = self.request.GET.copy()
+        query.pop("page", None)
+        query[self.cursor_param] = cursor
+        return f"?{query.urlencode()}"
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_cursor_ordering(queryset)
+        if not (ordering and self.use_cursor_pagination()):
+            paginator, page, object_list, is_paginated = super().paginate_queryset(
+                queryset, page_size
+            )
+            if ordering:
+                self._continue_in_cursor_mode(paginator, page, ordering)
+            return paginator, page, object_list, is_paginated
+
+        try:
+            paginator = CursorPaginator(queryset, page_size, ordering)
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except ValueError:
+            raise Http404("Invalid cursor")
+        if page.next_cursor:
+            page.next_url = self._cursor_url(page.next_cursor)
+        if page.previous_cursor:
+            page.previous_url = self._cursor_url(page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sites",
     "django.contrib.sitemaps",
     "django.contrib.humanize",
+    "django.contrib.postgres",
     "website",
     "accounts",
     "blog",
@@ -103,6 +104,10 @@ DATABASES = {
         "PASSWORD": os.environ.get("DATABASE_PASSWORD"),
         "HOST": os.environ.get("DATABASE_HOST", "localhost"),
         "PORT": os.environ.get("DATABASE_PORT", 5432),
+        "OPTIONS": {
+            # minimum word similarity of fuzzy product search matches (shop.search)
+            "options": "-c pg_trgm.word_similarity_threshold=0.3",
+        },
     }
 }
 
@@ -176,6 +181,61 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Cache
+# Version counters and cached products must be shared by every process
+# (web workers, process_outbox, management commands), so the default is
+# a file cache; set CACHE_BACKEND=redis or db in production
+CACHE_BACKENDS = {
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        str(BASE_DIR / "var" / "cache"),
+    ),
+    "redis": (
+        "django.core.cache.backends.redis.RedisCache",
+        "redis://localhost:6379/1",
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "django_cache"),
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", ""),
+}
+CACHE_BACKEND = config("CACHE_BACKEND", default="file")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": config("CACHE_LOCATION", default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+    }
+}
+
+# Cart
+# Seconds between write-behind syncs of the session cart into the DB cart
+# (0 writes through on every change)
+CART_DB_SYNC_INTERVAL = config("CART_DB_SYNC_INTERVAL", default=30, cast=int)
+# Seconds a checkout holds cart items out of everyone else's available stock
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", default=600, cast=int)
+# Seconds a session cart's totals snapshot is trusted before it is rebuilt
+CART_TOTALS_MAX_AGE = config("CART_TOTALS_MAX_AGE", default=300, cast=int)
+
+# Rendered shipping invoice PDFs, keyed by order and its update time
+INVOICE_CACHE_DIR = config(
+    "INVOICE_CACHE_DIR", default=str(BASE_DIR / "var" / "invoices")
+)
+# Invoice stylesheet (relative to STATICFILES_DIRS), parsed once per process
+INVOICE_STYLESHEET = "assets/css/shipping_invoice.css"
+# Processes rendering bulk invoice exports; 0 renders them inline
+INVOICE_BULK_WORKERS = config("INVOICE_BULK_WORKERS", default=4, cast=int)
+# Upper bound on the orders a single staff bulk export may print
+INVOICE_BULK_MAX_ORDERS = config("INVOICE_BULK_MAX_ORDERS", default=1000, cast=int)
+
+# Order outbox worker (process_outbox): retries back off exponentially
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+OUTBOX_RETRY_DELAY = config("OUTBOX_RETRY_DELAY", default=60, cast=int)
+# seconds a claimed message stays hidden from other workers
+OUTBOX_LEASE = config("OUTBOX_LEASE", default=300, cast=int)
+
+# Dotted path to the callable that quotes shipping: (weight, subtotal, province)
+SHIPPING_CALCULATOR = config(
+    "SHIPPING_CALCULATOR", default="order.shipping.quote_shipping"
+)
+
 # Authentication Redirect URLs
 LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = "website:index"
@@ -0,0 +1,19 @@
+from django.db import connection
+
+
+class IndexUsageMixin:
+    """
+    TestCase mixin for checking that a hot query is served by an index.
+    """
+
+    def assertUsesIndex(self, queryset, index_name):
+        """
+        EXPLAIN the queryset and assert index_name shows up in the plan.
+        Sequential scans are disabled on Postgres for the check, since the
+        planner never picks an index for the tiny tables used in tests.
+        """
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=f"{index_name} not used:\n{plan}")
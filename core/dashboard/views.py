@@ -6,12 +6,14 @@ from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Prefetch, Count
+from django.db.models import Prefetch, Count, Q
 from django.http import JsonResponse
 
+from core.pagination import CursorPaginationMixin
 from shop.models import Wishlist, Product
 from accounts.models import Profile
 from order.models import Order, OrderItem
+from order.numbers import normalize_order_number_query, order_number_prefix_q
 
 from .forms import PersonalInfoForm, ChangePasswordForm
 
@@ -33,7 +35,7 @@ class DashboardAddressesView(LoginRequiredMixin, DetailView):
         return self.request.user.user_profile
 
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """
     Display a paginated list of user orders.
     """
@@ -42,6 +44,7 @@ class OrderListView(LoginRequiredMixin, ListView):
     template_name = "dashboard/orders.html"
     context_object_name = "orders"
     paginate_by = 10
+    cursor_ordering = ("-created_date", "-id")
 
     def get_queryset(self):
         """
@@ -66,7 +69,11 @@ class OrderListView(LoginRequiredMixin, ListView):
 
         search_query = self.request.GET.get("search")
         if search_query:
-            queryset = queryset.filter(order_number__icontains=search_query)
+            prefix = normalize_order_number_query(search_query)
+            if prefix:
+                queryset = queryset.filter(order_number_prefix_q(prefix))
+            else:
+                queryset = queryset.none()
 
         return queryset
 
@@ -76,24 +83,12 @@ class OrderListView(LoginRequiredMixin, ListView):
         """
         context = super().get_context_data(**kwargs)
 
-        context["order_stats"] = {
-            "all": Order.objects.filter(user=self.request.user).count(),
-            "pending": Order.objects.filter(
-                user=self.request.user, status="pending"
-            ).count(),
-            "processing": Order.objects.filter(
-                user=self.request.user, status="processing"
-            ).count(),
-            "shipped": Order.objects.filter(
-                user=self.request.user, status="shipped"
-            ).count(),
-            "delivered": Order.objects.filter(
-                user=self.request.user, status="delivered"
-            ).count(),
-            "cancelled": Order.objects.filter(
-                user=self.request.user, status="cancelled"
-            ).count(),
-        }
+        # one conditional aggregate instead of a COUNT per status
+        statuses = [status for status, _ in Order.ORDER_STATUS_CHOICES]
+        context["order_stats"] = Order.objects.filter(user=self.request.user).aggregate(
+            all=Count("id"),
+            **{status: Count("id", filter=Q(status=status)) for status in statuses},
+        )
 
         context["current_status"] = self.request.GET.get("status", "all")
         context["search_query"] = self.request.GET.get("search", "")
@@ -218,7 +213,7 @@ class DashboardWalletView(LoginRequiredMixin, ListView):
         return context
 
 
-class DashboardWishlistView(LoginRequiredMixin, ListView):
+class DashboardWishlistView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """
     Display user's wishlist items.
     """
@@ -227,13 +222,16 @@ class DashboardWishlistView(LoginRequiredMixin, ListView):
     template_name = "dashboard/wishlist.html"
     context_object_name = "wishlist_items"
     paginate_by = 12
+    cursor_ordering = ("-id",)
 
     def get_queryset(self):
         """
         Return wishlist items with optimized related data.
         """
-        return Wishlist.objects.filter(user=self.request.user).select_related(
-            "product", "product__brand", "product__category"
+        return (
+            Wishlist.objects.filter(user=self.request.user)
+            .select_related("product", "product__brand", "product__category")
+            .order_by("-id")
         )
 
     def get_context_data(self, **kwargs):
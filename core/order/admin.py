@@ -1,8 +1,16 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from django.contrib import admin
 
-from .models import Order, OrderItem, Address
+from .models import (
+    Order,
+    OrderItem,
+    Address,
+    OutboxMessage,
+    ShippingRate,
+    StockReservation,
+)
 
 
 @admin.register(Address)
@@ -255,3 +263,86 @@ class OrderItemAdmin(admin.ModelAdmin):
         Prevent deleting order items from admin.
         """
         return False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """
+    Read-only admin for checkout stock reservations.
+    """
+
+    list_display = ("product", "user", "quantity", "expires_at", "created_date")
+    list_select_related = ("product", "user")
+    search_fields = ("product__name", "user__email")
+    readonly_fields = ("user", "product", "quantity", "expires_at", "created_date")
+
+    def has_add_permission(self, request):
+        """
+        Reservations are only created by checkout.
+        """
+        return False
+
+
+@admin.register(ShippingRate)
+class ShippingRateAdmin(admin.ModelAdmin):
+    """
+    Admin for shipping rate tables; saving a band reloads the tables.
+    """
+
+    list_display = (
+        "province",
+        "min_weight",
+        "base_cost",
+        "cost_per_weight",
+        "free_shipping_threshold",
+        "is_active",
+    )
+    list_editable = ("base_cost", "cost_per_weight", "is_active")
+    list_filter = ("is_active", "province")
+    search_fields = ("province",)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the order outbox, with an action to retry messages.
+    """
+
+    list_display = (
+        "topic",
+        "idempotency_key",
+        "status",
+        "attempts",
+        "available_at",
+        "processed_at",
+    )
+    list_filter = ("status", "topic")
+    search_fields = ("idempotency_key",)
+    readonly_fields = (
+        "topic",
+        "payload",
+        "idempotency_key",
+        "status",
+        "attempts",
+        "available_at",
+        "last_error",
+        "claimed_by",
+        "created_date",
+        "processed_at",
+    )
+    actions = ["retry_now"]
+
+    def has_add_permission(self, request):
+        """
+        Messages are only created by the order code.
+        """
+        return False
+
+    def retry_now(self, request, queryset):
+        """Custom action to queue failed or pending messages again right away"""
+        updated = queryset.exclude(status="done").update(
+            status="pending", attempts=0, available_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} message(s) were queued for retry.")
+
+    retry_now.short_description = "Retry selected messages now"
@@ -43,3 +43,45 @@ class CheckoutForm(forms.ModelForm):
         self.fields["shipping_address"].label_from_instance = (
             lambda obj: f"{obj.label} - {obj.get_short_address()}"
         )
+
+
+class InvoiceExportForm(forms.Form):
+    """
+    Filters for the bulk shipping invoice export.
+    """
+
+    FORMAT_CHOICES = (
+        ("zip", "فایل ZIP (یک PDF برای هر سفارش)"),
+        ("pdf", "یک فایل PDF"),
+    )
+
+    status = forms.ChoiceField(
+        choices=(("", "همه وضعیت‌ها"),) + Order.ORDER_STATUS_CHOICES,
+        required=False,
+        label="وضعیت سفارش",
+    )
+    date_from = forms.DateField(required=False, label="از تاریخ")
+    date_to = forms.DateField(required=False, label="تا تاریخ")
+    format = forms.ChoiceField(
+        choices=FORMAT_CHOICES, required=False, initial="zip", label="نوع خروجی"
+    )
+
+    def __init__(self, *args, allow_merged_pdf=False, **kwargs):
+        """
+        The merged PDF is one long WeasyPrint job, so only the
+        export_invoices command offers it; web exports stream a ZIP.
+        """
+        super().__init__(*args, **kwargs)
+        if not allow_merged_pdf:
+            self.fields["format"].choices = [
+                choice for choice in self.FORMAT_CHOICES if choice[0] != "pdf"
+            ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("تاریخ شروع نباید بعد از تاریخ پایان باشد")
+        cleaned_data["format"] = cleaned_data.get("format") or "zip"
+        return cleaned_data
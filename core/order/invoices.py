@@ -0,0 +1,244 @@
+import logging
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .models import Order
+from .pdf import RendererConfig, html_to_pdf
+from .store_settings import STORE_INFO
+from .summary import OrderSummary
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TEMPLATE = "order/shipping_invoice_pdf.html"
+BULK_INVOICE_TEMPLATE = "order/shipping_invoice_bulk_pdf.html"
+
+
+def invoice_version(updated_date):
+    """
+    Return the cache version of an invoice: the order's update time in µs.
+    """
+    return str(int(updated_date.timestamp() * 1_000_000))
+
+
+def invoice_etag(order_id, updated_date):
+    return f'"invoice-{order_id}-{invoice_version(updated_date)}"'
+
+
+def invoice_path(order_id, updated_date):
+    """
+    Return the on-disk cache path of an order's invoice PDF.
+    A new updated_date gives a new path, so stale files are never served.
+    """
+    return Path(settings.INVOICE_CACHE_DIR) / (
+        f"order_{order_id}_{invoice_version(updated_date)}.pdf"
+    )
+
+
+def invoice_context(order):
+    """
+    Return the template context of an order's shipping invoice.
+    Load the order through OrderSummary.queryset() to avoid per-item queries.
+    """
+    context = OrderSummary(order).get_context_data()
+    context["store"] = STORE_INFO
+    return context
+
+
+def renderer_config():
+    """
+    Return the picklable renderer configuration passed to PDF workers.
+    """
+    return RendererConfig(
+        settings.INVOICE_STYLESHEET,
+        tuple(str(path) for path in settings.STATICFILES_DIRS),
+        settings.STATIC_URL,
+    )
+
+
+def invoice_html(order):
+    return render_to_string(INVOICE_TEMPLATE, invoice_context(order))
+
+
+def render_invoice_pdf(order):
+    """
+    Render an order's shipping invoice to PDF bytes.
+    """
+    return html_to_pdf(invoice_html(order), renderer_config())
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _remove_stale_versions(order_id, keep):
+    for stale in keep.parent.glob(f"order_{order_id}_*.pdf"):
+        if stale != keep:
+            stale.unlink(missing_ok=True)
+
+
+def get_invoice_pdf(order):
+    """
+    Return the path of the cached invoice PDF for `order`, rendering it
+    first when the cache has no file for the order's current version.
+    """
+    path = invoice_path(order.id, order.updated_date)
+    if not path.exists():
+        _write_atomic(path, render_invoice_pdf(order))
+        _remove_stale_versions(order.id, path)
+    return path
+
+
+def prerender_invoice(order_id):
+    """
+    Render an order's invoice into the cache, logging instead of raising
+    so a failed pre-render only means the first download renders it.
+    """
+    try:
+        get_invoice_pdf(OrderSummary.queryset().get(id=order_id))
+    except Order.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception("Rendering the invoice of order %s failed", order_id)
+
+
+# ---------- Bulk export ----------
+
+
+def invoice_orders(status=None, date_from=None, date_to=None):
+    """
+    Return the orders to print for a bulk export, oldest first, with
+    their items prefetched for the invoice template.
+    """
+    orders = OrderSummary.queryset()
+    if status:
+        orders = orders.filter(status=status)
+    if date_from:
+        orders = orders.filter(created_date__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(created_date__date__lte=date_to)
+    return orders.order_by("created_date", "id")
+
+
+def _process_pool(workers):
+    """
+    Return (pool, workers); the pool is None when rendering inline.
+    """
+    if workers is None:
+        workers = settings.INVOICE_BULK_WORKERS
+    if workers <= 0:
+        return None, 0
+    return ProcessPoolExecutor(max_workers=workers), workers
+
+
+def iter_invoice_pdfs(orders, workers=None):
+    """
+    Yield (order, pdf bytes) for every order, in order.
+
+    Cached invoices are read from disk; the rest are rendered by a pool of
+    `workers` processes (settings.INVOICE_BULK_WORKERS by default, 0 renders
+    inline) and written to the cache. At most a few jobs per worker are
+    queued at a time, so memory stays flat however many orders are printed.
+    """
+    config = renderer_config()
+    pool, workers = _process_pool(workers)
+    window = workers * 4 if pool else 1
+    pending = deque()
+
+    def finish(order, path, result):
+        if isinstance(result, bytes):
+            return order, result
+        pdf = result.result()
+        _write_atomic(path, pdf)
+        _remove_stale_versions(order.id, path)
+        return order, pdf
+
+    try:
+        for order in orders:
+            path = invoice_path(order.id, order.updated_date)
+            try:
+                result = path.read_bytes()
+            except FileNotFoundError:
+                html = invoice_html(order)
+                if pool is None:
+                    result = html_to_pdf(html, config)
+                    _write_atomic(path, result)
+                    _remove_stale_versions(order.id, path)
+                else:
+                    result = pool.submit(html_to_pdf, html, config)
+            pending.append((order, path, result))
+            while len(pending) >= window:
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+class _StreamBuffer:
+    """
+    Write-only file object for zipfile that hands written bytes back to
+    a generator instead of holding the whole archive.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_invoice_zip(orders, workers=None):
+    """
+    Yield a ZIP archive of per-order invoice PDFs chunk by chunk, each
+    invoice as soon as it is rendered.
+    """
+    buffer = _StreamBuffer()
+    # PDFs are already compressed; storing them keeps the stream cheap
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for order, pdf in iter_invoice_pdfs(orders, workers=workers):
+            archive.writestr(f"shipping_invoice_{order.order_number}.pdf", pdf)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def render_merged_invoice_pdf(orders):
+    """
+    Render all orders' invoices as one PDF, one invoice per page break.
+
+    WeasyPrint cannot append already rendered PDFs, so the merged file is
+    a single document rendered in one job. It is slow for large exports
+    and only offered by the export_invoices command.
+    """
+    html = render_to_string(
+        BULK_INVOICE_TEMPLATE,
+        {
+            "store": STORE_INFO,
+            "invoices": [invoice_context(order) for order in orders],
+        },
+    )
+    return html_to_pdf(html, renderer_config())
@@ -0,0 +1,74 @@
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from order.numbers import next_order_number
+
+
+def _init_worker():
+    # never share the parent's database connections with a child process
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def _generate(count):
+    try:
+        return [next_order_number() for _ in range(count)]
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate order numbers concurrently across processes and check for "
+        "collisions. Consumes real sequence values of the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=100_000, help="Order numbers to generate"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=4,
+            help="Worker processes (1 generates in this process)",
+        )
+
+    def handle(self, *args, **options):
+        count, processes = options["count"], options["processes"]
+        if count < 1 or processes < 1:
+            raise CommandError("--count and --processes must be positive")
+
+        shares = [
+            count // processes + (i < count % processes) for i in range(processes)
+        ]
+        started = time.perf_counter()
+        if processes == 1:
+            batches = [[next_order_number() for _ in range(count)]]
+        else:
+            connections.close_all()
+            with Pool(processes, initializer=_init_worker) as pool:
+                batches = pool.map(_generate, shares)
+        elapsed = time.perf_counter() - started
+
+        numbers = [number for batch in batches for number in batch]
+        collisions = len(numbers) - len(set(numbers))
+        widths = {len(number) for number in numbers}
+        unordered = sum(
+            1 for batch in batches for a, b in zip(batch, batch[1:]) if a >= b
+        )
+        self.stdout.write(
+            f"{len(numbers)} numbers in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:,.0f}/s) across {processes} processes; "
+            f"widths {sorted(widths)}; out-of-order within a process: {unordered}"
+        )
+        if collisions or unordered:
+            raise CommandError(
+                f"{collisions} collisions, {unordered} out-of-order numbers"
+            )
+        self.stdout.write(self.style.SUCCESS("No collisions."))
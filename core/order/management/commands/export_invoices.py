@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from order.forms import InvoiceExportForm
+from order.invoices import invoice_orders, render_merged_invoice_pdf, stream_invoice_zip
+
+
+class Command(BaseCommand):
+    help = "Export shipping invoices of orders matching a status/date range as a ZIP or one PDF"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write the ZIP or PDF to")
+        parser.add_argument("--status", help="Only orders with this status")
+        parser.add_argument(
+            "--date-from", help="Orders placed on or after (YYYY-MM-DD)"
+        )
+        parser.add_argument("--date-to", help="Orders placed on or before (YYYY-MM-DD)")
+        parser.add_argument(
+            "--format",
+            choices=("zip", "pdf"),
+            default="zip",
+            help="A ZIP of per-order PDFs or one merged PDF",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Rendering processes for the ZIP (default settings.INVOICE_BULK_WORKERS)",
+        )
+
+    def handle(self, *args, **options):
+        form = InvoiceExportForm(
+            {
+                "status": options["status"] or "",
+                "date_from": options["date_from"] or "",
+                "date_to": options["date_to"] or "",
+                "format": options["format"],
+            },
+            allow_merged_pdf=True,
+        )
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        data = form.cleaned_data
+        orders = invoice_orders(data["status"], data["date_from"], data["date_to"])
+        count = orders.count()
+        with open(options["output"], "wb") as output:
+            if data["format"] == "pdf":
+                output.write(render_merged_invoice_pdf(orders))
+            else:
+                # chunked iteration keeps memory flat for large exports
+                for chunk in stream_invoice_zip(
+                    orders.iterator(chunk_size=200), workers=options["workers"]
+                ):
+                    output.write(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {count} invoices to {options['output']}.")
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued order side effects (emails, sales stats, invoice pre-renders)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Messages claimed per batch",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling instead of exiting once the queue is drained",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls of an empty queue with --loop",
+        )
+
+    def handle(self, *args, **options):
+        succeeded = failed = 0
+        while True:
+            done, errors = process_batch(options["batch_size"])
+            succeeded += done
+            failed += errors
+            if done + errors:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {succeeded} outbox messages ({failed} failed)."
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from order.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired checkout stock reservations"
+
+    def handle(self, *args, **options):
+        count = release_expired_reservations()
+        self.stdout.write(
+            self.style.SUCCESS(f"Released {count} expired stock reservations.")
+        )
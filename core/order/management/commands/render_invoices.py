@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from order.invoices import invoice_path, prerender_invoice
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = "Pre-render missing shipping invoice PDFs into the invoice cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            help="Order status to render (repeatable, default payment_verified)",
+        )
+
+    def handle(self, *args, **options):
+        statuses = options["status"] or ["payment_verified"]
+        orders = Order.objects.filter(status__in=statuses).values_list(
+            "id", "updated_date"
+        )
+        count = 0
+        for order_id, updated_date in orders.iterator():
+            if not invoice_path(order_id, updated_date).exists():
+                prerender_invoice(order_id)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered {count} invoices."))
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0003_stockreservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShippingRate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "province",
+                    models.CharField(blank=True, max_length=100, verbose_name="استان"),
+                ),
+                (
+                    "min_weight",
+                    models.PositiveIntegerField(default=0, verbose_name="حداقل وزن"),
+                ),
+                (
+                    "base_cost",
+                    models.DecimalField(
+                        decimal_places=0,
+                        default=0,
+                        max_digits=10,
+                        verbose_name="هزینه پایه",
+                    ),
+                ),
+                (
+                    "cost_per_weight",
+                    models.DecimalField(
+                        decimal_places=0,
+                        default=0,
+                        max_digits=10,
+                        verbose_name="هزینه هر واحد وزن",
+                    ),
+                ),
+                (
+                    "free_shipping_threshold",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=0,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="حداقل خرید برای ارسال رایگان",
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True, verbose_name="فعال")),
+            ],
+            options={
+                "verbose_name": "نرخ ارسال",
+                "verbose_name_plural": "نرخ\u200cهای ارسال",
+                "ordering": ["province", "min_weight"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("province", "min_weight"),
+                        name="unique_province_weight_band",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0004_shippingrate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderNumberSequence",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+            ],
+            options={
+                "verbose_name": "دنباله شماره سفارش",
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_recorded_orders(apps, schema_editor):
+    # orders placed before the outbox had their sales recorded at checkout;
+    # cancelled orders are kept out of the sales stats
+    Order = apps.get_model("order", "Order")
+    Order.objects.exclude(status="cancelled").update(sales_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0005_ordernumbersequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("topic", models.CharField(max_length=100, verbose_name="موضوع")),
+                ("payload", models.JSONField(default=dict, verbose_name="داده")),
+                (
+                    "idempotency_key",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="کلید یکتا"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "در صف"),
+                            ("done", "انجام شده"),
+                            ("failed", "ناموفق"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="وضعیت",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد تلاش"),
+                ),
+                (
+                    "available_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="زمان اجرا"
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="آخرین خطا")),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "claimed_by",
+                    models.CharField(blank=True, editable=False, max_length=32),
+                ),
+            ],
+            options={
+                "verbose_name": "پیام صف",
+                "verbose_name_plural": "صف پیام\u200cها",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "available_at"],
+                        name="outbox_status_available_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="sales_recorded",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_recorded_orders, migrations.RunPython.noop),
+    ]
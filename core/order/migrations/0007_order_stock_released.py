@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0006_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stock_released",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
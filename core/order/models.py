@@ -2,11 +2,11 @@ from django.db import models
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth import get_user_model
 from decimal import Decimal
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from accounts.validators import validate_iranian_cellphone_number
 
-
 User = get_user_model()
 
 
@@ -165,6 +165,11 @@ class Order(models.Model):
     # Additional notes
     notes = models.TextField(blank=True, null=True, verbose_name="یادداشت‌ها")
 
+    # Set once the order's units are added to the sales stats (order.outbox)
+    sales_recorded = models.BooleanField(default=False, editable=False)
+    # Set once a cancelled order's units are put back in stock (order.outbox)
+    stock_released = models.BooleanField(default=False, editable=False)
+
     # Timestamps
     created_date = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ثبت")
     updated_date = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
@@ -173,20 +178,42 @@ class Order(models.Model):
         verbose_name = "سفارش"
         verbose_name_plural = "سفارشات"
         ordering = ["-created_date"]
+        indexes = [
+            # dashboard order list: the user's orders, optionally by status, newest first
+            models.Index(
+                fields=["user", "-created_date"], name="order_user_created_idx"
+            ),
+            models.Index(
+                fields=["user", "status", "-created_date"],
+                name="order_user_status_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"سفارش #{self.order_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets post_save handlers see status transitions
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate unique order number
-            import random
-            import string
-            from django.utils import timezone
+            from .numbers import next_order_number
 
-            timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-            random_str = "".join(random.choices(string.digits, k=4))
-            self.order_number = f"ORD{timestamp}{random_str}"
+            self.order_number = next_order_number()
+
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # sales_recorded and stock_released are only flipped by the outbox
+            # worker; saving an instance loaded before that must not undo it
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("sales_recorded", "stock_released")
+            ]
 
         super().save(*args, **kwargs)
 
@@ -217,3 +244,133 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product_name} x {self.quantity}"
+
+
+class StockReservation(models.Model):
+    """
+    Short-lived hold on product stock for a user who is checking out.
+    Active holds are subtracted from the stock other users can add to carts.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="stock_reservations"
+    )
+    product = models.ForeignKey(
+        "shop.Product", on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "رزرو موجودی"
+        verbose_name_plural = "رزروهای موجودی"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product"], name="unique_user_product_reservation"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["product", "expires_at"], name="reservation_product_exp_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} ({self.user_id})"
+
+
+class ShippingRate(models.Model):
+    """
+    One weight band of a shipping rate table.
+    A band applies from min_weight up to the next band's min_weight; rows
+    with an empty province form the table for provinces without their own.
+    """
+
+    province = models.CharField(max_length=100, blank=True, verbose_name="استان")
+    min_weight = models.PositiveIntegerField(default=0, verbose_name="حداقل وزن")
+    base_cost = models.DecimalField(
+        max_digits=10, decimal_places=0, default=0, verbose_name="هزینه پایه"
+    )
+    cost_per_weight = models.DecimalField(
+        max_digits=10, decimal_places=0, default=0, verbose_name="هزینه هر واحد وزن"
+    )
+    free_shipping_threshold = models.DecimalField(
+        max_digits=12,
+        decimal_places=0,
+        null=True,
+        blank=True,
+        verbose_name="حداقل خرید برای ارسال رایگان",
+    )
+    is_active = models.BooleanField(default=True, verbose_name="فعال")
+
+    class Meta:
+        verbose_name = "نرخ ارسال"
+        verbose_name_plural = "نرخ‌های ارسال"
+        ordering = ["province", "min_weight"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["province", "min_weight"], name="unique_province_weight_band"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.province or '*'} >= {self.min_weight}"
+
+
+class OrderNumberSequence(models.Model):
+    """
+    Portable database sequence for order numbers.
+    Each order number consumes one id; the row itself is deleted right away.
+    Ids are never reused (PostgreSQL sequences, SQLite AUTOINCREMENT), and a
+    value rolled back with its order is never seen by a committed order.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    class Meta:
+        verbose_name = "دنباله شماره سفارش"
+
+
+class OutboxMessage(models.Model):
+    """
+    Side effect of an order (email, stats, invoice) recorded in the same
+    transaction as the order and carried out later by the process_outbox
+    worker. idempotency_key makes enqueueing the same effect twice a no-op.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "در صف"),
+        ("done", "انجام شده"),
+        ("failed", "ناموفق"),
+    )
+
+    topic = models.CharField(max_length=100, verbose_name="موضوع")
+    payload = models.JSONField(default=dict, verbose_name="داده")
+    idempotency_key = models.CharField(
+        max_length=200, unique=True, verbose_name="کلید یکتا"
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="pending", verbose_name="وضعیت"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="تعداد تلاش")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="زمان اجرا")
+    last_error = models.TextField(blank=True, verbose_name="آخرین خطا")
+    # token of the worker batch holding the lease (see order.outbox.claim_batch)
+    claimed_by = models.CharField(max_length=32, blank=True, editable=False)
+    created_date = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "پیام صف"
+        verbose_name_plural = "صف پیام‌ها"
+        ordering = ["id"]
+        indexes = [
+            # the worker's poll: due pending messages, oldest first
+            models.Index(
+                fields=["status", "available_at"], name="outbox_status_available_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} ({self.idempotency_key})"
@@ -0,0 +1,60 @@
+import re
+
+from django.db.models import Q
+from django.utils import timezone
+
+from shop.search import PERSIAN_TRANSLATION
+
+from .models import OrderNumberSequence
+
+ORDER_NUMBER_PREFIX = "ORD"
+# ORD + YYYYMMDD + 10-digit sequence: 21 characters, sortable as strings
+SEQUENCE_WIDTH = 10
+ORDER_NUMBER_RE = re.compile(r"^[A-Z0-9]+$")
+
+
+def format_order_number(value, date):
+    """
+    Return the fixed-width order number for sequence `value` issued on `date`.
+    """
+    return f"{ORDER_NUMBER_PREFIX}{date:%Y%m%d}{value % 10**SEQUENCE_WIDTH:0{SEQUENCE_WIDTH}d}"
+
+
+def next_sequence_value():
+    """
+    Take the next value of the order number sequence.
+    Concurrent callers never get the same value, in any process.
+    """
+    row = OrderNumberSequence.objects.create()
+    OrderNumberSequence.objects.filter(pk=row.pk).delete()
+    return row.pk
+
+
+def next_order_number():
+    """
+    Return a new order number: unique, fixed-width and increasing over time.
+    """
+    return format_order_number(next_sequence_value(), timezone.localdate())
+
+
+def normalize_order_number_query(query):
+    """
+    Turn a user-typed order number (Persian digits, lower case, with or
+    without the ORD prefix) into a prefix of stored order numbers, or return
+    "" when it cannot match any.
+    """
+    query = "".join(str(query or "").translate(PERSIAN_TRANSLATION).split()).upper()
+    if query.isdigit():
+        query = ORDER_NUMBER_PREFIX + query
+    return query if ORDER_NUMBER_RE.match(query) else ""
+
+
+def order_number_prefix_q(prefix):
+    """
+    Return a Q matching order numbers starting with `prefix`.
+
+    On PostgreSQL the LIKE 'prefix%' is served by the varchar_pattern_ops
+    index Django creates next to the unique order_number index, which works
+    under any database collation.
+    """
+    return Q(order_number__startswith=prefix)
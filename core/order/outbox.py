@@ -0,0 +1,258 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from shop.sales import record_sales
+
+from .invoices import get_invoice_pdf, invoice_version
+from .models import Order, OrderItem, OutboxMessage
+from .stock import decrement_stock, restock
+from .summary import OrderSummary
+
+logger = logging.getLogger(__name__)
+
+# topic -> callable(payload); registered with @handler below
+HANDLERS = {}
+
+
+def handler(topic):
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+
+    return register
+
+
+def enqueue(topic, payload, key):
+    """
+    Record a side effect to run after the current transaction commits.
+    Call inside the transaction that creates the data it refers to; a
+    message with the same key is only ever stored once.
+    """
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(topic=topic, payload=payload, idempotency_key=key)],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_order_placed(order):
+    """
+    Queue the follow-up work of a new order.
+    """
+    payload = {"order_id": order.id}
+    enqueue("order.record_sales", payload, f"order:{order.id}:sales")
+    enqueue("order.placed_email", payload, f"order:{order.id}:placed-email")
+
+
+def enqueue_sales_update(order):
+    """
+    Queue moving the order's units between the sales stats and the stock
+    after it was cancelled or restored.
+    """
+    enqueue(
+        "order.record_sales",
+        {"order_id": order.id},
+        f"order:{order.id}:sales:{invoice_version(order.updated_date)}",
+    )
+
+
+def enqueue_invoice_prerender(order):
+    enqueue(
+        "invoice.prerender",
+        {"order_id": order.id},
+        f"invoice:{order.id}:{invoice_version(order.updated_date)}",
+    )
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Take up to batch_size due messages and lease them to a new claim token
+    for OUTBOX_LEASE seconds, so other workers skip them. A worker that
+    dies mid-batch only delays its messages until the lease runs out.
+
+    The lease is taken by a conditional update, so two workers that read
+    the same rows (e.g. on SQLite, which has no SKIP LOCKED) cannot both
+    claim a message.
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due = OutboxMessage.objects.filter(
+            status="pending", available_at__lte=now
+        ).order_by("available_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list("id", flat=True)[:batch_size])
+        OutboxMessage.objects.filter(
+            id__in=ids, status="pending", available_at__lte=now
+        ).update(available_at=_lease_end(), claimed_by=token)
+    return list(
+        OutboxMessage.objects.filter(claimed_by=token, status="pending").order_by(
+            "available_at", "id"
+        )
+    )
+
+
+def _lease_end():
+    return timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE)
+
+
+class LeaseLost(Exception):
+    """
+    Raised when a message was re-claimed by another worker while its
+    handler ran; the handler's database writes are rolled back.
+    """
+
+
+def _owned(message):
+    return OutboxMessage.objects.filter(
+        pk=message.pk, status="pending", claimed_by=message.claimed_by
+    )
+
+
+def process_message(message):
+    """
+    Run one message's handler. Returns True on success, False on failure
+    and None when the message's lease was lost to another worker.
+
+    The lease is renewed before the handler runs, so it covers each message
+    rather than the whole batch. The handler and the "done" update share a
+    transaction that only commits while this worker still owns the message,
+    so database side effects happen exactly once; external ones (email) at
+    least once. Failures are retried with exponential backoff up to
+    OUTBOX_MAX_ATTEMPTS.
+    """
+    if not _owned(message).update(available_at=_lease_end()):
+        return None
+    try:
+        with transaction.atomic():
+            HANDLERS[message.topic](message.payload)
+            done = _owned(message).update(
+                status="done",
+                attempts=F("attempts") + 1,
+                processed_at=timezone.now(),
+                last_error="",
+            )
+            if not done:
+                raise LeaseLost(message.idempotency_key)
+        return True
+    except LeaseLost:
+        logger.warning("Outbox message %s was re-claimed", message.idempotency_key)
+        return None
+    except Exception as exc:
+        logger.exception("Outbox message %s failed", message.idempotency_key)
+        attempts = message.attempts + 1
+        retry_in = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+        _owned(message).update(
+            status="failed" if attempts >= settings.OUTBOX_MAX_ATTEMPTS else "pending",
+            attempts=attempts,
+            available_at=timezone.now() + timedelta(seconds=retry_in),
+            last_error=f"{type(exc).__name__}: {exc}",
+        )
+        return False
+
+
+def process_batch(batch_size=100):
+    """
+    Claim and process one batch; returns (succeeded, failed).
+    Messages whose lease was lost are left to the worker that took them.
+    """
+    succeeded = failed = 0
+    for message in claim_batch(batch_size):
+        result = process_message(message)
+        if result:
+            succeeded += 1
+        elif result is not None:
+            failed += 1
+    return succeeded, failed
+
+
+# ---------- Handlers ----------
+
+
+@handler("order.record_sales")
+def record_order_sales(payload):
+    """
+    Bring the sales stats and the stock in line with the order's status:
+    add its units to the sales while it is live and take them back out
+    once it is cancelled; put its units back in stock on cancellation and
+    take them out again if it is restored.
+
+    The sales_recorded and stock_released flags flip in the same
+    transaction, so each change is applied once however often or in
+    whatever order messages arrive. Restoring an order whose units were
+    sold meanwhile raises InsufficientStock, and the message is retried.
+    """
+    orders = Order.objects.filter(id=payload["order_id"])
+    items = OrderItem.objects.filter(order_id=payload["order_id"])
+
+    if orders.filter(status="cancelled", stock_released=False).update(
+        stock_released=True
+    ):
+        restock(dict(items.values_list("product_id", "quantity")))
+    elif (
+        orders.filter(stock_released=True)
+        .exclude(status="cancelled")
+        .update(stock_released=False)
+    ):
+        decrement_stock(dict(items.values_list("product_id", "quantity")))
+
+    if (
+        orders.filter(sales_recorded=False)
+        .exclude(status="cancelled")
+        .update(sales_recorded=True)
+    ):
+        sign = 1
+    elif orders.filter(sales_recorded=True, status="cancelled").update(
+        sales_recorded=False
+    ):
+        sign = -1
+    else:
+        return
+    order = orders.get()
+    record_sales(
+        (
+            (product_id, sign * quantity, sign * subtotal)
+            for product_id, quantity, subtotal in items.values_list(
+                "product_id", "quantity", "subtotal"
+            )
+        ),
+        sold_at=order.created_date,
+    )
+
+
+@handler("order.placed_email")
+def send_order_placed_email(payload):
+    order = Order.objects.select_related("user").filter(id=payload["order_id"]).first()
+    if order is None or not order.user.email:
+        return
+
+    summary = OrderSummary(order)
+    subject = f"ثبت سفارش {order.order_number}"
+    html_content = render_to_string(
+        "order/order_placed_email.html", summary.get_context_data()
+    )
+    text_content = (
+        f"سفارش شما با شماره {order.order_number} ثبت شد "
+        f"و پس از بررسی پرداخت ارسال می‌شود."
+    )
+
+    email = EmailMultiAlternatives(
+        subject, text_content, settings.DEFAULT_FROM_EMAIL, [order.user.email]
+    )
+    email.attach_alternative(html_content, "text/html")
+    email.send()
+
+
+@handler("invoice.prerender")
+def prerender_order_invoice(payload):
+    order = OrderSummary.queryset().filter(id=payload["order_id"]).first()
+    if order is not None:
+        get_invoice_pdf(order)
@@ -0,0 +1,125 @@
+"""
+PDF rendering that runs in worker processes.
+
+Kept free of Django imports so pool workers can import it without
+setting Django up; callers render the HTML and pass it in together with
+a RendererConfig built from the settings.
+"""
+
+import mimetypes
+import threading
+from pathlib import Path
+from typing import NamedTuple, Tuple
+from urllib.parse import unquote, urlsplit
+
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+
+class RendererConfig(NamedTuple):
+    stylesheet: str  # path of the stylesheet, relative to a static dir
+    static_dirs: Tuple[str, ...]
+    static_url: str = "/static/"
+
+
+class InvoiceRenderer:
+    """
+    Renders HTML to PDF with one stylesheet and font configuration that are
+    loaded and parsed once and reused for every document.
+
+    All resources (stylesheet, @font-face fonts, images) are read from the
+    static directories through a local url_fetcher; nothing is fetched over
+    HTTP, so rendering does not depend on the site being reachable.
+    """
+
+    def __init__(self, config: RendererConfig):
+        self.config = config
+        self.static_dirs = [Path(d).resolve() for d in config.static_dirs]
+        self._resources = {}
+        # WeasyPrint's image cache, shared between renders
+        self._image_cache = {}
+        self.font_config = FontConfiguration()
+        self.base_url = self.static_dirs[0].as_uri() + "/" if self.static_dirs else None
+        self.stylesheet = CSS(
+            url=self._static_uri(config.stylesheet),
+            url_fetcher=self.url_fetcher,
+            font_config=self.font_config,
+        )
+
+    def _static_uri(self, relative_path):
+        path = self._find_static(relative_path)
+        if path is None:
+            raise FileNotFoundError(f"Static file not found: {relative_path}")
+        return path.as_uri()
+
+    def _find_static(self, relative_path):
+        for static_dir in self.static_dirs:
+            path = (static_dir / relative_path).resolve()
+            if path.is_relative_to(static_dir) and path.is_file():
+                return path
+        return None
+
+    def _resolve(self, url):
+        """
+        Map a file:// URL inside a static dir, or any URL under static_url,
+        to a local static file; return None for everything else.
+        """
+        parts = urlsplit(url)
+        path = unquote(parts.path)
+        if parts.scheme == "file":
+            local = Path(path).resolve()
+            if any(local.is_relative_to(d) for d in self.static_dirs):
+                return local if local.is_file() else None
+        static_url = "/" + urlsplit(self.config.static_url).path.lstrip("/")
+        if path.startswith(static_url):
+            return self._find_static(path[len(static_url) :])
+        return None
+
+    def url_fetcher(self, url, *args, **kwargs):
+        resource = self._resources.get(url)
+        if resource is None:
+            if url.startswith("data:"):
+                return default_url_fetcher(url)
+            path = self._resolve(url)
+            if path is None:
+                raise ValueError(f"Refusing to fetch non-static resource: {url}")
+            resource = {
+                "string": path.read_bytes(),
+                "mime_type": mimetypes.guess_type(path.name)[0],
+                "redirected_url": path.as_uri(),
+            }
+            self._resources[url] = resource
+        return dict(resource)
+
+    def render(self, html):
+        """
+        Render an HTML string to PDF bytes.
+        """
+        document = HTML(
+            string=html, base_url=self.base_url, url_fetcher=self.url_fetcher
+        )
+        return document.write_pdf(
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config,
+            cache=self._image_cache,
+        )
+
+
+# one renderer per thread and configuration; WeasyPrint's font
+# configuration is not safe to share between threads
+_local = threading.local()
+
+
+def get_renderer(config: RendererConfig) -> InvoiceRenderer:
+    renderers = _local.__dict__.setdefault("renderers", {})
+    renderer = renderers.get(config)
+    if renderer is None:
+        renderer = renderers[config] = InvoiceRenderer(config)
+    return renderer
+
+
+def html_to_pdf(html, config: RendererConfig):
+    """
+    Render an HTML string to PDF bytes with this process's shared renderer.
+    """
+    return get_renderer(config).render(html)
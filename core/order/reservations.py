@@ -0,0 +1,141 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from shop.catalog import get_catalog_version
+from shop.models import Product
+
+from .models import StockReservation
+from .stock import InsufficientStock
+
+# held counts expire on their own, so cached values are only trusted briefly
+HELD_CACHE_TIMEOUT = 30
+
+
+def _held_key(version, product_id):
+    return f"order:held:{version}:{product_id}"
+
+
+def _forget_held(product_ids):
+    def forget():
+        version = get_catalog_version()
+        cache.delete_many([_held_key(version, pid) for pid in product_ids])
+
+    transaction.on_commit(forget)
+
+
+def get_held_quantities(product_ids, exclude_user=None):
+    """
+    Return {product_id: quantity held by active reservations}.
+
+    Counts are cached per product and catalog version; with exclude_user
+    the user's own holds are left out and the cache is bypassed.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+
+    version = get_catalog_version()
+    found = {}
+    if exclude_user is None:
+        keys = {_held_key(version, pid): pid for pid in product_ids}
+        found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = product_ids - found.keys()
+
+    if missing:
+        reservations = StockReservation.objects.filter(
+            product_id__in=missing, expires_at__gt=timezone.now()
+        )
+        if exclude_user is not None:
+            reservations = reservations.exclude(user=exclude_user)
+        rows = dict(
+            reservations.values("product_id")
+            .annotate(held=Sum("quantity"))
+            .values_list("product_id", "held")
+            .order_by()
+        )
+        loaded = {pid: rows.get(pid, 0) for pid in missing}
+        if exclude_user is None:
+            cache.set_many(
+                {_held_key(version, pid): held for pid, held in loaded.items()},
+                HELD_CACHE_TIMEOUT,
+            )
+        found.update(loaded)
+    return found
+
+
+def get_available_stock(product, exclude_user=None):
+    """
+    Return stock minus quantities held by active reservations, leaving
+    out exclude_user's own holds.
+    """
+    held = get_held_quantities([product.id], exclude_user=exclude_user).get(
+        product.id, 0
+    )
+    return max(product.stock - held, 0)
+
+
+def reserve_items(user, quantities, ttl=None):
+    """
+    Hold `quantities` ({product_id: quantity}) for the user, replacing the
+    user's previous holds. Raises InsufficientStock when other users' holds
+    leave too little stock.
+
+    Product rows are read, not locked: holds are advisory and the stock
+    decrement at order time remains the hard guard against overselling.
+    """
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+
+    with transaction.atomic():
+        previous = set(
+            StockReservation.objects.filter(user=user).values_list(
+                "product_id", flat=True
+            )
+        )
+        StockReservation.objects.filter(user=user).delete()
+
+        products = Product.objects.filter(id__in=quantities).only("id", "name", "stock")
+        held = get_held_quantities(quantities, exclude_user=user)
+        short = [
+            product
+            for product in products
+            if product.stock - held[product.id] < quantities[product.id]
+        ]
+        if short:
+            raise InsufficientStock(short)
+
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create(
+            StockReservation(
+                user=user, product_id=pid, quantity=qty, expires_at=expires_at
+            )
+            for pid, qty in quantities.items()
+        )
+        _forget_held(previous | quantities.keys())
+
+
+def release_reservations(user):
+    """
+    Drop all of the user's holds, e.g. once the order is placed.
+    """
+    reservations = StockReservation.objects.filter(user=user)
+    product_ids = list(reservations.values_list("product_id", flat=True))
+    if product_ids:
+        reservations.delete()
+        _forget_held(product_ids)
+
+
+def release_expired_reservations(now=None):
+    """
+    Delete expired holds and return how many were removed.
+    """
+    expired = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    product_ids = set(expired.values_list("product_id", flat=True))
+    count, _ = expired.delete()
+    _forget_held(product_ids)
+    return count
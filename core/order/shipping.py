@@ -0,0 +1,86 @@
+from bisect import bisect_right
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from core.cache import bump_cache_version, get_cache_version
+from shop.search import normalize_text
+
+SHIPPING_NAMESPACE = "order:shipping"
+# used while no rate table is configured
+DEFAULT_COST_PER_WEIGHT = Decimal("100")
+ZERO = Decimal("0")
+
+
+class RateBand(NamedTuple):
+    min_weight: int
+    base_cost: Decimal
+    cost_per_weight: Decimal
+    free_shipping_threshold: Optional[Decimal]
+
+
+class RateTable:
+    """
+    In-memory shipping rate tables keyed by normalized province.
+    Each table is a list of weight bands sorted by min_weight, so a quote
+    is one dict lookup plus a bisect.
+    """
+
+    def __init__(self, rates=()):
+        tables = {}
+        for rate in sorted(rates, key=lambda r: r.min_weight):
+            tables.setdefault(normalize_text(rate.province), []).append(
+                RateBand(
+                    rate.min_weight,
+                    rate.base_cost,
+                    rate.cost_per_weight,
+                    rate.free_shipping_threshold,
+                )
+            )
+        self._tables = {
+            province: ([band.min_weight for band in bands], bands)
+            for province, bands in tables.items()
+        }
+
+    def quote(self, weight, subtotal=ZERO, province=None):
+        """
+        Return the shipping cost for a parcel of `weight` worth `subtotal`.
+        """
+        table = self._tables.get(normalize_text(province)) or self._tables.get("")
+        if table is None:
+            return Decimal(weight) * DEFAULT_COST_PER_WEIGHT
+
+        weights, bands = table
+        band = bands[max(bisect_right(weights, weight) - 1, 0)]
+        threshold = band.free_shipping_threshold
+        if threshold is not None and subtotal >= threshold:
+            return ZERO
+        return band.base_cost + band.cost_per_weight * weight
+
+
+# process-local table, reloaded when the shipping version changes
+_rate_table = {"version": None, "table": None}
+
+
+def get_rate_table():
+    """
+    Return the RateTable for the current shipping version.
+    Only a version change (a ShippingRate save or delete) reads the DB.
+    """
+    from .models import ShippingRate
+
+    version = get_cache_version(SHIPPING_NAMESPACE)
+    if _rate_table["version"] != version:
+        _rate_table["table"] = RateTable(ShippingRate.objects.filter(is_active=True))
+        _rate_table["version"] = version
+    return _rate_table["table"]
+
+
+def bump_shipping_version():
+    return bump_cache_version(SHIPPING_NAMESPACE)
+
+
+def quote_shipping(weight, subtotal=ZERO, province=None):
+    """
+    Default shipping calculator (see SHIPPING_CALCULATOR).
+    """
+    return get_rate_table().quote(weight, subtotal=subtotal, province=province)
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Order, ShippingRate
+from .outbox import enqueue_invoice_prerender, enqueue_sales_update
+from .shipping import bump_shipping_version
+
+
+@receiver(post_save, sender=ShippingRate)
+@receiver(post_delete, sender=ShippingRate)
+def shipping_rate_changed(sender, instance, **kwargs):
+    """
+    Reload the in-memory shipping rate tables.
+    """
+    bump_shipping_version()
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    """
+    Queue the side effects of a status change, carried out by the
+    process_outbox worker once it commits: pre-render the shipping invoice
+    once payment is verified, and update the sales stats and the stock
+    when the order is cancelled or restored.
+    """
+    previous = None if created else getattr(instance, "_loaded_status", None)
+    if not created and previous == instance.status:
+        return
+    instance._loaded_status = instance.status
+
+    if instance.status == "payment_verified":
+        enqueue_invoice_prerender(instance)
+    if not created and "cancelled" in (previous, instance.status):
+        enqueue_sales_update(instance)
@@ -0,0 +1,91 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from shop.catalog import bump_catalog_version, forget_products
+from shop.models import Product
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when some products do not have enough stock for an order.
+    `products` is a list of the Product objects that fell short.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        names = ", ".join(product.name for product in products)
+        super().__init__(f"Insufficient stock for: {names}")
+
+
+def decrement_stock(quantities):
+    """
+    Take `quantities` ({product_id: quantity}) out of stock in two queries,
+    whatever the number of products.
+
+    The product rows are locked in id order (so concurrent checkouts cannot
+    deadlock), checked, and then decremented by one CASE update that still
+    guards on stock >= quantity. Must run inside a transaction, which should
+    be rolled back when InsufficientStock is raised.
+    """
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    products = list(
+        Product.objects.select_for_update()
+        .filter(id__in=quantities)
+        .order_by("id")
+        .only("id", "name", "stock")
+    )
+    short = [p for p in products if p.stock < quantities[p.id]]
+    if short or len(products) != len(quantities):
+        raise InsufficientStock(short)
+
+    has_stock = reduce(
+        or_, (Q(id=pid, stock__gte=qty) for pid, qty in quantities.items())
+    )
+    updated = Product.objects.filter(has_stock).update(
+        stock=Case(
+            *[When(id=pid, then=F("stock") - qty) for pid, qty in quantities.items()],
+            default=F("stock"),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    if updated != len(quantities):
+        # only reachable without row locks (e.g. SQLite); the caller's
+        # transaction is rolled back when this propagates
+        raise InsufficientStock(products)
+
+    # update() skips the post_save signal. Only the decremented products are
+    # dropped from the cache; a product selling out changes listings and
+    # facets too, so that invalidates the whole catalog
+    if any(p.stock == quantities[p.id] for p in products):
+        transaction.on_commit(bump_catalog_version)
+    else:
+        transaction.on_commit(lambda: forget_products(quantities))
+
+
+def restock(quantities):
+    """
+    Put `quantities` ({product_id: quantity}) back in stock with one CASE
+    update, e.g. for a cancelled order. Must run inside a transaction.
+    """
+    quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    back_in_stock = Product.objects.filter(id__in=quantities, stock=0).exists()
+    Product.objects.filter(id__in=quantities).update(
+        stock=Case(
+            *[When(id=pid, then=F("stock") + qty) for pid, qty in quantities.items()],
+            default=F("stock"),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    if back_in_stock:
+        transaction.on_commit(bump_catalog_version)
+    else:
+        transaction.on_commit(lambda: forget_products(quantities))
@@ -0,0 +1,51 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import Order, OrderItem
+
+
+def _items_prefetch():
+    return Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+
+
+class OrderSummary:
+    """
+    An order with its items and their products, loaded in two queries,
+    plus the totals the invoice and confirmation pages show, computed in
+    one pass over the items.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        # a no-op when the order came from queryset(); one query otherwise
+        prefetch_related_objects([order], _items_prefetch())
+        self.items = list(order.items.all())
+        self.total_items = 0
+        self.total_weight = 0
+        self.items_subtotal = 0
+        for item in self.items:
+            self.total_items += item.quantity
+            self.total_weight += (item.product.weight or 0) * item.quantity
+            self.items_subtotal += item.subtotal
+
+    @staticmethod
+    def queryset():
+        """
+        Orders with their items and products prefetched.
+        """
+        return Order.objects.prefetch_related(_items_prefetch())
+
+    @classmethod
+    def get(cls, **lookup):
+        """
+        Load one order; raises Order.DoesNotExist like QuerySet.get().
+        """
+        return cls(cls.queryset().get(**lookup))
+
+    def get_context_data(self):
+        return {
+            "order": self.order,
+            "items": self.items,
+            "total_items": self.total_items,
+            "total_weight": self.total_weight,
+            "items_subtotal": self.items_subtotal,
+        }
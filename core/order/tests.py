@@ -1,13 +1,89 @@
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 from decimal import Decimal
-from django.test import TestCase
+from django.db import connection, transaction
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils.text import slugify
+from django.utils import timezone
+from django.contrib.sessions.backends.db import SessionStore
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.contrib.auth import get_user_model
-from shop.models import Product, Category
-from order.models import Address, Order, OrderItem
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY, get_user_model
+from django.core import mail
+from PIL import Image
+from shop.models import Product, Category, ProductSalesStats
+from order.models import (
+    Address,
+    Order,
+    OrderItem,
+    OrderNumberSequence,
+    OutboxMessage,
+    ShippingRate,
+    StockReservation,
+)
+from core.testing import IndexUsageMixin
+from order.stock import InsufficientStock, decrement_stock
+from order.shipping import bump_shipping_version, quote_shipping
+from order.invoices import (
+    invoice_orders,
+    invoice_path,
+    renderer_config,
+    stream_invoice_zip,
+)
+from order.pdf import InvoiceRenderer, get_renderer
+from order.summary import OrderSummary
+from order.outbox import (
+    HANDLERS,
+    claim_batch,
+    enqueue,
+    handler,
+    process_batch,
+    process_message,
+)
+from order.numbers import (
+    format_order_number,
+    normalize_order_number_query,
+    order_number_prefix_q,
+)
+from order.reservations import (
+    get_available_stock,
+    release_expired_reservations,
+    reserve_items,
+)
+from cart.cart import CartSession
+from cart.models import Cart, CartItem
+from shop.catalog import get_catalog_version, get_products
 
 User = get_user_model()
 
 
+def create_order(user, **fields):
+    """
+    Create an order for user with a placeholder shipping address and
+    totals; keyword arguments override any field.
+    """
+    defaults = {
+        "shipping_full_name": "John Doe",
+        "shipping_phone": "09123456789",
+        "shipping_address_line1": "Street 1",
+        "shipping_city": "Tehran",
+        "shipping_state": "Tehran",
+        "shipping_postal_code": "12345",
+        "subtotal": 1000,
+        "shipping_cost": 100,
+        "total": 1100,
+    }
+    return Order.objects.create(user=user, **{**defaults, **fields})
+
+
 class AddressModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -45,20 +121,7 @@ class OrderModelTest(TestCase):
         )
 
     def test_create_order_and_item(self):
-        order = Order.objects.create(
-            user=self.user,
-            shipping_full_name="John Doe",
-            shipping_phone="09123456789",
-            shipping_address_line1="Street 1",
-            shipping_city="Tehran",
-            shipping_state="Tehran",
-            shipping_postal_code="12345",
-            shipping_country="ایران",
-            payment_receipt=self.payment_receipt,
-            subtotal=1000,
-            shipping_cost=100,
-            total=1100,
-        )
+        order = create_order(self.user, payment_receipt=self.payment_receipt)
         self.assertTrue(order.order_number.startswith("ORD"))
         self.assertEqual(str(order), f"سفارش #{order.order_number}")
 
@@ -72,3 +135,836 @@ class OrderModelTest(TestCase):
         )
         self.assertEqual(str(order_item), "TestProduct x 2")
         self.assertEqual(order_item.subtotal, 2000)
+
+
+class OrderIndexTest(IndexUsageMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="indexuser@example.com", password="pass123"
+        )
+
+    def test_user_orders_use_index(self):
+        queryset = Order.objects.filter(user=self.user).order_by("-created_date")
+        self.assertUsesIndex(queryset[:10], "order_user_created_idx")
+
+    def test_user_orders_by_status_use_index(self):
+        queryset = Order.objects.filter(user=self.user, status="pending").order_by(
+            "-created_date"
+        )
+        self.assertUsesIndex(queryset[:10], "order_user_status_created_idx")
+
+    @skipUnless(
+        connection.vendor == "postgresql", "LIKE prefixes are indexed on PostgreSQL"
+    )
+    def test_order_number_prefix_uses_index(self):
+        queryset = Order.objects.filter(order_number_prefix_q("ORD2026"))
+        # Django names the varchar_pattern_ops index of a unique CharField *_like
+        self.assertUsesIndex(queryset, "_like")
+
+
+class DashboardOrderStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="statsuser@example.com", password="pass123"
+        )
+        self.client.force_login(self.user)
+
+    def create_order(self, status):
+        return create_order(self.user, status=status)
+
+    def get_orders_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard:orders"))
+        return response, [q["sql"] for q in queries]
+
+    def test_order_stats_in_one_query(self):
+        self.create_order("pending")
+        _, baseline = self.get_orders_page()
+
+        for status in ("pending", "processing", "shipped", "delivered", "cancelled"):
+            self.create_order(status)
+        response, queries = self.get_orders_page()
+
+        self.assertEqual(len(queries), len(baseline))
+        status_queries = [sql for sql in queries if '"order_order"."status" =' in sql]
+        self.assertEqual(len(status_queries), 1)
+        stats = response.context["order_stats"]
+        self.assertEqual(stats["all"], 6)
+        self.assertEqual(stats["pending"], 2)
+        self.assertEqual(stats["cancelled"], 1)
+        self.assertEqual(stats["payment_verified"], 0)
+
+
+class DecrementStockTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Stock", slug="stock")
+        self.products = [
+            Product.objects.create(
+                name=f"Stock {i}",
+                slug=f"stock-{i}",
+                category=self.category,
+                price=10,
+                stock=5,
+            )
+            for i in range(4)
+        ]
+
+    def test_decrements_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            decrement_stock({p.id: 2 for p in self.products})
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("stock", flat=True)),
+            [3, 3, 3, 3],
+        )
+
+    def test_oversell_raises_and_leaves_stock(self):
+        first, second = self.products[:2]
+        with self.assertRaises(InsufficientStock) as ctx:
+            with transaction.atomic():
+                decrement_stock({first.id: 1, second.id: 6})
+        self.assertEqual(ctx.exception.products, [second])
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 5)
+
+    def test_only_decremented_products_forgotten_on_commit(self):
+        first, second = self.products[:2]
+        get_products([first.id, second.id])
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_stock({first.id: 1})
+        self.assertEqual(get_catalog_version(), version)
+        with self.assertNumQueries(1):
+            products = get_products([first.id, second.id])
+        self.assertEqual(products[first.id].stock, 4)
+
+    def test_selling_out_bumps_catalog_version(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_stock({self.products[0].id: 5})
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(email="buyer@example.com", password="x")
+        self.other = User.objects.create_user(email="other@example.com", password="x")
+        category = Category.objects.create(name="Held", slug="held")
+        self.product = Product.objects.create(
+            name="Held", slug="held", category=category, price=10, stock=3
+        )
+
+    def reserve(self, user, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_items(user, {self.product.id: quantity})
+
+    def test_holds_reduce_available_stock(self):
+        self.assertEqual(get_available_stock(self.product), 3)
+        self.reserve(self.buyer, 2)
+        self.assertEqual(get_available_stock(self.product), 1)
+
+        with self.assertRaises(InsufficientStock):
+            self.reserve(self.other, 2)
+        self.reserve(self.other, 1)
+        self.assertEqual(get_available_stock(self.product), 0)
+
+    def test_available_stock_is_cached(self):
+        self.reserve(self.buyer, 1)
+        get_available_stock(self.product)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_available_stock(self.product), 2)
+
+    def test_rereserving_replaces_own_holds(self):
+        self.reserve(self.buyer, 3)
+        self.reserve(self.buyer, 1)
+        self.assertEqual(StockReservation.objects.get(user=self.buyer).quantity, 1)
+        self.assertEqual(get_available_stock(self.product), 2)
+
+    def test_release_expired(self):
+        self.reserve(self.buyer, 3)
+        later = timezone.now() + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(release_expired_reservations(now=later), 1)
+        self.assertEqual(get_available_stock(self.product), 3)
+
+    def test_cart_respects_holds(self):
+        self.reserve(self.other, 3)
+        cart = CartSession(SessionStore())
+        self.assertFalse(cart.add_product(self.product.id))
+
+    def test_repeated_adds_count_units_in_cart(self):
+        self.reserve(self.other, 2)
+        cart = CartSession(SessionStore())
+        self.assertTrue(cart.add_product(self.product.id))
+        self.assertFalse(cart.add_product(self.product.id))
+        self.assertEqual(cart.get_total_quantity(), 1)
+
+    def test_own_hold_does_not_block_adds(self):
+        self.reserve(self.buyer, 2)
+        self.reserve(self.other, 1)
+        session = SessionStore()
+        session[AUTH_SESSION_KEY] = str(self.buyer.pk)
+        cart = CartSession(session)
+        self.assertTrue(cart.add_product(self.product.id, 2))
+        self.assertFalse(cart.add_product(self.product.id))
+
+
+class ShippingRateTest(TestCase):
+    def setUp(self):
+        # rows rolled back between tests fire no signals; drop their tables
+        self.addCleanup(bump_shipping_version)
+        ShippingRate.objects.create(min_weight=0, base_cost=1000, cost_per_weight=50)
+        ShippingRate.objects.create(min_weight=1000, base_cost=5000, cost_per_weight=20)
+        ShippingRate.objects.create(
+            province="تهران",
+            min_weight=0,
+            base_cost=500,
+            cost_per_weight=10,
+            free_shipping_threshold=200000,
+        )
+
+    def test_default_cost_without_rates(self):
+        ShippingRate.objects.all().delete()
+        self.assertEqual(quote_shipping(3), Decimal("300"))
+
+    def test_weight_bands(self):
+        self.assertEqual(quote_shipping(0), Decimal("1000"))
+        self.assertEqual(quote_shipping(999), Decimal("1000") + 50 * 999)
+        self.assertEqual(quote_shipping(1000), Decimal("5000") + 20 * 1000)
+
+    def test_province_table_and_fallback(self):
+        self.assertEqual(quote_shipping(10, province="تهران"), Decimal("600"))
+        self.assertEqual(quote_shipping(10, province=" تهران "), Decimal("600"))
+        self.assertEqual(quote_shipping(10, province="اصفهان"), Decimal("1500"))
+
+    def test_free_shipping_threshold(self):
+        self.assertEqual(
+            quote_shipping(10, subtotal=Decimal("200000"), province="تهران"),
+            Decimal("0"),
+        )
+        self.assertEqual(
+            quote_shipping(10, subtotal=Decimal("199999"), province="تهران"),
+            Decimal("600"),
+        )
+
+    def test_quotes_are_served_from_memory(self):
+        quote_shipping(10)
+        with self.assertNumQueries(0):
+            for weight in range(0, 5000, 250):
+                quote_shipping(weight, province="تهران")
+
+    def test_saving_a_rate_reloads_tables(self):
+        self.assertEqual(quote_shipping(10), Decimal("1500"))
+        ShippingRate.objects.filter(province="", min_weight=0).update(base_cost=0)
+        # update() sends no signal; the cached table is still used
+        self.assertEqual(quote_shipping(10), Decimal("1500"))
+        rate = ShippingRate.objects.get(province="", min_weight=0)
+        rate.save()
+        self.assertEqual(quote_shipping(10), Decimal("500"))
+
+
+class InvoiceCacheTest(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(INVOICE_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache_dir = Path(cache_dir.name)
+
+        self.staff = User.objects.create_superuser(
+            email="staff@example.com", password="x"
+        )
+        self.order = create_order(self.staff)
+        self.url = reverse("order:shipping_invoice_pdf", args=[self.order.id])
+        self.client.force_login(self.staff)
+
+    def cached_files(self):
+        return sorted(path.name for path in self.cache_dir.glob("*.pdf"))
+
+    def verify_payment(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = "payment_verified"
+        order.save()
+        return order
+
+    def test_payment_verification_prerenders_invoice(self):
+        with patch("order.invoices.render_invoice_pdf", return_value=b"%PDF") as r:
+            order = self.verify_payment()
+            # queued for the outbox worker, not rendered in the request
+            self.assertEqual(r.call_count, 0)
+            self.assertEqual(process_batch(), (1, 0))
+            self.assertEqual(r.call_count, 1)
+            self.assertEqual(
+                self.cached_files(),
+                [invoice_path(order.id, order.updated_date).name],
+            )
+
+            response = self.client.get(self.url)
+            self.assertEqual(b"".join(response.streaming_content), b"%PDF")
+            self.assertEqual(r.call_count, 1)
+
+            # saving again without a status change does not pre-render
+            order.save()
+            self.assertEqual(process_batch(), (0, 0))
+            self.assertEqual(r.call_count, 1)
+
+    def test_repeat_downloads_are_served_from_disk(self):
+        with patch("order.invoices.render_invoice_pdf", return_value=b"%PDF") as r:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            self.assertEqual(r.call_count, 1)
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertEqual(first["ETag"], second["ETag"])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_order_update_replaces_cached_invoice(self):
+        with patch("order.invoices.render_invoice_pdf", return_value=b"%PDF") as r:
+            etag = self.client.get(self.url)["ETag"]
+            self.order.notes = "changed"
+            self.order.save()
+            response = self.client.get(self.url)
+            self.assertEqual(r.call_count, 2)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(self.cached_files()), 1)
+
+
+class BulkInvoiceExportTest(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            INVOICE_CACHE_DIR=cache_dir.name, INVOICE_BULK_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache_dir = Path(cache_dir.name)
+
+        self.staff = User.objects.create_superuser(
+            email="warehouse@example.com", password="x"
+        )
+        self.verified = [self.create_order("payment_verified") for _ in range(3)]
+        self.create_order("pending")
+        self.url = reverse("order:shipping_invoice_bulk")
+        self.client.force_login(self.staff)
+
+    def create_order(self, status):
+        return create_order(self.staff, status=status)
+
+    def expected_names(self):
+        return [f"shipping_invoice_{o.order_number}.pdf" for o in self.verified]
+
+    def test_zip_export_streams_matching_orders(self):
+        response = self.client.get(self.url, {"status": "payment_verified"})
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), self.expected_names())
+        # rendered invoices are cached for the single-order view
+        self.assertEqual(len(list(self.cache_dir.glob("*.pdf"))), 3)
+
+    def test_merged_pdf_is_not_offered_on_the_web(self):
+        response = self.client.get(
+            self.url, {"status": "payment_verified", "format": "pdf"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_filters(self):
+        response = self.client.get(
+            self.url, {"date_from": "2026-02-01", "date_to": "2026-01-01"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {"status": "delivered"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_process_pool_rendering(self):
+        orders = invoice_orders(status="payment_verified")
+        archive = zipfile.ZipFile(
+            BytesIO(b"".join(stream_invoice_zip(orders, workers=2)))
+        )
+        self.assertEqual(archive.namelist(), self.expected_names())
+
+    def test_export_command(self):
+        output = self.cache_dir / "export.zip"
+        out = StringIO()
+        call_command(
+            "export_invoices", str(output), "--status", "payment_verified", stdout=out
+        )
+        self.assertEqual(zipfile.ZipFile(output).namelist(), self.expected_names())
+        self.assertIn("Exported 3 invoices", out.getvalue())
+
+    def test_export_command_merged_pdf(self):
+        output = self.cache_dir / "export.pdf"
+        call_command(
+            "export_invoices",
+            str(output),
+            "--status",
+            "payment_verified",
+            "--format",
+            "pdf",
+            stdout=StringIO(),
+        )
+        self.assertTrue(output.read_bytes().startswith(b"%PDF"))
+
+
+class InvoiceRendererTest(TestCase):
+    def setUp(self):
+        self.config = renderer_config()
+        self.renderer = InvoiceRenderer(self.config)
+
+    def test_renderer_is_reused(self):
+        self.assertIs(get_renderer(self.config), get_renderer(self.config))
+
+    def test_static_urls_are_read_locally(self):
+        stylesheet = Path(settings.STATICFILES_DIRS[0]) / settings.INVOICE_STYLESHEET
+        for url in (
+            f"/static/{settings.INVOICE_STYLESHEET}",
+            f"https://goriila.example/static/{settings.INVOICE_STYLESHEET}",
+            stylesheet.as_uri(),
+        ):
+            resource = self.renderer.url_fetcher(url)
+            self.assertEqual(resource["string"], stylesheet.read_bytes())
+            self.assertEqual(resource["mime_type"], "text/css")
+
+    def test_resources_are_fetched_once(self):
+        url = f"/static/{settings.INVOICE_STYLESHEET}"
+        self.renderer.url_fetcher(url)
+        with patch.object(Path, "read_bytes") as read_bytes:
+            self.renderer.url_fetcher(url)
+        read_bytes.assert_not_called()
+
+    def test_other_urls_are_refused(self):
+        for url in (
+            "https://fonts.googleapis.com/css2?family=Vazirmatn",
+            "/static/../core/settings.py",
+            (Path(settings.BASE_DIR) / "core" / "settings.py").as_uri(),
+        ):
+            with self.assertRaises(ValueError):
+                self.renderer.url_fetcher(url)
+
+
+class OrderSummaryTest(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(INVOICE_CACHE_DIR=cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.staff = User.objects.create_superuser(
+            email="summary@example.com", password="x"
+        )
+        self.client.force_login(self.staff)
+        self.category = Category.objects.create(name="Summary", slug="summary")
+        self.order = create_order(self.staff, subtotal=0, total=100)
+        self.add_items(2)
+
+    def add_items(self, count):
+        start = self.order.items.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name=f"Summary {i}",
+                slug=f"summary-{i}",
+                category=self.category,
+                price=1000,
+                stock=5,
+                weight=i + 1,
+            )
+            OrderItem.objects.create(
+                order=self.order,
+                product=product,
+                product_name=product.name,
+                product_price=1000,
+                quantity=2,
+                subtotal=2000,
+            )
+
+    def order_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in queries if '"order_order' in q["sql"]]
+
+    def test_totals_in_one_pass(self):
+        with self.assertNumQueries(2):
+            summary = OrderSummary.get(id=self.order.id)
+        self.assertEqual(summary.total_items, 4)
+        self.assertEqual(summary.total_weight, 2 * 1 + 2 * 2)
+        self.assertEqual(summary.items_subtotal, 4000)
+
+    def test_invoice_detail_runs_two_queries(self):
+        url = reverse("order:shipping_invoice_detail", args=[self.order.id])
+        self.assertEqual(len(self.order_queries(url)), 2)
+        self.add_items(3)
+        self.assertEqual(len(self.order_queries(url)), 2)
+
+    def test_invoice_pdf_runs_two_queries(self):
+        url = reverse("order:shipping_invoice_pdf", args=[self.order.id])
+        self.add_items(3)
+        # rendering loads the order, then its items with their products
+        self.assertEqual(len(self.order_queries(url)), 2)
+        # a cached invoice only needs the order row
+        self.assertEqual(len(self.order_queries(url)), 1)
+
+    def test_confirmation_page_loads_items_once(self):
+        self.order.payment_receipt = SimpleUploadedFile(
+            "receipt.jpg", b"receipt", content_type="image/jpeg"
+        )
+        self.order.save()
+        session = self.client.session
+        session["last_order_id"] = self.order.id
+        session.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("order:confirmation"))
+        self.assertEqual(response.context["total_items"], 4)
+        product_queries = [q for q in queries if '"shop_product"' in q["sql"]]
+        self.assertEqual(len(product_queries), 1)
+
+
+class OrderNumberTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="numbers@example.com", password="pass123"
+        )
+        self.client.force_login(self.user)
+
+    def create_order(self):
+        return create_order(self.user)
+
+    def test_numbers_are_fixed_width_and_increasing(self):
+        numbers = [self.create_order().order_number for _ in range(20)]
+        today = timezone.localdate().strftime("%Y%m%d")
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual({len(n) for n in numbers}, {21})
+        self.assertTrue(all(n.startswith(f"ORD{today}") for n in numbers))
+
+    def test_prefix_ending_in_nine(self):
+        order = self.create_order()
+        Order.objects.filter(pk=order.pk).update(order_number="ORD202609190000000001")
+        matches = Order.objects.filter(order_number_prefix_q("ORD20260919"))
+        self.assertEqual(list(matches), [order])
+        self.assertFalse(Order.objects.filter(order_number_prefix_q("ORD2026091Z")))
+
+    def test_format(self):
+        date = timezone.localdate().replace(year=2026, month=1, day=2)
+        self.assertEqual(format_order_number(42, date), "ORD202601020000000042")
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_order_number_query("ord ۲۰۲۶"), "ORD2026")
+        self.assertEqual(normalize_order_number_query("2026"), "ORD2026")
+        self.assertEqual(normalize_order_number_query("ORD-1"), "")
+
+    def test_dashboard_search_by_prefix(self):
+        orders = [self.create_order() for _ in range(3)]
+        url = reverse("dashboard:orders")
+
+        response = self.client.get(url, {"search": orders[0].order_number})
+        self.assertEqual(list(response.context["orders"]), [orders[0]])
+
+        response = self.client.get(url, {"search": orders[0].order_number[3:11]})
+        self.assertEqual(len(response.context["orders"]), 3)
+
+        response = self.client.get(url, {"search": "%"})
+        self.assertEqual(len(response.context["orders"]), 0)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_order_numbers", "--count", "50", "--processes", "1", stdout=out
+        )
+        self.assertIn("No collisions.", out.getvalue())
+
+
+class CheckoutTestCase(TestCase):
+    """
+    A logged-in user with an address and a DB cart, ready to check out.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="buyer@example.com", password="x")
+        self.category = Category.objects.create(name="Checkout", slug="checkout")
+        self.product = self.create_product("Outbox", stock=5)
+        Address.objects.create(
+            user=self.user,
+            label="Home",
+            full_name="John Doe",
+            phone="09123456789",
+            address_line1="Street 1",
+            city="Tehran",
+            state="Tehran",
+            postal_code="1234567890",
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        self.client.force_login(self.user)
+
+    def create_product(self, name, stock):
+        return Product.objects.create(
+            name=name,
+            slug=slugify(name),
+            category=self.category,
+            price=1000,
+            stock=stock,
+        )
+
+    def checkout(self):
+        address = Address.objects.get(user=self.user)
+        receipt = BytesIO()
+        Image.new("RGB", (1, 1)).save(receipt, "PNG")
+        return self.client.post(
+            reverse("order:checkout"),
+            {
+                "shipping_address": address.id,
+                "terms_accepted": "on",
+                "payment_receipt": SimpleUploadedFile(
+                    "receipt.png", receipt.getvalue(), content_type="image/png"
+                ),
+            },
+        )
+
+
+class CheckoutViewTest(CheckoutTestCase):
+    def count_checkout_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.checkout()
+        self.assertRedirects(
+            response, reverse("order:confirmation"), fetch_redirect_response=False
+        )
+        return len(queries)
+
+    def refill_cart(self, size):
+        # a fresh session, so the emptied session cart is not synced back
+        self.client.logout()
+        self.client.force_login(self.user)
+        for _ in range(size):
+            product = self.create_product(f"Bulk {Product.objects.count()}", 5)
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+
+    def test_order_items_created_in_constant_queries(self):
+        # warm the shipping rate tables and other per-process caches
+        self.count_checkout_queries()
+        self.refill_cart(1)
+        single = self.count_checkout_queries()
+
+        self.refill_cart(5)
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertNumQueries(single):
+                self.checkout()
+        inserts = [
+            q["sql"] for q in queries if 'INSERT INTO "order_orderitem"' in q["sql"]
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Order.objects.latest("id").items.count(), 5)
+
+    def test_checkout_page_quotes_the_selected_address(self):
+        self.addCleanup(bump_shipping_version)
+        ShippingRate.objects.create(min_weight=0, base_cost=1000, cost_per_weight=0)
+        ShippingRate.objects.create(
+            province="Isfahan", min_weight=0, base_cost=3000, cost_per_weight=0
+        )
+        home = Address.objects.get(user=self.user)
+        away = Address.objects.create(
+            user=self.user,
+            label="Work",
+            full_name="John Doe",
+            phone="09123456789",
+            address_line1="Street 2",
+            city="Isfahan",
+            state="Isfahan",
+            postal_code="1234567890",
+        )
+
+        response = self.client.get(reverse("order:checkout"))
+        quotes = response.context["shipping_quotes"]
+        self.assertEqual(quotes[str(home.id)]["total"], Decimal("3000"))
+        self.assertEqual(quotes[str(away.id)]["total"], Decimal("5000"))
+        selected = response.context["form"]["shipping_address"].value()
+        self.assertEqual(
+            response.context["shipping_cost"], quotes[str(selected)]["shipping"]
+        )
+
+        # a re-rendered form keeps the totals of the address it posted
+        response = self.client.post(
+            reverse("order:checkout"), {"shipping_address": away.id}
+        )
+        self.assertEqual(response.context["total"], Decimal("5000"))
+
+    def test_oversell_rolls_back_the_order(self):
+        other = self.create_product("Scarce", stock=3)
+        CartItem.objects.create(cart=self.cart, product=other, quantity=2)
+
+        def sell_out_after_hold(user, quantities):
+            # another checkout takes the stock between the hold and the order
+            Product.objects.filter(id=other.id).update(stock=1)
+
+        with patch("order.views.reserve_items", sell_out_after_hold):
+            response = self.checkout()
+
+        self.assertRedirects(
+            response, reverse("cart:cart-summary"), fetch_redirect_response=False
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OrderNumberSequence.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(
+            dict(Product.objects.values_list("id", "stock")),
+            {self.product.id: 5, other.id: 1},
+        )
+        self.assertEqual(self.cart.items.count(), 2)
+
+
+class OutboxTest(CheckoutTestCase):
+    def test_checkout_queues_side_effects(self):
+        response = self.checkout()
+        self.assertRedirects(
+            response, reverse("order:confirmation"), fetch_redirect_response=False
+        )
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(
+            sorted(OutboxMessage.objects.values_list("topic", flat=True)),
+            ["order.placed_email", "order.record_sales"],
+        )
+        # nothing ran in the request
+        self.assertFalse(ProductSalesStats.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command("process_outbox", stdout=out)
+        self.assertIn("Processed 2 outbox messages (0 failed).", out.getvalue())
+        self.assertEqual(ProductSalesStats.objects.get().units_sold, 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(order.order_number, mail.outbox[0].subject)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+
+        # done messages are not processed again
+        self.assertEqual(process_batch(), (0, 0))
+        self.assertEqual(ProductSalesStats.objects.get().units_sold, 2)
+
+    def test_enqueue_is_idempotent(self):
+        enqueue("test.noop", {}, "test:1")
+        enqueue("test.noop", {"other": True}, "test:1")
+        self.assertEqual(
+            OutboxMessage.objects.filter(idempotency_key="test:1").count(), 1
+        )
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=0)
+    def test_failures_are_retried_then_given_up(self):
+        calls = []
+        self.addCleanup(HANDLERS.pop, "test.flaky")
+
+        @handler("test.flaky")
+        def flaky(payload):
+            calls.append(payload)
+            ProductSalesStats.objects.create(product=self.product)
+            raise RuntimeError("boom")
+
+        enqueue("test.flaky", {"n": 1}, "test:flaky")
+        with self.assertLogs("order.outbox", "ERROR"):
+            self.assertEqual(process_batch(), (0, 1))
+        message = OutboxMessage.objects.get(idempotency_key="test:flaky")
+        self.assertEqual((message.status, message.attempts), ("pending", 1))
+        self.assertIn("boom", message.last_error)
+        # the handler's writes were rolled back with it
+        self.assertFalse(ProductSalesStats.objects.exists())
+
+        with self.assertLogs("order.outbox", "ERROR"):
+            self.assertEqual(process_batch(), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ("failed", 2))
+        self.assertEqual(process_batch(), (0, 0))
+        self.assertEqual(len(calls), 2)
+
+    def test_claims_are_exclusive(self):
+        enqueue("test.noop", {}, "test:claim")
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_lost_lease_rolls_back_handler(self):
+        self.addCleanup(HANDLERS.pop, "test.slow")
+
+        @handler("test.slow")
+        def slow(payload):
+            ProductSalesStats.objects.create(product=self.product)
+            # another worker takes the message over meanwhile
+            OutboxMessage.objects.update(claimed_by="other")
+
+        enqueue("test.slow", {}, "test:slow")
+        (message,) = claim_batch(10)
+        with self.assertLogs("order.outbox", "WARNING"):
+            self.assertIsNone(process_message(message))
+        message.refresh_from_db()
+        self.assertEqual(message.status, "pending")
+        self.assertFalse(ProductSalesStats.objects.exists())
+
+    def test_cancelling_takes_sales_back_out(self):
+        self.checkout()
+        process_batch()
+        order = Order.objects.get(user=self.user)
+
+        order.status = "cancelled"
+        order.save()
+        self.assertEqual(process_batch(), (1, 0))
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_sold, stats.units_7d), (0, 0))
+
+        order.status = "pending"
+        order.save()
+        self.assertEqual(process_batch(), (1, 0))
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_sold, stats.units_7d), (2, 2))
+
+    def test_cancelling_puts_units_back_in_stock(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+        # cancelled before its first message ran: restocked exactly once
+        order.status = "cancelled"
+        order.save()
+        # placed email, first sales message and the cancellation's
+        self.assertEqual(process_batch(), (3, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+        order.status = "pending"
+        order.save()
+        process_batch()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_restoring_a_sold_out_order_is_retried(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        order.status = "cancelled"
+        order.save()
+        process_batch()
+        Product.objects.filter(id=self.product.id).update(stock=1)
+
+        order.status = "pending"
+        order.save()
+        self.assertEqual(process_batch(), (0, 1))
+        order.refresh_from_db()
+        self.assertTrue(order.stock_released)
+
+    def test_sales_recorded_once_per_order(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        HANDLERS["order.record_sales"]({"order_id": order.id})
+        HANDLERS["order.record_sales"]({"order_id": order.id})
+        self.assertEqual(ProductSalesStats.objects.get().units_sold, 2)
+        order.refresh_from_db()
+        self.assertTrue(order.sales_recorded)
+
+    def test_saving_a_stale_order_keeps_sales_recorded(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        process_batch()
+        order.notes = "call first"
+        order.save()
+        order.refresh_from_db()
+        self.assertTrue(order.sales_recorded)
+        self.assertEqual(order.notes, "call first")
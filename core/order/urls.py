@@ -11,6 +11,11 @@ urlpatterns = [
         views.ShippingInvoiceListView.as_view(),
         name="shipping_invoice_list",
     ),
+    path(
+        "shipping-invoices/export/",
+        views.shipping_invoice_bulk_view,
+        name="shipping_invoice_bulk",
+    ),
     path(
         "shipping-invoice/<int:order_id>/",
         views.ShippingInvoiceDetailView.as_view(),
@@ -3,21 +3,37 @@ from django.urls import reverse_lazy
 from django.views.generic import CreateView, DetailView, ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.conf import settings
 from django.db import transaction
 from decimal import Decimal
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from weasyprint import HTML
-import tempfile
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
 
-from .store_settings import STORE_INFO
 from .models import Order, OrderItem, Address
-from .forms import CheckoutForm
+from .forms import CheckoutForm, InvoiceExportForm
+from .invoices import (
+    get_invoice_pdf,
+    invoice_context,
+    invoice_etag,
+    invoice_orders,
+    invoice_path,
+    stream_invoice_zip,
+)
 from cart.models import Cart
 from cart.cart import CartSession
+from .stock import InsufficientStock, decrement_stock
+from .summary import OrderSummary
+from .outbox import enqueue_order_placed
+from .reservations import release_reservations, reserve_items
+from core.pagination import MAX_COUNT, CursorPaginationMixin, bounded_count
 
 
 @method_decorator(login_required, name="dispatch")
@@ -40,17 +56,40 @@ class CheckoutView(LoginRequiredMixin, CreateView):
             messages.warning(request, "لطفاً ابتدا آدرس خود را ثبت کنید")
             return redirect("dashboard:addresses")
 
-        # Check if user has a cart with items
+        # Flush pending session cart changes so the DB cart is current
+        CartSession(request.session).sync_to_db(request.user, force=True)
+
+        # Check if user has a cart with items; totals come annotated in SQL
         try:
-            self.cart = Cart.objects.get(user=request.user)
-            if not self.cart.items.exists():
+            self.cart = Cart.objects.with_totals().get(user=request.user)
+            if not self.cart.item_count:
                 raise Cart.DoesNotExist
         except Cart.DoesNotExist:
             messages.warning(request, "سبد خرید شما خالی است")
             return redirect("cart:cart-summary")
 
+        # Hold the cart's units while the user is checking out
+        try:
+            reserve_items(
+                request.user,
+                dict(self.cart.items.values_list("product_id", "quantity")),
+            )
+        except InsufficientStock as exc:
+            return self.insufficient_stock(exc)
+
         return super().dispatch(request, *args, **kwargs)
 
+    def insufficient_stock(self, exc):
+        """
+        Send the user back to the cart naming the products that ran short.
+        """
+        message = "موجودی برخی کالاهای سبد خرید کافی نیست"
+        if exc.products:
+            names = "، ".join(product.name for product in exc.products)
+            message = f"{message}: {names}"
+        messages.error(self.request, message)
+        return redirect("cart:cart-summary")
+
     def get_form_kwargs(self):
         """
         Extend form kwargs to pass the current user to the form.
@@ -65,35 +104,76 @@ class CheckoutView(LoginRequiredMixin, CreateView):
         """
         context = super().get_context_data(**kwargs)
 
-        # Calculate order totals
+        # Quote shipping for every address: the page re-totals when the
+        # selection changes, so it shows what create_order will charge
+        form = context["form"]
+        addresses = form.fields["shipping_address"].queryset.only("id", "state")
         subtotal = self.cart.get_total_price()
-        shipping_cost = self.cart.get_shipping_cost()
-        total = subtotal + shipping_cost
+        shipping_quotes = {
+            address.pk: self.cart.get_shipping_cost(province=address.state)
+            for address in addresses
+        }
+        first = next(iter(shipping_quotes), None)
+        if not form.is_bound:
+            form.initial.setdefault("shipping_address", first)
+        try:
+            selected = int(form["shipping_address"].value())
+        except (TypeError, ValueError):
+            selected = None
+        if selected not in shipping_quotes:
+            selected = first
+        shipping_cost = shipping_quotes.get(selected, Decimal("0"))
 
         context.update(
             {
                 "cart": self.cart,
+                "cart_items": self.cart.items.select_related("product"),
                 "subtotal": subtotal,
                 "shipping_cost": shipping_cost,
-                "total": total,
+                "total": subtotal + shipping_cost,
+                "shipping_quotes": {
+                    str(pk): {"shipping": shipping, "total": subtotal + shipping}
+                    for pk, shipping in shipping_quotes.items()
+                },
                 "bank_card_number": "6219 8619 2157 4926",
                 "bank_account_holder": "فروشگاه گوریلا",
             }
         )
         return context
 
-    @transaction.atomic
     def form_valid(self, form):
         """
-        Process valid form submission and create order with atomic transaction.
+        Process valid form submission and create the order atomically.
+        Sends the user back to the cart if stock ran out meanwhile.
+        """
+        try:
+            with transaction.atomic():
+                order = self.create_order(form)
+        except InsufficientStock as exc:
+            return self.insufficient_stock(exc)
+
+        # Clear user's cart after successful order
+        CartSession(self.request.session).clear()
+
+        # Store order ID in session for confirmation page
+        self.request.session["last_order_id"] = order.id
+        messages.success(self.request, "سفارش شما با موفقیت ثبت شد")
+
+        return redirect(self.success_url)
+
+    def create_order(self, form):
+        """
+        Create the order, its items and the stock decrement in a constant
+        number of queries, whatever the cart size.
         """
         # Get selected shipping address from form
         shipping_address = form.cleaned_data["shipping_address"]
 
-        # Calculate order totals
-        subtotal = self.cart.get_total_price()
-        shipping_cost = self.cart.get_shipping_cost()
-        total = subtotal + shipping_cost
+        # Load cart items with their products once and price them in one pass
+        totals = self.cart.get_totals(
+            list(self.cart.items.select_related("product")),
+            province=shipping_address.state,
+        )
 
         # Create order instance with user and totals
         order = form.save(commit=False)
@@ -110,31 +190,36 @@ class CheckoutView(LoginRequiredMixin, CreateView):
         order.shipping_country = shipping_address.country
 
         # Set order pricing
-        order.subtotal = subtotal
-        order.shipping_cost = shipping_cost
-        order.total = total
+        order.subtotal = totals.subtotal
+        order.shipping_cost = totals.shipping
+        order.total = totals.total
         order.save()
 
-        # Create order items from cart items
-        for item in self.cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                product_name=item.product.name,
-                product_price=item.product.get_price(),
-                quantity=item.quantity,
-                subtotal=item.get_total_price(),
-            )
+        # Reserve stock first so an oversold cart rolls everything back
+        decrement_stock({line.key.product_id: line.quantity for line in totals.lines})
 
-        # Clear user's cart after successful order
-        self.cart.items.all().delete()
-        CartSession(self.request.session).clear()
+        # Create order items from cart items
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product=line.key.product,
+                    product_name=line.key.product.name,
+                    product_price=line.unit.price,
+                    quantity=line.quantity,
+                    subtotal=line.total_price,
+                )
+                for line in totals.lines
+            ]
+        )
 
-        # Store order ID in session for confirmation page
-        self.request.session["last_order_id"] = order.id
-        messages.success(self.request, "سفارش شما با موفقیت ثبت شد")
+        # Sales stats and the confirmation email are handled by the outbox
+        # worker, committed together with the order
+        enqueue_order_placed(order)
 
-        return redirect(self.success_url)
+        self.cart.items.all().delete()
+        release_reservations(self.request.user)
+        return order
 
 
 class OrderConfirmationView(LoginRequiredMixin, DetailView):
@@ -159,19 +244,23 @@ class OrderConfirmationView(LoginRequiredMixin, DetailView):
         del self.request.session["last_order_id"]
 
         # Retrieve order ensuring it belongs to current user
-        return get_object_or_404(Order, id=order_id, user=self.request.user)
+        order = get_object_or_404(
+            OrderSummary.queryset(), id=order_id, user=self.request.user
+        )
+        self.summary = OrderSummary(order)
+        return order
 
     def get_context_data(self, **kwargs):
         """
         Extend template context with additional order information.
         """
         context = super().get_context_data(**kwargs)
-        # Additional context can be added here if needed
+        context.update(self.summary.get_context_data())
         return context
 
 
 @method_decorator(staff_member_required, name="dispatch")
-class ShippingInvoiceListView(ListView):
+class ShippingInvoiceListView(CursorPaginationMixin, ListView):
     """
     Display a paginated list of orders for staff users in order to
     view and manage shipping invoices.
@@ -181,6 +270,7 @@ class ShippingInvoiceListView(ListView):
     template_name = "order/shipping_invoice_list.html"
     context_object_name = "orders"
     paginate_by = 20
+    cursor_ordering = ("-created_date", "-id")
 
     def get_queryset(self):
         """
@@ -193,7 +283,10 @@ class ShippingInvoiceListView(ListView):
         Add additional context data for the template.
         """
         context = super().get_context_data(**kwargs)
-        context["total_orders"] = Order.objects.count()
+        total_orders = bounded_count(Order.objects.all(), MAX_COUNT + 1)
+        context["total_orders"] = min(total_orders, MAX_COUNT)
+        context["total_orders_capped"] = total_orders > MAX_COUNT
+        context["export_form"] = InvoiceExportForm()
         return context
 
 
@@ -208,66 +301,80 @@ class ShippingInvoiceDetailView(DetailView):
     context_object_name = "order"
     pk_url_kwarg = "order_id"
 
+    def get_queryset(self):
+        """
+        Load the order with its items and products in two queries.
+        """
+        return OrderSummary.queryset()
+
     def get_context_data(self, **kwargs):
         """
         Add additional context data for the shipping invoice detail view.
         """
         context = super().get_context_data(**kwargs)
-        order = self.get_object()
-
-        context["store"] = STORE_INFO
-
-        context["total_items"] = sum(item.quantity for item in order.items.all())
-
-        total_weight = 0
-        for item in order.items.select_related("product"):
-            if hasattr(item.product, "weight") and item.product.weight:
-                total_weight += item.product.weight * item.quantity
-        context["total_weight"] = total_weight
-
+        context.update(invoice_context(self.object))
         return context
 
 
 @staff_member_required
 def shipping_invoice_pdf_view(request, order_id):
     """
-    Generate and return a PDF version of a shipping invoice for an order.
+    Serve the PDF shipping invoice of an order from the on-disk cache,
+    rendering it only when the cached file is missing or stale.
     """
-    try:
-        order = (
-            Order.objects.select_related("user")
-            .prefetch_related("items__product")
-            .get(id=order_id)
-        )
-    except Order.DoesNotExist:
+    order = Order.objects.filter(id=order_id).first()
+    if order is None:
         return HttpResponse("سفارش یافت نشد", status=404)
 
-    store = STORE_INFO
+    etag = invoice_etag(order.id, order.updated_date)
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
 
-    total_items = sum(item.quantity for item in order.items.all())
-
-    total_weight = 0
-    for item in order.items.select_related("product"):
-        if hasattr(item.product, "weight") and item.product.weight:
-            total_weight += item.product.weight * item.quantity
-
-    html_string = render_to_string(
-        "order/shipping_invoice_pdf.html",
-        {
-            "order": order,
-            "store": store,
-            "total_items": total_items,
-            "total_weight": total_weight,
-        },
+    path = invoice_path(order.id, order.updated_date)
+    try:
+        pdf = open(path, "rb")
+    except FileNotFoundError:
+        # the items are loaded with one more query, only when rendering
+        pdf = open(get_invoice_pdf(order), "rb")
+
+    response = FileResponse(
+        pdf,
+        content_type="application/pdf",
+        filename=f"shipping_invoice_{order.order_number}.pdf",
     )
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
-    html = HTML(string=html_string, base_url=request.build_absolute_uri())
-    result = html.write_pdf()
 
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = (
-        f'inline; filename="shipping_invoice_{order.order_number}.pdf"'
+@staff_member_required
+def shipping_invoice_bulk_view(request):
+    """
+    Export the shipping invoices of all orders matching a status and/or
+    date range, as a streamed ZIP of PDFs. The merged PDF is only made by
+    the export_invoices command.
+    """
+    form = InvoiceExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest("فیلترهای خروجی فاکتور نامعتبر است")
+
+    data = form.cleaned_data
+    orders = list(
+        invoice_orders(data["status"], data["date_from"], data["date_to"])[
+            : settings.INVOICE_BULK_MAX_ORDERS + 1
+        ]
     )
-    response.write(result)
+    if not orders:
+        return HttpResponse("سفارشی با این فیلترها یافت نشد", status=404)
+    if len(orders) > settings.INVOICE_BULK_MAX_ORDERS:
+        return HttpResponseBadRequest(
+            f"حداکثر {settings.INVOICE_BULK_MAX_ORDERS} سفارش در هر خروجی مجاز است"
+        )
 
+    response = StreamingHttpResponse(
+        stream_invoice_zip(orders), content_type="application/zip"
+    )
+    response["Content-Disposition"] = 'attachment; filename="shipping_invoices.zip"'
     return response
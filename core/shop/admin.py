@@ -1,6 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Product, Category, Brand, Review, ProductImage, Wishlist
+from .models import (
+    Product,
+    Category,
+    Brand,
+    Review,
+    ProductImage,
+    Wishlist,
+    ProductSalesStats,
+)
 
 
 @admin.register(Category)
@@ -168,3 +176,36 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ("approved",)
     search_fields = ("name", "email", "review")
     actions = ["approve_reviews"]
+
+
+@admin.register(ProductSalesStats)
+class ProductSalesStatsAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the maintained best-seller statistics.
+    """
+
+    list_display = (
+        "product",
+        "units_sold",
+        "units_30d",
+        "units_7d",
+        "revenue",
+        "last_sold_at",
+    )
+    list_select_related = ("product",)
+    ordering = ("-units_sold",)
+    readonly_fields = (
+        "product",
+        "units_sold",
+        "units_30d",
+        "units_7d",
+        "revenue",
+        "last_sold_at",
+        "updated_at",
+    )
+
+    def has_add_permission(self, request):
+        """
+        Stats are maintained by the order outbox and rebuild_sales_stats only.
+        """
+        return False
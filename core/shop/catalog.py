@@ -0,0 +1,141 @@
+import time
+
+from django.core.cache import cache
+
+from core.cache import get_cache_version, bump_cache_version
+
+CATALOG_NAMESPACE = "shop:catalog"
+REVIEWS_NAMESPACE = "shop:reviews"
+SEARCH_NAMESPACE = "shop:search"
+PRODUCT_CACHE_TIMEOUT = 60 * 60
+# seconds a process trusts its local copies; bounds how long a product
+# dropped from the shared cache by another process can still be served
+LOCAL_PRODUCT_TIMEOUT = 10
+
+# marker stored for ids that are missing or unavailable, so they are not re-queried
+UNAVAILABLE = False
+
+# process-local layer in front of the shared cache; replaced whenever the
+# version changes or LOCAL_PRODUCT_TIMEOUT passes
+_local_products = {"version": None, "expires": 0, "products": {}}
+
+
+def get_catalog_version():
+    """
+    Return the current product catalog version.
+    Anything derived from product price, stock or availability should be
+    stored together with this number and treated as stale once it changes.
+    """
+    return get_cache_version(CATALOG_NAMESPACE)
+
+
+def bump_catalog_version():
+    """
+    Invalidate everything derived from the product catalog.
+    """
+    return bump_cache_version(CATALOG_NAMESPACE)
+
+
+def get_search_version():
+    """
+    Return the version of the searchable product text (see shop.search).
+    """
+    return get_cache_version(SEARCH_NAMESPACE)
+
+
+def bump_search_version():
+    """
+    Invalidate search indexes after product text was added, changed or removed.
+    """
+    return bump_cache_version(SEARCH_NAMESPACE)
+
+
+def bump_reviews_version():
+    """
+    Invalidate fragments that show review counts.
+    """
+    return bump_cache_version(REVIEWS_NAMESPACE)
+
+
+def _product_key(version, product_id):
+    return f"shop:product:{version}:{product_id}"
+
+
+def _get_local_products(version):
+    now = time.monotonic()
+    if _local_products["version"] != version or _local_products["expires"] < now:
+        _local_products["products"] = {}
+        _local_products["version"] = version
+        _local_products["expires"] = now + LOCAL_PRODUCT_TIMEOUT
+    return _local_products["products"]
+
+
+def forget_products(product_ids):
+    """
+    Drop the cached copies of some products without touching the catalog
+    version, for changes (like a stock decrement) that leave every other
+    catalog-derived cache valid.
+    """
+    version = get_catalog_version()
+    cache.delete_many([_product_key(version, pid) for pid in product_ids])
+    local = _get_local_products(version)
+    for pid in product_ids:
+        local.pop(pid, None)
+
+
+def get_products(product_ids):
+    """
+    Return {id: Product} for the available products among product_ids.
+
+    Reads go through a process-local dict, then the shared cache, and only
+    the remaining misses are loaded from the database (in one query).
+    Entries are keyed by catalog version, so a product save drops them all.
+    """
+    ids = set()
+    for product_id in product_ids:
+        try:
+            ids.add(int(product_id))
+        except (TypeError, ValueError):
+            continue
+    if not ids:
+        return {}
+
+    # imported here to avoid a circular import with shop.models/signals
+    from .models import Product
+
+    version = get_catalog_version()
+    local = _get_local_products(version)
+
+    found = {pid: local[pid] for pid in ids if pid in local}
+    missing = ids - found.keys()
+
+    if missing:
+        keys = {_product_key(version, pid): pid for pid in missing}
+        for key, value in cache.get_many(keys).items():
+            found[keys[key]] = value
+        missing -= found.keys()
+
+    if missing:
+        products = {
+            p.id: p for p in Product.objects.filter(id__in=missing, available=True)
+        }
+        loaded = {pid: products.get(pid, UNAVAILABLE) for pid in missing}
+        cache.set_many(
+            {_product_key(version, pid): value for pid, value in loaded.items()},
+            PRODUCT_CACHE_TIMEOUT,
+        )
+        found.update(loaded)
+
+    local.update(found)
+    return {pid: p for pid, p in found.items() if p is not UNAVAILABLE}
+
+
+def get_product(product_id):
+    """
+    Return the available Product with the given id, or None.
+    """
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        return None
+    return get_products([product_id]).get(product_id)
@@ -0,0 +1,108 @@
+import hashlib
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .catalog import get_catalog_version
+
+FACET_CACHE_TIMEOUT = 60 * 15
+
+# (label, min_price, max_price); both bounds are inclusive, like the
+# min_price/max_price filters of the product list, and prices are whole
+# Toman, so the buckets do not overlap. None means no upper bound.
+PRICE_BUCKETS = (
+    ("زیر ۵۰۰ هزار", 0, 499_999),
+    ("۵۰۰ هزار تا ۱ میلیون", 500_000, 999_999),
+    ("۱ تا ۲ میلیون", 1_000_000, 1_999_999),
+    ("۲ تا ۵ میلیون", 2_000_000, 4_999_999),
+    ("بالای ۵ میلیون", 5_000_000, None),
+)
+
+# query parameters that do not change the filtered set
+NON_FILTER_PARAMS = ("page", "page_size", "order_by", "cursor")
+
+
+def _price_bucket_expression():
+    whens = []
+    for position, (_, low, high) in enumerate(PRICE_BUCKETS):
+        if high is None:
+            whens.append(When(price__gte=low, then=Value(position)))
+        else:
+            whens.append(When(price__gte=low, price__lte=high, then=Value(position)))
+    return Case(*whens, default=Value(None), output_field=IntegerField())
+
+
+def compute_facets(queryset):
+    """
+    Return facet counts for a Product queryset in a single GROUP BY query.
+
+    Every (brand, category, taste, price bucket, in stock) combination is
+    counted once by the database and folded into per-facet counters here.
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(
+            price_bucket=_price_bucket_expression(),
+            has_stock=Case(
+                When(stock__gt=0, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        .values("brand_id", "category_id", "taste", "price_bucket", "has_stock")
+        .annotate(count=Count("id"))
+    )
+
+    total = 0
+    brands, categories, tastes, buckets = Counter(), Counter(), Counter(), Counter()
+    in_stock = 0
+    for row in rows:
+        count = row["count"]
+        total += count
+        if row["brand_id"] is not None:
+            brands[row["brand_id"]] += count
+        categories[row["category_id"]] += count
+        if row["taste"]:
+            tastes[row["taste"]] += count
+        if row["price_bucket"] is not None:
+            buckets[row["price_bucket"]] += count
+        if row["has_stock"]:
+            in_stock += count
+
+    return {
+        "total": total,
+        "brands": dict(brands),
+        "categories": dict(categories),
+        "tastes": sorted(tastes.items(), key=lambda item: (-item[1], item[0])),
+        "price_buckets": [
+            {"label": label, "min": low, "max": high, "count": buckets[position]}
+            for position, (label, low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        "in_stock": in_stock,
+    }
+
+
+def filter_signature(params):
+    """
+    Return a stable digest of the filtering query parameters.
+    `params` is a QueryDict (or anything with .lists()).
+    """
+    items = sorted(
+        (key, sorted(values))
+        for key, values in params.lists()
+        if key not in NON_FILTER_PARAMS
+    )
+    return hashlib.md5(repr(items).encode()).hexdigest()
+
+
+def get_facets(queryset, params):
+    """
+    Return compute_facets(queryset), cached per filter signature and catalog version.
+    """
+    key = f"shop:facets:{get_catalog_version()}:{filter_signature(params)}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
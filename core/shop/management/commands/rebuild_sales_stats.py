@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from shop.sales import rebuild_sales_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild product sales statistics (best-seller ranking) from order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows written per INSERT",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding product sales stats...")
+        count = rebuild_sales_stats(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt sales stats for {count} products.")
+        )
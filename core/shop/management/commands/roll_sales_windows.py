@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop.sales import roll_sales_windows
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop the days that rolled out of the 7/30-day best-seller windows (run daily)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows written per UPDATE",
+        )
+
+    def handle(self, *args, **options):
+        count = roll_sales_windows(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rolled sales windows for {count} products.")
+        )
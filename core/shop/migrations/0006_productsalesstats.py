@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0005_alter_wishlist_product_alter_wishlist_user_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSalesStats",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales_stats",
+                        serialize=False,
+                        to="shop.product",
+                    ),
+                ),
+                ("units_sold", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=0, default=0, max_digits=14),
+                ),
+                ("units_7d", models.PositiveIntegerField(default=0)),
+                ("units_30d", models.PositiveIntegerField(default=0)),
+                ("last_sold_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Product sales stats",
+                "indexes": [
+                    models.Index(
+                        fields=["-units_30d", "-units_sold"],
+                        name="shop_produc_units_3_106196_idx",
+                    ),
+                    models.Index(
+                        fields=["-units_7d"], name="shop_produc_units_7_f534e3_idx"
+                    ),
+                    models.Index(
+                        fields=["-units_sold"], name="shop_produc_units_s_cef618_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSalesDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=0, default=0, max_digits=14),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_days",
+                        to="shop.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product sales days",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "day"), name="product_sales_day_unique"
+                    )
+                ],
+            },
+        ),
+    ]
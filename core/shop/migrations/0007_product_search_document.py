@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:11
+
+from django.db import migrations, models
+
+
+def populate_search_documents(apps, schema_editor):
+    from shop.search import build_search_document
+
+    Product = apps.get_model("shop", "Product")
+    products = list(Product.objects.select_related("brand", "category"))
+    for product in products:
+        product.search_document = build_search_document(product)
+    Product.objects.bulk_update(products, ["search_document"], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    # GIN trigram indexes only exist on Postgres; other backends use the
+    # in-process index in shop.search
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS shop_product_search_trgm "
+        "ON shop_product USING gin (search_document gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS shop_product_search_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0006_productsalesstats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_document",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
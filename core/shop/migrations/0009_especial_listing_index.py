@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0008_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("available", True)),
+                fields=["-especial", "-created_at", "-id"],
+                name="product_avail_especial_idx",
+            ),
+        ),
+    ]
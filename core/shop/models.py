@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.utils.text import slugify
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -147,6 +148,8 @@ class Product(models.Model):
 
     especial = models.BooleanField(default=False)
     available = models.BooleanField(default=True)
+    # normalized name/brand/category/description text; trigram indexed on Postgres
+    search_document = models.TextField(blank=True, default="", editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -155,14 +158,55 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=["slug"]),
             models.Index(fields=["name"]),
+            # partial indexes for the product list orderings (available products only)
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="product_avail_created_idx",
+                condition=Q(available=True),
+            ),
+            models.Index(
+                fields=["price", "id"],
+                name="product_avail_price_idx",
+                condition=Q(available=True),
+            ),
+            models.Index(
+                fields=["-rating", "-id"],
+                name="product_avail_rating_idx",
+                condition=Q(available=True),
+            ),
+            models.Index(
+                fields=["-discount", "-id"],
+                name="product_avail_discount_idx",
+                condition=Q(available=True),
+            ),
+            models.Index(
+                fields=["-especial", "-created_at", "-id"],
+                name="product_avail_especial_idx",
+                condition=Q(available=True),
+            ),
+            models.Index(
+                fields=["category", "-created_at"],
+                name="product_avail_category_idx",
+                condition=Q(available=True),
+            ),
         ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets post_save handlers tell whether the searchable text changed
+        instance._loaded_search_document = instance.__dict__.get("search_document")
+        return instance
+
     def save(self, *args, **kwargs):
+        from .search import build_search_document
+
         if not self.slug:
             self.slug = slugify(self.name)
+        self.search_document = build_search_document(self)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -220,8 +264,9 @@ class Review(models.Model):
     Represents a reviews made by a user on a Shop product.
     """
 
+    # indexed by review_product_approved_idx, which leads with product
     product = models.ForeignKey(
-        Product, on_delete=models.CASCADE, related_name="reviews"
+        Product, on_delete=models.CASCADE, related_name="reviews", db_index=False
     )
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=100)
@@ -231,6 +276,14 @@ class Review(models.Model):
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "approved", "-created_at"],
+                name="review_product_approved_idx",
+            ),
+        ]
+
     def __str__(self):
         """Returns a readable string representation of the review."""
         return f"Review by {self.name} on {self.product.name}"
@@ -247,3 +300,62 @@ class Wishlist(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.product.name}"
+
+
+class ProductSalesStats(models.Model):
+    """
+    Maintained sales aggregate for a product: all-time totals and units
+    sold over the last 7 and 30 days.
+    Updated incrementally by the order outbox worker; the windows drop days
+    that roll out with the daily roll_sales_windows command, and everything
+    can be rebuilt in bulk with the rebuild_sales_stats command.
+    """
+
+    product = models.OneToOneField(
+        "Product",
+        on_delete=models.CASCADE,
+        related_name="sales_stats",
+        primary_key=True,
+    )
+    units_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    units_7d = models.PositiveIntegerField(default=0)
+    units_30d = models.PositiveIntegerField(default=0)
+    last_sold_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Product sales stats"
+        indexes = [
+            models.Index(fields=["-units_30d", "-units_sold"]),
+            models.Index(fields=["-units_7d"]),
+            models.Index(fields=["-units_sold"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.units_sold}"
+
+
+class ProductSalesDay(models.Model):
+    """
+    Units and revenue of a product sold on one (local) day.
+    The daily roll-off recomputes the ProductSalesStats windows from them.
+    """
+
+    product = models.ForeignKey(
+        "Product", on_delete=models.CASCADE, related_name="sales_days"
+    )
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+
+    class Meta:
+        verbose_name_plural = "Product sales days"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "day"], name="product_sales_day_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.day}: {self.units}"
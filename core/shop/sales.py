@@ -0,0 +1,175 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.cache import bump_cache_version
+from .models import ProductSalesDay, ProductSalesStats
+
+SALES_NAMESPACE = "shop:sales"
+
+
+def record_sales(lines, sold_at=None):
+    """
+    Add sold units to ProductSalesStats, to its 7/30-day windows when the
+    sale falls inside them, and to the ProductSalesDay bucket of the day
+    they were sold.
+
+    `lines` is an iterable of (product_id, quantity, subtotal); negative
+    quantities take a cancelled order's units back out of the same day.
+    Rows are created on first sale and then updated with F() increments,
+    so concurrent workers do not overwrite each other.
+    """
+    sold_at = sold_at or timezone.now()
+    day = timezone.localdate(sold_at)
+    age = (timezone.localdate() - day).days
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for product_id, quantity, subtotal in lines:
+        totals[product_id][0] += quantity
+        totals[product_id][1] += Decimal(subtotal)
+    if not totals:
+        return
+
+    with transaction.atomic():
+        ProductSalesStats.objects.bulk_create(
+            [ProductSalesStats(product_id=product_id) for product_id in totals],
+            ignore_conflicts=True,
+        )
+        ProductSalesDay.objects.bulk_create(
+            [ProductSalesDay(product_id=product_id, day=day) for product_id in totals],
+            ignore_conflicts=True,
+        )
+        for product_id, (units, revenue) in totals.items():
+            changes = {
+                "units_sold": F("units_sold") + units,
+                "revenue": F("revenue") + revenue,
+            }
+            if age < 7:
+                changes["units_7d"] = F("units_7d") + units
+            if age < 30:
+                changes["units_30d"] = F("units_30d") + units
+            if units > 0:
+                changes["last_sold_at"] = sold_at
+            ProductSalesStats.objects.filter(product_id=product_id).update(**changes)
+            ProductSalesDay.objects.filter(product_id=product_id, day=day).update(
+                units=F("units") + units, revenue=F("revenue") + revenue
+            )
+        transaction.on_commit(lambda: bump_cache_version(SALES_NAMESPACE))
+
+
+def _window_totals(today):
+    """
+    Return {product_id: (units_7d, units_30d)} summed from the daily buckets
+    of the 30 days up to today, for products that sold in that time.
+    """
+    rows = (
+        ProductSalesDay.objects.filter(day__gte=today - timedelta(days=29))
+        .values("product_id")
+        .annotate(
+            week=Sum("units", filter=Q(day__gte=today - timedelta(days=6))),
+            month=Sum("units"),
+        )
+        .order_by()
+    )
+    return {row["product_id"]: (row["week"] or 0, row["month"]) for row in rows}
+
+
+def roll_sales_windows(today=None, batch_size=1000):
+    """
+    Recompute units_7d and units_30d from the daily buckets, dropping the
+    days that rolled out of the windows. Run once a day, after midnight.
+
+    Only products with a non-empty window or a recent sale are written.
+    Their stats rows are locked first so increments from record_sales are
+    applied either before the buckets are read or after the new windows.
+    Returns the number of products written.
+    """
+    today = today or timezone.localdate()
+    since = today - timedelta(days=29)
+    with transaction.atomic():
+        stats = list(
+            ProductSalesStats.objects.select_for_update().filter(
+                Q(units_7d__gt=0)
+                | Q(units_30d__gt=0)
+                | Q(
+                    product_id__in=ProductSalesDay.objects.filter(
+                        day__gte=since
+                    ).values("product_id")
+                )
+            )
+        )
+        windows = _window_totals(today)
+        for product_stats in stats:
+            product_stats.units_7d, product_stats.units_30d = windows.get(
+                product_stats.product_id, (0, 0)
+            )
+        ProductSalesStats.objects.bulk_update(
+            stats, ["units_7d", "units_30d"], batch_size=batch_size
+        )
+        transaction.on_commit(lambda: bump_cache_version(SALES_NAMESPACE))
+    return len(stats)
+
+
+def rebuild_sales_stats(batch_size=1000):
+    """
+    Recompute every ProductSalesStats row, its windows and the daily
+    buckets from order history with one grouped query over OrderItem.
+
+    Only orders whose units are recorded (Order.sales_recorded) are
+    counted, which is what the incremental updates maintain: cancelled
+    orders are taken out by the order outbox worker. Returns the number
+    of products written.
+    """
+    from order.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(order__sales_recorded=True)
+        .annotate(day=TruncDate("order__created_date"))
+        .values("product_id", "day")
+        .annotate(
+            units=Sum("quantity"),
+            revenue_total=Sum("subtotal"),
+            last_sold=Max("order__created_date"),
+        )
+        .order_by()
+    )
+
+    today = timezone.localdate()
+    stats = {}
+    days = []
+    for row in rows.iterator():
+        product_id = row["product_id"]
+        days.append(
+            ProductSalesDay(
+                product_id=product_id,
+                day=row["day"],
+                units=row["units"] or 0,
+                revenue=row["revenue_total"] or 0,
+            )
+        )
+        product_stats = stats.setdefault(
+            product_id, ProductSalesStats(product_id=product_id)
+        )
+        product_stats.units_sold += row["units"] or 0
+        age = (today - row["day"]).days
+        if age < 7:
+            product_stats.units_7d += row["units"] or 0
+        if age < 30:
+            product_stats.units_30d += row["units"] or 0
+        product_stats.revenue += row["revenue_total"] or 0
+        last_sold_at = product_stats.last_sold_at
+        if last_sold_at is None or row["last_sold"] > last_sold_at:
+            product_stats.last_sold_at = row["last_sold"]
+
+    with transaction.atomic():
+        ProductSalesDay.objects.all().delete()
+        ProductSalesStats.objects.all().delete()
+        ProductSalesStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+        ProductSalesDay.objects.bulk_create(days, batch_size=batch_size)
+        transaction.on_commit(lambda: bump_cache_version(SALES_NAMESPACE))
+
+    return len(stats)
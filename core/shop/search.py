@@ -0,0 +1,222 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+from .catalog import get_search_version
+
+# Arabic code points that have a distinct Persian form, plus Persian/Arabic digits
+PERSIAN_TRANSLATION = str.maketrans(
+    {
+        "\u064a": "\u06cc",  # Arabic yeh -> Persian yeh
+        "\u0649": "\u06cc",  # alef maksura -> Persian yeh
+        "\u0626": "\u06cc",  # yeh with hamza -> Persian yeh
+        "\u0643": "\u06a9",  # Arabic kaf -> keheh
+        "\u0629": "\u0647",  # teh marbuta -> heh
+        "\u06c0": "\u0647",  # heh with yeh -> heh
+        "\u0623": "\u0627",  # alef with hamza above -> alef
+        "\u0625": "\u0627",  # alef with hamza below -> alef
+        "\u0671": "\u0627",  # alef wasla -> alef
+        "\u0624": "\u0648",  # waw with hamza -> waw
+        **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+        **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+        "\u200c": " ",  # zero-width non-joiner
+        "\u200f": "",  # right-to-left mark
+        "\u0640": "",  # tatweel
+    }
+)
+DIACRITICS_RE = re.compile("[\u064b-\u065f\u0670]")
+TOKEN_RE = re.compile(r"\w+")
+
+# weights used by the in-process index when a term matches a field
+FIELD_WEIGHTS = {
+    "name": 8,
+    "brand": 4,
+    "category": 4,
+    "breif_description": 2,
+    "description": 1,
+}
+MAX_RESULTS = 500
+
+
+def normalize_text(text):
+    """
+    Normalize text for search: unify Arabic/Persian letters and digits,
+    drop diacritics, turn ZWNJ into a space and lowercase.
+    """
+    if not text:
+        return ""
+    text = DIACRITICS_RE.sub("", str(text).translate(PERSIAN_TRANSLATION))
+    return " ".join(text.lower().split())
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def build_search_document(product):
+    """
+    Return the normalized text stored in Product.search_document.
+    """
+    parts = [
+        product.name,
+        product.brand.name if product.brand_id else "",
+        product.category.name if product.category_id else "",
+        product.breif_description,
+        product.description,
+    ]
+    return normalize_text(" ".join(filter(None, parts)))
+
+
+class InvertedIndex:
+    """
+    Pure-Python inverted index over product fields.
+    Used where Postgres trigram search is unavailable (e.g. SQLite).
+    Query terms match indexed tokens by prefix; every term must match.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._tokens = None  # sorted token list, built lazily for prefix lookups
+
+    def add(self, product_id, fields):
+        """
+        Index a product given {field_name: text}.
+        """
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in set(tokenize(text)):
+                postings = self._postings[token]
+                postings[product_id] = max(postings.get(product_id, 0), weight)
+        self._tokens = None
+
+    def _match(self, term):
+        """
+        Return {product_id: score} for all tokens starting with term.
+        Exact token matches score double.
+        """
+        if self._tokens is None:
+            self._tokens = sorted(self._postings)
+        scores = {}
+        start = bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            bonus = 2 if token == term else 1
+            for product_id, weight in self._postings[token].items():
+                scores[product_id] = max(scores.get(product_id, 0), weight * bonus)
+        return scores
+
+    def search(self, query, limit=MAX_RESULTS):
+        """
+        Return product ids matching every term of query, best first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores = None
+        for term in terms:
+            matches = self._match(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    pid: score + matches[pid]
+                    for pid, score in scores.items()
+                    if pid in matches
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [product_id for product_id, _ in ranked[:limit]]
+
+
+# process-local index, rebuilt when the search version changes; stock and
+# price updates leave it alone
+_index_cache = {"version": None, "index": None}
+
+
+def get_search_index():
+    """
+    Return the in-process index for the current search version.
+    """
+    from .models import Product
+
+    version = get_search_version()
+    if _index_cache["version"] != version:
+        index = InvertedIndex()
+        rows = Product.objects.values_list(
+            "id",
+            "name",
+            "brand__name",
+            "category__name",
+            "breif_description",
+            "description",
+        ).order_by()
+        for pid, name, brand, category, brief, description in rows.iterator():
+            index.add(
+                pid,
+                {
+                    "name": name,
+                    "brand": brand,
+                    "category": category,
+                    "breif_description": brief,
+                    "description": description,
+                },
+            )
+        _index_cache["index"] = index
+        _index_cache["version"] = version
+    return _index_cache["index"]
+
+
+def _search_postgres(queryset, terms):
+    """
+    Match every term with LIKE, or the whole query fuzzily with the %>
+    word similarity operator (pg_trgm.word_similarity_threshold), both
+    served by the trigram index on search_document. Only the matching rows
+    are ranked by similarity.
+    """
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    query = " ".join(terms)
+    # search_document is already normalized to lower case, so a plain
+    # LIKE is enough and, unlike UPPER() ILIKE, can use the index
+    all_terms = Q()
+    for term in terms:
+        all_terms &= Q(search_document__contains=term)
+
+    return (
+        queryset.filter(all_terms | Q(search_document__trigram_word_similar=query))
+        .annotate(search_rank=TrigramWordSimilarity(query, "search_document"))
+        .order_by("-search_rank", "-created_at")
+    )
+
+
+def _search_in_memory(queryset, terms):
+    """
+    Rank with the in-process inverted index and keep that order in SQL.
+    """
+    ids = get_search_index().search(" ".join(terms))
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(id=pid, then=position) for position, pid in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).order_by(ranking)
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset to the products matching query, best match first.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+    if connection.vendor == "postgresql":
+        return _search_postgres(queryset, terms)
+    return _search_in_memory(queryset, terms)
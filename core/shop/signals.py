@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version, bump_reviews_version, bump_search_version
+from .models import Brand, Category, Product, Review
+from .search import build_search_document
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    """
+    Bump the catalog version whenever a product is created or updated,
+    and the search version only when its searchable text changed.
+    """
+    bump_catalog_version()
+    if created or instance.search_document != getattr(
+        instance, "_loaded_search_document", None
+    ):
+        bump_search_version()
+    instance._loaded_search_document = instance.search_document
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """
+    Bump the catalog and search versions whenever a product is removed.
+    """
+    bump_catalog_version()
+    bump_search_version()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    """
+    Bump the reviews version so cached review counts are re-rendered.
+    """
+    bump_reviews_version()
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def refresh_search_documents(sender, instance, created, **kwargs):
+    """
+    Rebuild the search documents of products whose brand or category changed.
+    """
+    if created:
+        return
+    products = list(instance.products.select_related("brand", "category"))
+    for product in products:
+        product.search_document = build_search_document(product)
+    Product.objects.bulk_update(products, ["search_document"], batch_size=500)
+    bump_catalog_version()
+    bump_search_version()
@@ -1,32 +1,54 @@
 from django import template
-from shop.models import Product
+from core.cache import cached_inclusion_tag
+from shop.catalog import CATALOG_NAMESPACE, REVIEWS_NAMESPACE
+from shop.models import Product, ProductSalesStats
+from shop.sales import SALES_NAMESPACE
 
 register = template.Library()
 
+# rendered homepage fragments are rebuilt when products or reviews change
+HOMEPAGE_NAMESPACES = (CATALOG_NAMESPACE, REVIEWS_NAMESPACE)
 
-@register.inclusion_tag("shop/best_sellers.html")
+
+@cached_inclusion_tag(
+    register, "shop/best_sellers.html", HOMEPAGE_NAMESPACES + (SALES_NAMESPACE,)
+)
 def best_sellers(count=4):
     """
-    Returns the blog hero published posts.
+    Returns the best selling products of the last 30 days (then all time),
+    padded with the newest products while there is too little sales history.
     """
-    best_sellers = Product.objects.filter(available=True).order_by("created_at")[:count]
+    stats = (
+        ProductSalesStats.objects.filter(product__available=True, units_sold__gt=0)
+        .select_related("product__category", "product__brand")
+        .order_by("-units_30d", "-units_sold")[:count]
+    )
+    best_sellers = [s.product for s in stats]
+
+    if len(best_sellers) < count:
+        best_sellers += (
+            Product.objects.filter(available=True)
+            .exclude(id__in=[p.id for p in best_sellers])
+            .select_related("category", "brand")
+            .order_by("-created_at")[: count - len(best_sellers)]
+        )
     return {"best_sellers": best_sellers}
 
 
-@register.inclusion_tag("shop/call_action.html")
+@cached_inclusion_tag(register, "shop/call_action.html", HOMEPAGE_NAMESPACES)
 def call_action(count=4):
     """
-    Returns the blog hero published posts.
+    Returns the products with the highest discount.
     """
     call_action = Product.objects.filter(available=True).order_by("-discount")[:count]
 
     return {"call_action": call_action}
 
 
-@register.inclusion_tag("shop/latest_products.html")
+@cached_inclusion_tag(register, "shop/latest_products.html", HOMEPAGE_NAMESPACES)
 def latest_products(count=3):
     """
-    Returns the blog hero published posts.
+    Returns the most recently added products.
     """
     latest_products = Product.objects.filter(available=True).order_by("-created_at")[
         :count
@@ -34,10 +56,10 @@ def latest_products(count=3):
     return {"latest_products": latest_products}
 
 
-@register.inclusion_tag("shop/best_products.html")
+@cached_inclusion_tag(register, "shop/best_products.html", HOMEPAGE_NAMESPACES)
 def best_products(count=3):
     """
-    Returns the blog hero published posts.
+    Returns the featured products.
     """
     best_products = Product.objects.filter(available=True).order_by("created_at")[
         :count
@@ -45,10 +67,10 @@ def best_products(count=3):
     return {"best_products": best_products}
 
 
-@register.inclusion_tag("shop/especial_products.html")
+@cached_inclusion_tag(register, "shop/especial_products.html", HOMEPAGE_NAMESPACES)
 def especial_products(count=3):
     """
-    Returns the blog hero published posts.
+    Returns the highest rated products.
     """
     especial_products = Product.objects.filter(available=True).order_by("-rating")[
         :count
@@ -1,7 +1,26 @@
+from datetime import timedelta
+from functools import partial
+from unittest import mock
 from decimal import Decimal
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from shop.models import Brand, Category, Product, ProductImage, Review, Wishlist
+from shop.catalog import get_product, get_products
+from shop.models import ProductSalesStats
+from shop.sales import rebuild_sales_stats, record_sales, roll_sales_windows
+from shop.templatetags.shop_tags import best_sellers
+from shop.search import InvertedIndex, get_search_index, normalize_text
+from shop.facets import compute_facets
+from core.pagination import BoundedPaginator
+from core.testing import IndexUsageMixin
+from shop.views import ProductListView
+from order.models import Order, OrderItem
+from order.tests import create_order
 
 User = get_user_model()
 
@@ -73,3 +92,445 @@ class WishlistModelTest(TestCase):
     def test_create_wishlist(self):
         wishlist = Wishlist.objects.create(user=self.user, product=self.product)
         self.assertEqual(str(wishlist), f"{self.user.email} - {self.product.name}")
+
+
+class ProductCatalogCacheTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="TestCategory")
+        self.product = Product.objects.create(
+            name="TestProduct", category=self.category, price=1000, stock=5
+        )
+        self.hidden = Product.objects.create(
+            name="HiddenProduct", category=self.category, price=1000, available=False
+        )
+
+    def test_misses_load_once_then_hit_cache(self):
+        with self.assertNumQueries(1):
+            products = get_products([self.product.id, self.hidden.id])
+        self.assertEqual(list(products), [self.product.id])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_product(self.product.id).price, 1000)
+            self.assertIsNone(get_product(self.hidden.id))
+
+    def test_product_save_invalidates_snapshot(self):
+        get_product(self.product.id)
+        self.product.stock = 1
+        self.product.save()
+        self.assertEqual(get_product(self.product.id).stock, 1)
+
+
+class ProductSalesStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="buyer@example.com")
+        self.category = Category.objects.create(name="TestCategory")
+        self.product1 = Product.objects.create(
+            name="Product1", category=self.category, price=1000
+        )
+        self.product2 = Product.objects.create(
+            name="Product2", category=self.category, price=2000
+        )
+
+    def create_order(self, status, lines):
+        order = create_order(
+            self.user,
+            payment_receipt=SimpleUploadedFile("receipt.jpg", b"file_content"),
+            subtotal=0,
+            shipping_cost=0,
+            total=0,
+            status=status,
+            sales_recorded=status != "cancelled",
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=quantity,
+                subtotal=product.price * quantity,
+            )
+        return order
+
+    def test_record_sales_accumulates(self):
+        record_sales([(self.product1.id, 2, Decimal("2000"))])
+        record_sales([(self.product1.id, 1, Decimal("1000"))])
+        stats = ProductSalesStats.objects.get(product=self.product1)
+        self.assertEqual(stats.units_sold, 3)
+        self.assertEqual(stats.units_30d, 3)
+        self.assertEqual(stats.revenue, Decimal("3000"))
+
+    def test_sales_windows_roll_with_the_date(self):
+        now = timezone.now()
+        record_sales([(self.product1.id, 1, Decimal("1000"))], sold_at=now)
+        record_sales(
+            [(self.product1.id, 2, Decimal("2000"))], sold_at=now - timedelta(days=10)
+        )
+        record_sales(
+            [(self.product1.id, 4, Decimal("4000"))], sold_at=now - timedelta(days=40)
+        )
+
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_7d, stats.units_30d, stats.units_sold), (1, 3, 7))
+
+        later = timezone.localdate() + timedelta(days=25)
+        self.assertEqual(roll_sales_windows(today=later), 1)
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_7d, stats.units_30d, stats.units_sold), (0, 1, 7))
+
+        self.assertEqual(roll_sales_windows(today=later + timedelta(days=30)), 1)
+        self.assertEqual(roll_sales_windows(today=later + timedelta(days=31)), 0)
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_7d, stats.units_30d), (0, 0))
+
+    def test_negative_lines_take_units_back(self):
+        sold_at = timezone.now() - timedelta(days=2)
+        record_sales([(self.product1.id, 3, Decimal("3000"))], sold_at=sold_at)
+        record_sales([(self.product1.id, -2, Decimal("-2000"))], sold_at=sold_at)
+        stats = ProductSalesStats.objects.get()
+        self.assertEqual((stats.units_sold, stats.units_30d), (1, 1))
+        self.assertEqual(stats.revenue, Decimal("1000"))
+        self.assertEqual(stats.last_sold_at, sold_at)
+
+    def test_rebuild_ignores_cancelled_orders(self):
+        self.create_order("pending", [(self.product1, 1), (self.product2, 4)])
+        self.create_order("cancelled", [(self.product1, 10)])
+        # still waiting for its order.record_sales outbox message
+        Order.objects.filter(
+            id=self.create_order("pending", [(self.product1, 7)]).id
+        ).update(sales_recorded=False)
+
+        self.assertEqual(rebuild_sales_stats(), 2)
+        stats = ProductSalesStats.objects.get(product=self.product1)
+        self.assertEqual((stats.units_sold, stats.units_7d, stats.units_30d), (1, 1, 1))
+        self.assertEqual(
+            ProductSalesStats.objects.get(product=self.product2).revenue,
+            Decimal("8000"),
+        )
+
+    def test_best_sellers_ranked_by_units(self):
+        record_sales([(self.product2.id, 5, Decimal("10000"))])
+        record_sales([(self.product1.id, 1, Decimal("1000"))])
+        ranked = best_sellers(2)["best_sellers"]
+        self.assertEqual(ranked, [self.product2, self.product1])
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="مکمل", slug="supplement")
+        self.brand = Brand.objects.create(name="Optimum", slug="optimum")
+        self.whey = Product.objects.create(
+            name="پروتئین وی",
+            slug="whey",
+            category=self.category,
+            brand=self.brand,
+            price=1000,
+            description="کراتین ندارد",
+        )
+        self.creatine = Product.objects.create(
+            name="کراتین مونوهیدرات",
+            slug="creatine",
+            category=self.category,
+            price=2000,
+        )
+
+    def test_normalize_text_unifies_persian_forms(self):
+        self.assertEqual(
+            normalize_text("كراتين‌ها ۱۲۳"), normalize_text("کراتین ها 123")
+        )
+
+    def test_inverted_index_ranks_name_matches_first(self):
+        index = InvertedIndex()
+        index.add(1, {"name": "پروتئین وی", "description": "کراتین"})
+        index.add(2, {"name": "کراتین مونوهیدرات"})
+        self.assertEqual(index.search("كراتين"), [2, 1])
+        self.assertEqual(index.search("کرا مونو"), [2])
+        self.assertEqual(index.search("nothing"), [])
+
+    def test_product_list_search(self):
+        response = self.client.get(reverse("shop:product-list"), {"q": "كراتين"})
+        self.assertEqual(list(response.context["products"]), [self.creatine, self.whey])
+
+        response = self.client.get(reverse("shop:product-list"), {"q": "optimum"})
+        self.assertEqual(list(response.context["products"]), [self.whey])
+
+    def test_search_without_hits_is_empty(self):
+        response = self.client.get(reverse("shop:product-list"), {"q": "zzz"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["products"]), [])
+
+    def test_index_rebuilt_only_for_text_changes(self):
+        index = get_search_index()
+        self.whey.stock = 3
+        self.whey.price = 1500
+        self.whey.save()
+        self.assertIs(get_search_index(), index)
+
+        self.whey.name = "پروتئین ایزوله"
+        self.whey.save()
+        self.assertIsNot(get_search_index(), index)
+        self.assertEqual(get_search_index().search("ایزوله"), [self.whey.id])
+
+    def test_brand_rename_refreshes_documents(self):
+        self.brand.name = "Gold Standard"
+        self.brand.save()
+        response = self.client.get(reverse("shop:product-list"), {"q": "gold"})
+        self.assertEqual(list(response.context["products"]), [self.whey])
+
+
+class ProductFacetTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Protein", slug="protein")
+        self.other_category = Category.objects.create(name="Vitamin", slug="vitamin")
+        self.brand = Brand.objects.create(name="Optimum", slug="optimum")
+        self.other_brand = Brand.objects.create(name="BSN", slug="bsn")
+        Product.objects.create(
+            name="Whey",
+            slug="whey",
+            category=self.category,
+            brand=self.brand,
+            price=400_000,
+            taste="Chocolate",
+            stock=3,
+        )
+        Product.objects.create(
+            name="Casein",
+            slug="casein",
+            category=self.category,
+            brand=self.other_brand,
+            price=1_500_000,
+            taste="Vanilla",
+        )
+        Product.objects.create(
+            name="Multi",
+            slug="multi",
+            category=self.other_category,
+            brand=self.brand,
+            price=6_000_000,
+            stock=1,
+        )
+
+    def test_compute_facets_single_query(self):
+        with self.assertNumQueries(1):
+            facets = compute_facets(Product.objects.filter(available=True))
+        self.assertEqual(facets["total"], 3)
+        self.assertEqual(facets["brands"], {self.brand.id: 2, self.other_brand.id: 1})
+        self.assertEqual(
+            facets["categories"], {self.category.id: 2, self.other_category.id: 1}
+        )
+        self.assertEqual(facets["tastes"], [("Chocolate", 1), ("Vanilla", 1)])
+        self.assertEqual(
+            [bucket["count"] for bucket in facets["price_buckets"]], [1, 0, 1, 0, 1]
+        )
+        self.assertEqual(facets["in_stock"], 2)
+
+    def test_product_list_facets_follow_filters(self):
+        url = reverse("shop:product-list")
+        response = self.client.get(url, {"brand_id": self.brand.id})
+        self.assertEqual(response.context["total_items"], 2)
+        counts = {b.id: b.facet_count for b in response.context["brands"]}
+        self.assertEqual(counts, {self.brand.id: 2, self.other_brand.id: 0})
+
+        response = self.client.get(url, {"in_stock": "1", "taste": "Chocolate"})
+        self.assertEqual(response.context["total_items"], 1)
+
+    def test_price_buckets_match_their_links(self):
+        Product.objects.create(
+            name="Bar", slug="bar", category=self.category, price=1_000_000
+        )
+        url = reverse("shop:product-list")
+        params = {"category_id": self.category.id, "order_by": "price", "page": 1}
+        response = self.client.get(url, params)
+        self.assertContains(
+            response,
+            f"?category_id={self.category.id}&amp;order_by=price"
+            "&amp;min_price=1000000&amp;max_price=1999999",
+        )
+        for bucket in response.context["facets"]["price_buckets"]:
+            with self.subTest(bucket=bucket["label"]):
+                filtered = {"category_id": self.category.id, "min_price": bucket["min"]}
+                if bucket["max"] is not None:
+                    filtered["max_price"] = bucket["max"]
+                response = self.client.get(url, filtered)
+                self.assertEqual(response.context["total_items"], bucket["count"])
+
+    def test_product_list_facets_are_cached(self):
+        url = reverse("shop:product-list")
+        self.client.get(url, {"category_id": self.category.id})
+        with self.assertNumQueries(3):
+            # page rows, categories, brands; the page count is cached too
+            response = self.client.get(
+                url, {"category_id": self.category.id, "page": 1}
+            )
+        self.assertEqual(response.context["facets"]["total"], 2)
+
+
+class ProductListCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Protein", slug="protein")
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                slug=f"product-{i}",
+                category=self.category,
+                price=1000 * (i % 3 + 1),
+            )
+            for i in range(7)
+        ]
+        self.url = reverse("shop:product-list")
+
+    def collect(self, params):
+        names, url = [], f"{self.url}?{params}"
+        while url:
+            response = self.client.get(url)
+            page = response.context["page_obj"]
+            names.extend(p.name for p in page)
+            url = page.next_url and f"{self.url}{page.next_url}"
+        return names, page
+
+    def test_cursor_pages_cover_all_products_in_order(self):
+        names, last_page = self.collect("cursor=&page_size=3")
+        expected = [
+            p.name
+            for p in sorted(
+                self.products, key=lambda p: (p.created_at, p.id), reverse=True
+            )
+        ]
+        self.assertEqual(names, expected)
+
+        response = self.client.get(f"{self.url}{last_page.previous_url}")
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+    def test_cursor_follows_requested_ordering(self):
+        names, _ = self.collect("cursor=&page_size=2&order_by=price")
+        expected = [
+            p.name for p in sorted(self.products, key=lambda p: (p.price, p.id))
+        ]
+        self.assertEqual(names, expected)
+
+    def test_deep_cursor_page_runs_no_count(self):
+        response = self.client.get(self.url, {"cursor": "", "page_size": 3})
+        next_url = response.context["page_obj"].next_url
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f"{self.url}{next_url}")
+        # facets are cached from the first page; keyset pages never count or offset
+        sql = " ".join(q["sql"] for q in queries)
+        self.assertNotIn("COUNT", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_tampered_cursor_is_404(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_offset_count_is_bounded(self):
+        paginator = BoundedPaginator(Product.objects.all(), 2, max_count=5)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertTrue(paginator.is_capped)
+
+    def test_offset_pages_past_the_cap_continue_by_cursor(self):
+        capped = partial(BoundedPaginator, max_count=4)
+        with mock.patch.object(ProductListView, "paginator_class", capped):
+            response = self.client.get(self.url, {"page": 2, "page_size": 2})
+            page = response.context["page_obj"]
+            self.assertTrue(page.paginator.is_capped)
+            self.assertFalse(page.has_next())
+            names = [p.name for p in page]
+            names += self.collect(page.next_url.lstrip("?"))[0]
+
+            # page numbers past the counted rows clamp to the last counted page
+            response = self.client.get(self.url, {"page": 9, "page_size": 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["page_obj"].number, 2)
+
+        expected = [
+            p.name
+            for p in sorted(
+                self.products, key=lambda p: (p.created_at, p.id), reverse=True
+            )
+        ]
+        self.assertEqual(names, expected[2:])
+
+
+class ProductListGuardTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Protein", slug="protein")
+        for i in range(5):
+            Product.objects.create(
+                name=f"Product {i}", slug=f"product-{i}", category=category, price=i
+            )
+        self.url = reverse("shop:product-list")
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(self.url, {"page_size": 100000})
+        self.assertEqual(response.context["paginator"].per_page, 48)
+
+        response = self.client.get(self.url, {"page_size": "abc"})
+        self.assertEqual(response.context["paginator"].per_page, 12)
+
+    def test_unknown_ordering_falls_back_to_default(self):
+        response = self.client.get(self.url, {"order_by": "description"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["products"][0].name, "Product 4")
+
+        response = self.client.get(self.url, {"order_by": "price"})
+        self.assertEqual(response.context["products"][0].name, "Product 0")
+
+    def test_expensive_request_is_degraded_then_rejected(self):
+        response = self.client.get(
+            self.url, {"q": "product", "page_size": 48, "taste": "x"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["paginator"].per_page, 12)
+
+        response = self.client.get(self.url, {"q": "product", "taste": "x"})
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(ProductListView, "max_query_cost", 100):
+            response = self.client.get(self.url, {"q": "product", "taste": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deep_pages_are_clamped_to_the_budget(self):
+        # one row per page: 5 for the row and 0.05 per page skipped
+        with mock.patch.object(ProductListView, "max_query_cost", 5.12):
+            response = self.client.get(self.url, {"page": 600, "page_size": 1})
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page_obj"]
+        self.assertTrue(page.paginator.is_capped)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(page[0].name, "Product 2")
+        self.assertTrue(page.next_url)
+
+
+class ListingIndexTest(IndexUsageMixin, TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Protein", slug="protein")
+        self.product = Product.objects.create(
+            name="Whey", slug="whey", category=self.category, price=1000
+        )
+
+    def test_product_list_orderings_use_indexes(self):
+        available = Product.objects.filter(available=True)
+        for key, index_name in [
+            ("-created_at", "product_avail_created_idx"),
+            ("price", "product_avail_price_idx"),
+            ("-rating", "product_avail_rating_idx"),
+            ("-discount", "product_avail_discount_idx"),
+            ("especial", "product_avail_especial_idx"),
+        ]:
+            with self.subTest(order_by=key):
+                ordering = ProductListView.orderings[key]
+                self.assertUsesIndex(available.order_by(*ordering)[:12], index_name)
+
+    def test_best_sellers_read_the_window_index(self):
+        ranking = ProductSalesStats.objects.order_by("-units_30d", "-units_sold")
+        self.assertUsesIndex(ranking[:4], ProductSalesStats._meta.indexes[0].name)
+
+    def test_category_filter_uses_index(self):
+        queryset = Product.objects.filter(available=True, category=self.category)
+        self.assertUsesIndex(
+            queryset.order_by("-created_at")[:12], "product_avail_category_idx"
+        )
+
+    def test_approved_reviews_use_index(self):
+        queryset = self.product.reviews.filter(approved=True).order_by("-created_at")
+        self.assertUsesIndex(queryset, "review_product_approved_idx")
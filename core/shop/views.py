@@ -3,13 +3,18 @@ from django.views.generic.detail import DetailView
 
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.core.exceptions import FieldError
+
+from core.listing import ListingGuardMixin
+from core.pagination import CursorPaginationMixin
 
 from .models import Product, Category, Brand, Wishlist
 from .forms import ReviewForm
+from .search import search_products
+from .facets import get_facets
+from .catalog import get_catalog_version
 
 
-class ProductListView(ListView):
+class ProductListView(ListingGuardMixin, CursorPaginationMixin, ListView):
     """
     Display a paginated list of available products.
     """
@@ -18,21 +23,31 @@ class ProductListView(ListView):
     model = Product
     paginate_by = 12
     context_object_name = "products"
-
-    def get_paginate_by(self, queryset):
-        """
-        Allow dynamic pagination size via query parameter.
-        """
-        return self.request.GET.get("page_size", self.paginate_by)
+    # sortable columns; each ends in id so it is unique and can back a cursor
+    orderings = {
+        "-created_at": ("-created_at", "-id"),
+        "created_at": ("created_at", "id"),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+        "-rating": ("-rating", "-id"),
+        "-discount": ("-discount", "-id"),
+        "especial": ("-especial", "-created_at", "-id"),
+    }
+    default_ordering = "-created_at"
+    max_page_size = 48
+    # extra cost of filters that cannot use a selective index
+    filter_costs = {"q": 150, "taste": 20, "min_price": 10, "max_price": 10}
 
     def get_queryset(self):
         """
         Return filtered queryset of available products.
         """
-        queryset = Product.objects.filter(available=True)
+        queryset = Product.objects.filter(available=True).select_related(
+            "brand", "category"
+        )
 
         if search_q := self.request.GET.get("q"):
-            queryset = queryset.filter(name__icontains=search_q)
+            queryset = search_products(queryset, search_q)
 
         if category_id := self.request.GET.get("category_id"):
             queryset = queryset.filter(category__id=category_id)
@@ -46,23 +61,51 @@ class ProductListView(ListView):
         if max_price := self.request.GET.get("max_price"):
             queryset = queryset.filter(price__lte=max_price)
 
-        if order_by := self.request.GET.get("order_by"):
-            try:
-                queryset = queryset.order_by(order_by)
-            except FieldError:
-                # Ignore invalid ordering fields
-                pass
+        if taste := self.request.GET.get("taste"):
+            queryset = queryset.filter(taste=taste)
+
+        if self.request.GET.get("in_stock"):
+            queryset = queryset.filter(stock__gt=0)
+
+        if self._keeps_search_ranking():
+            return queryset
+        return queryset.order_by(*self.get_ordering())
+
+    def _keeps_search_ranking(self):
+        return bool(self.request.GET.get("q")) and (
+            self.request.GET.get("order_by") not in self.orderings
+        )
+
+    def get_cursor_ordering(self, queryset):
+        """
+        Key the cursor on the whitelisted ordering.
+        Ranked search results fall back to page numbers.
+        """
+        if self._keeps_search_ranking():
+            return None
+        return self.get_ordering()
 
-        return queryset
+    def get_count_cache_version(self):
+        return get_catalog_version()
 
     def get_context_data(self, **kwargs):
         """
-        Add filter metadata and total item count to context.
+        Add filter metadata, facet counts and total item count to context.
         """
         context = super().get_context_data(**kwargs)
-        context["total_items"] = self.get_queryset().count()
-        context["categories"] = Category.objects.all()
-        context["brands"] = Brand.objects.all()
+        facets = get_facets(self.object_list, self.request.GET)
+
+        categories = list(Category.objects.all())
+        for category in categories:
+            category.facet_count = facets["categories"].get(category.id, 0)
+        brands = list(Brand.objects.all())
+        for brand in brands:
+            brand.facet_count = facets["brands"].get(brand.id, 0)
+
+        context["total_items"] = facets["total"]
+        context["categories"] = categories
+        context["brands"] = brands
+        context["facets"] = facets
         return context
 
 
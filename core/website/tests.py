@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from website.models import Contact
+from shop.models import Category, Product
 
 
 class ContactFormTests(TestCase):
@@ -22,3 +23,24 @@ class WebsiteViewTests(TestCase):
         response = self.client.get("/non-existing-url/")
         self.assertTemplateUsed(response, "website/404.html")
         self.assertEqual(response.status_code, 404)
+
+
+class HomepageFragmentCacheTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="TestCategory")
+        self.product = Product.objects.create(
+            name="CachedProduct", category=self.category, price=1000, stock=5
+        )
+
+    def test_warm_homepage_runs_no_queries(self):
+        self.client.get(reverse("website:index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("website:index"))
+        self.assertContains(response, "CachedProduct")
+
+    def test_product_change_refreshes_fragments(self):
+        self.client.get(reverse("website:index"))
+        self.product.name = "RenamedProduct"
+        self.product.save()
+        response = self.client.get(reverse("website:index"))
+        self.assertContains(response, "RenamedProduct")